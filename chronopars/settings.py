@@ -14,6 +14,7 @@ from pathlib import Path
 from decouple import config
 import dj_database_url
 import os
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -58,6 +59,9 @@ NPM_BIN_PATH = r"C:\Program Files\nodejs\npm.cmd"
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.RequestCostMiddleware',
+    'core.middleware.MemoryProfileMiddleware',
+    'core.middleware.AdmissionMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -212,5 +216,161 @@ if not DEBUG:
 
 # Celery configuration removed for traditional deployment
 
+# Master timetable ingest: rows per bulk_create batch and characters read
+# from the JSON file per chunk while streaming it.
+INGEST_BATCH_SIZE = config('INGEST_BATCH_SIZE', default=1000, cast=int)
+INGEST_READ_CHUNK_SIZE = config('INGEST_READ_CHUNK_SIZE', default=65536, cast=int)
+
+# Master timetables uploaded as the original PDF (core/master_pdf.py) are
+# read one page per process (0 = one per core)
+MASTER_PDF_WORKERS = config('MASTER_PDF_WORKERS', default=0, cast=int)
+MASTER_PDF_START_METHOD = config('MASTER_PDF_START_METHOD', default='forkserver')
+
+# Background ingest queue processed by `manage.py ingest_worker`. A RUNNING
+# job older than INGEST_JOB_TIMEOUT seconds is assumed to have lost its worker.
+INGEST_WORKER_POLL_INTERVAL = config('INGEST_WORKER_POLL_INTERVAL', default=2.0, cast=float)
+INGEST_JOB_TIMEOUT = config('INGEST_JOB_TIMEOUT', default=900, cast=int)
+INGEST_JOB_MAX_ATTEMPTS = config('INGEST_JOB_MAX_ATTEMPTS', default=3, cast=int)
+
+# Compiled master schedules, written once per source version and
+# memory-mapped by every worker on the host (see core/snapshots.py)
+SCHEDULE_SNAPSHOT_DIR = config(
+    'SCHEDULE_SNAPSHOT_DIR', default=str(BASE_DIR / 'var' / 'snapshots'))
+# Seconds a request with nothing to serve waits for another worker to finish
+# compiling a cold source
+SCHEDULE_REBUILD_WAIT = config('SCHEDULE_REBUILD_WAIT', default=10.0, cast=float)
+# Most recent completed sources warmed in the gunicorn master before forking
+SCHEDULE_PREWARM_SOURCES = config('SCHEDULE_PREWARM_SOURCES', default=3, cast=int)
+
+# Student registration PDF uploads: larger files are rejected and only the
+# first pages are searched for course codes
+REGISTRATION_PDF_MAX_BYTES = config('REGISTRATION_PDF_MAX_BYTES', default=5 * 1024 * 1024, cast=int)
+REGISTRATION_PDF_MAX_PAGES = config('REGISTRATION_PDF_MAX_PAGES', default=10, cast=int)
+
+# Extraction runs in long-lived processes kept by each web worker
+# (core/pdf_pool.py). At most PDF_POOL_WORKERS jobs run at once on the whole
+# host; others wait up to PDF_POOL_QUEUE_WAIT seconds for a slot, then get a
+# 503 asking the client to retry. A process is replaced after
+# PDF_POOL_MAX_JOBS jobs.
+PDF_POOL_ENABLED = config('PDF_POOL_ENABLED', default=True, cast=bool)
+PDF_POOL_START_METHOD = config('PDF_POOL_START_METHOD', default='forkserver')
+PDF_POOL_WORKERS = config('PDF_POOL_WORKERS', default=2, cast=int)
+PDF_POOL_QUEUE_WAIT = config('PDF_POOL_QUEUE_WAIT', default=2.0, cast=float)
+PDF_POOL_MAX_JOBS = config('PDF_POOL_MAX_JOBS', default=200, cast=int)
+PDF_POOL_RETRY_AFTER = config('PDF_POOL_RETRY_AFTER', default=5, cast=int)
+# Per-job limits: wall time the request waits, CPU seconds and address space
+# (the process is killed and replaced past either time limit)
+PDF_POOL_TIMEOUT = config('PDF_POOL_TIMEOUT', default=20.0, cast=float)
+PDF_POOL_CPU_SECONDS = config('PDF_POOL_CPU_SECONDS', default=15, cast=int)
+PDF_POOL_MEMORY_MB = config('PDF_POOL_MEMORY_MB', default=1024, cast=int)
+# Extraction results kept per worker, keyed by the hash of the uploaded bytes
+EXTRACTION_MEMO_SIZE = config('EXTRACTION_MEMO_SIZE', default=512, cast=int)
+
+# Rendered PDF/JPG downloads shared by all workers on the host; least
+# recently used files are removed past RENDER_CACHE_MAX_BYTES (0 disables)
+RENDER_CACHE_DIR = config('RENDER_CACHE_DIR', default=str(BASE_DIR / 'var' / 'renders'))
+RENDER_CACHE_MAX_BYTES = config('RENDER_CACHE_MAX_BYTES', default=256 * 1024 * 1024, cast=int)
+# Timetable PDF backend (see core/rendering): 'canvas' draws with reportlab,
+# 'html' converts the HTML templates with xhtml2pdf and is the fallback
+PDF_RENDERER = config('PDF_RENDERER', default='canvas')
+
+# Timetable image downloads (core/rendering/image.py): an optional TrueType
+# font path and per-format encoder settings
+TIMETABLE_IMAGE_FONT = config('TIMETABLE_IMAGE_FONT', default='')
+TIMETABLE_IMAGE_JPEG_QUALITY = config('TIMETABLE_IMAGE_JPEG_QUALITY', default=85, cast=int)
+TIMETABLE_IMAGE_WEBP_QUALITY = config('TIMETABLE_IMAGE_WEBP_QUALITY', default=80, cast=int)
+TIMETABLE_IMAGE_WEBP_METHOD = config('TIMETABLE_IMAGE_WEBP_METHOD', default=4, cast=int)
+TIMETABLE_IMAGE_PNG_COMPRESS_LEVEL = config('TIMETABLE_IMAGE_PNG_COMPRESS_LEVEL', default=6, cast=int)
+
+# Bulk cohort timetables (core/cohort.py): render processes (0 = one per
+# core) and the largest batch accepted from the dashboard
+COHORT_WORKERS = config('COHORT_WORKERS', default=0, cast=int)
+COHORT_START_METHOD = config('COHORT_START_METHOD', default='forkserver')
+COHORT_MAX_STUDENTS = config('COHORT_MAX_STUDENTS', default=500, cast=int)
+
+# Per-request query count, DB time and wall time (core/middleware.py).
+# Budgets are keyed by URL name; any field left out falls back to the
+# default, and None means unlimited. Over-budget requests log a warning, or
+# raise when strict (the default under `manage.py test`).
+REQUEST_BUDGET_DEFAULT = {'queries': 20, 'db_ms': None, 'wall_ms': 2000}
+REQUEST_BUDGETS = {
+    'student_dashboard': {'queries': 12, 'wall_ms': 5000},
+    'download_timetable_pdf': {'queries': 8},
+    'download_timetable_jpg': {'queries': 8},
+    'api_schedule': {'queries': 6, 'wall_ms': 500},
+    'generate_cohort_timetables': {'wall_ms': None},
+    # A password hash alone takes ~0.5 s (PBKDF2, 1M iterations), more on a
+    # busy host, and a login that upgrades the hash pays it twice
+    'login': {'wall_ms': 5000},
+    'signup': {'wall_ms': 5000},
+}
+REQUEST_BUDGET_STRICT = config('REQUEST_BUDGET_STRICT', default=sys.argv[1:2] == ['test'], cast=bool)
+
+# Where `manage.py benchmark --save-baseline` stores results for later
+# runs to compare against (machine-specific, so kept out of git)
+BENCHMARK_BASELINE = config('BENCHMARK_BASELINE', default=str(BASE_DIR / 'var' / 'benchmarks' / 'baseline.json'))
+
+# Admission control for expensive endpoints (core/admission.py), shared by
+# all workers on the host through flock'd slot files. Requests waiting in a
+# queue still hold a sync worker, so ADMISSION_MAX_BUSY (everything admitted
+# or queued, all groups together) stays one below the gunicorn worker count
+# (WEB_CONCURRENCY, read by gunicorn.conf.py too) for cheap pages to stay
+# responsive.
+WEB_CONCURRENCY = config('WEB_CONCURRENCY', default=4, cast=int)
+ADMISSION_ENABLED = config('ADMISSION_ENABLED', default=True, cast=bool)
+ADMISSION_DIR = config('ADMISSION_DIR', default=str(BASE_DIR / 'var' / 'admission'))
+ADMISSION_MAX_BUSY = config('ADMISSION_MAX_BUSY', default=max(1, WEB_CONCURRENCY - 1), cast=int)
+ADMISSION_RETRY_AFTER = config('ADMISSION_RETRY_AFTER', default=5, cast=int)
+# group: concurrent requests, waiting requests, longest wait in seconds, and
+# places of ADMISSION_MAX_BUSY kept for the group alone (the rest are shared)
+ADMISSION_GROUPS = {
+    'upload': {'slots': 2, 'queue': 2, 'wait': 5.0, 'reserved': 1},
+    'render': {'slots': 2, 'queue': 4, 'wait': 2.0, 'reserved': 1},
+    'cohort': {'slots': 1, 'queue': 0, 'wait': 0, 'reserved': 0},
+}
+# URL name: (group, methods guarded or None for all)
+ADMISSION_ENDPOINTS = {
+    'student_dashboard': ('upload', ('POST',)),
+    'download_timetable_pdf': ('render', None),
+    'download_timetable_jpg': ('render', None),
+    'generate_cohort_timetables': ('cohort', None),
+}
+
+# Stage timing histograms (core/metrics.py): one file per worker process
+# under METRICS_DIR, merged by the staff metrics endpoint. Bucket bounds are
+# in seconds; an empty METRICS_DIR turns the files off.
+METRICS_DIR = config('METRICS_DIR', default=str(BASE_DIR / 'var' / 'metrics'))
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Allocation profiling (core/memprofile.py), off by default: every Nth
+# request per endpoint is diffed with tracemalloc and the top retaining
+# source lines are reported at dashboard/admin/memory-profile/. A line only
+# counts once it has grown on STREAK profiled requests of an endpoint in a
+# row. Frames > 1 groups by call stack instead of by line.
+MEMORY_PROFILE_ENABLED = config('MEMORY_PROFILE_ENABLED', default=False, cast=bool)
+MEMORY_PROFILE_EVERY = config('MEMORY_PROFILE_EVERY', default=1, cast=int)
+MEMORY_PROFILE_STREAK = config('MEMORY_PROFILE_STREAK', default=3, cast=int)
+MEMORY_PROFILE_FRAMES = config('MEMORY_PROFILE_FRAMES', default=1, cast=int)
+MEMORY_PROFILE_TOP = config('MEMORY_PROFILE_TOP', default=15, cast=int)
+MEMORY_PROFILE_DIR = config('MEMORY_PROFILE_DIR', default=str(BASE_DIR / 'var' / 'memprofile'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'plain'},
+    },
+    'loggers': {
+        'core.requests': {
+            'handlers': ['console'],
+            'level': config('REQUEST_LOG_LEVEL', default='INFO'),
+            'propagate': False,
+        },
+    },
+}
+
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/login/'
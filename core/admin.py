@@ -1,6 +1,26 @@
 from django.contrib import admin
-from .models import User, TimetableSource
+from .models import User, TimetableSource, IngestJob
+from .jobs import enqueue_ingest
 # Register your models here.
 
 admin.site.register(User)
-admin.site.register(TimetableSource)
+
+
+@admin.register(TimetableSource)
+class TimetableSourceAdmin(admin.ModelAdmin):
+    list_display = ('display_name', 'academic_year', 'semester',
+                    'status', 'total_events', 'created_at')
+    readonly_fields = ('status', 'events_parsed', 'total_events', 'content_hash')
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Replacing the JSON re-ingests it; unchanged rows are left alone
+        if 'source_json' in form.changed_data:
+            enqueue_ingest(obj)
+
+
+@admin.register(IngestJob)
+class IngestJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'source', 'status', 'attempts',
+                    'worker', 'created_at', 'finished_at')
+    list_filter = ('status',)
@@ -0,0 +1,145 @@
+# core/admission.py
+"""
+Host-wide admission control for expensive endpoints.
+
+Every worker process on the host shares the same slot files under
+ADMISSION_DIR, and holding a slot means holding an exclusive flock on one of
+them. The kernel drops the lock if the worker dies, so a crashed or
+recycled worker can't leak a slot.
+
+ADMISSION_ENDPOINTS maps URL names to a group in ADMISSION_GROUPS. A request
+to a guarded endpoint:
+
+  1. takes one of ADMISSION_MAX_BUSY host-wide places: first one of the
+     group's own ``reserved`` places, failing that one of the places left
+     over after every group's reservation, which any group may borrow,
+  2. takes one of its group's ``slots``; failing that,
+  3. takes one of the group's ``queue`` places and polls for a slot for up to
+     ``wait`` seconds.
+
+If any of these fails, Admission.acquire() returns False and the caller
+answers 503 with Retry-After straight away. A waiting request still holds a
+sync worker, which is why the host-wide cap exists: with it below the
+gunicorn worker count, cheap pages always have a worker free. The
+reservations keep one slow group from taking every place and starving the
+others.
+"""
+import fcntl
+import os
+import random
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+POLL_SECONDS = 0.02
+
+
+def _try_lock(directory, prefix, count):
+    """An open fd holding one of ``count`` slot files, or None if all are taken."""
+    if count <= 0:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    for n in random.sample(range(count), count):
+        fd = os.open(os.path.join(directory, f'{prefix}-{n}'), os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return fd
+        except BlockingIOError:
+            os.close(fd)
+    return None
+
+
+def _unlock(fd):
+    fcntl.flock(fd, fcntl.LOCK_UN)
+    os.close(fd)
+
+
+@contextmanager
+def host_slot(name, count, wait):
+    """
+    Holds one of ``count`` host-wide slots called ``name`` for the duration
+    of the block, polling for up to ``wait`` seconds when all are taken.
+    Yields False, holding nothing, if none came free. For work that needs a
+    bound of its own beyond the request's admission group.
+    """
+    directory = os.path.join(settings.ADMISSION_DIR, name)
+    deadline = time.monotonic() + wait
+    fd = _try_lock(directory, 'slot', count)
+    while fd is None and time.monotonic() < deadline:
+        time.sleep(POLL_SECONDS)
+        fd = _try_lock(directory, 'slot', count)
+    if fd is None:
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        _unlock(fd)
+
+
+def shared_places():
+    """Host-wide places not reserved by any group."""
+    reserved = sum(limits.get('reserved', 0) for limits in settings.ADMISSION_GROUPS.values())
+    return max(0, settings.ADMISSION_MAX_BUSY - reserved)
+
+
+def group_for(view_name, method):
+    """The admission group guarding this request, or None."""
+    entry = settings.ADMISSION_ENDPOINTS.get(view_name)
+    if entry is None:
+        return None
+    group, methods = entry
+    if methods and method not in methods:
+        return None
+    return group
+
+
+class Admission:
+    """One request's claim on its group's slots; release() is idempotent."""
+
+    def __init__(self, group):
+        self.group = group
+        self.limits = settings.ADMISSION_GROUPS[group]
+        self.fds = []
+        self.waited = 0.0
+        self.reason = None
+
+    def acquire(self):
+        root = settings.ADMISSION_DIR
+        directory = os.path.join(root, self.group)
+
+        busy = _try_lock(directory, 'reserved', self.limits.get('reserved', 0))
+        if busy is None:
+            busy = _try_lock(root, 'busy', shared_places())
+        if busy is None:
+            self.reason = 'host busy'
+            return False
+        self.fds.append(busy)
+
+        slot = _try_lock(directory, 'slot', self.limits['slots'])
+        if slot is None:
+            place = _try_lock(directory, 'queue', self.limits.get('queue', 0))
+            if place is None:
+                self.reason = 'queue full'
+                self.release()
+                return False
+            started = time.monotonic()
+            deadline = started + self.limits.get('wait', 0)
+            try:
+                while slot is None and time.monotonic() < deadline:
+                    time.sleep(POLL_SECONDS)
+                    slot = _try_lock(directory, 'slot', self.limits['slots'])
+            finally:
+                _unlock(place)
+                self.waited = time.monotonic() - started
+            if slot is None:
+                self.reason = 'wait timed out'
+                self.release()
+                return False
+        self.fds.append(slot)
+        return True
+
+    def release(self):
+        while self.fds:
+            _unlock(self.fds.pop())
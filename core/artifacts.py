@@ -0,0 +1,134 @@
+# core/artifacts.py
+"""
+Disk cache of rendered timetable downloads (PDF/JPG bytes).
+
+Entries are keyed by everything that affects the output: the kind of
+artifact, the source and its schedule version, the source's display name,
+the template and the sorted normalized course codes. A new ingest bumps the
+version, so stale renders are never served; they just age out. Each
+source's entries live in a directory of their own, which drop() removes
+along with the source.
+
+The cache is shared by every worker on the host. Reads bump the file's mtime
+and the least recently used files are pruned once the directory grows past
+RENDER_CACHE_MAX_BYTES. Scanning the directory costs a stat per file, so a
+write doesn't scan: each process keeps a running estimate (the size seen at
+its last scan plus what it has written since) and scans only when that
+passes the cap, or every SCAN_EVERY writes to catch up with the other
+workers' writes. The key doubles as the response ETag.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+
+# Bump when renderers change in ways the key doesn't capture
+FORMAT = 1
+
+# Writes between full scans when the estimate stays under the cap
+SCAN_EVERY = 64
+
+_estimate = None  # bytes at this process's last scan plus its writes since
+_writes = 0       # writes since the last scan
+
+
+def artifact_key(kind, source, version, template, course_codes):
+    codes = ','.join(sorted(set(course_codes)))
+    raw = f'{FORMAT}|{kind}|{source.id}|{version}|{source.display_name}|{template}|{codes}'
+    return f'{source.id}-{hashlib.blake2b(raw.encode(), digest_size=20).hexdigest()}'
+
+
+def etag_for(key):
+    return f'"{key}"'
+
+
+def _source_dir(source_id):
+    return os.path.join(settings.RENDER_CACHE_DIR, f'source-{source_id}')
+
+
+def _path(key):
+    source_id, digest = key.split('-', 1)
+    return os.path.join(_source_dir(source_id), digest[:2], key)
+
+
+def get(key):
+    """Returns the cached bytes for ``key`` or None."""
+    path = _path(key)
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return data
+
+
+def put(key, data):
+    global _estimate, _writes
+    if settings.RENDER_CACHE_MAX_BYTES <= 0:
+        return
+    path = _path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    _writes += 1
+    if _estimate is not None:
+        _estimate += len(data)
+    if _estimate is None or _estimate > settings.RENDER_CACHE_MAX_BYTES or _writes >= SCAN_EVERY:
+        prune()
+
+
+def _entries():
+    # Walks the whole tree, so files from older layouts still age out
+    for directory, _, names in os.walk(settings.RENDER_CACHE_DIR):
+        for name in names:
+            if name.startswith('.tmp'):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            yield st.st_mtime, st.st_size, path
+
+
+def prune(max_bytes=None):
+    """Deletes least recently used entries until the cache fits; returns bytes freed."""
+    global _estimate, _writes
+    max_bytes = settings.RENDER_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    entries = sorted(_entries())
+    total = sum(size for _, size, _ in entries)
+    _estimate, _writes = total, 0
+    if total <= max_bytes:
+        return 0
+    # Prune a little below the cap so the next writes don't each evict a file
+    target, freed = max_bytes * 0.9, 0
+    for _, size, path in entries:
+        if total - freed <= target:
+            break
+        try:
+            os.unlink(path)
+            freed += size
+        except FileNotFoundError:
+            pass
+    _estimate = total - freed
+    return freed
+
+
+def drop(source_id):
+    """Removes every cached render of a deleted source."""
+    global _estimate
+    shutil.rmtree(_source_dir(source_id), ignore_errors=True)
+    # Rescan on the next write rather than guess what was removed
+    _estimate = None
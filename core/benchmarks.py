@@ -0,0 +1,399 @@
+# core/benchmarks.py
+"""
+Benchmarks run with ``python manage.py benchmark <name> [--events N ...]``.
+
+Each benchmark is a function taking keyword options and returning a list of
+result rows (dicts); the command prints them as a table, and can write them
+as JSON and compare them with a saved baseline (see ``compare``). SUITE is
+what ``benchmark suite`` runs.
+"""
+import gc
+import json
+import os
+import pickle
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+
+from .extraction import extract_course_codes, codes_in_text, STRATEGIES
+from .parsing import parse_time_range, parse_course_string, normalize_course_code
+from .schedule import DAYS_OF_WEEK, EventRecord, ScheduleIndex
+from .synthetic import course_catalog, course_sets, make_master_rows, make_registration_pdf
+
+BENCHMARKS = {}
+SUITE = ('ingest', 'assembly', 'extraction', 'rendering', 'images')
+
+# Row fields compared against the baseline: lower is better for both
+COMPARED_FIELDS = ('p50_ms', 'seconds')
+
+
+def benchmark(name):
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def timing_row(label, samples_ms, **extra):
+    row = {
+        'case': label,
+        'n': len(samples_ms),
+        'mean_ms': round(sum(samples_ms) / len(samples_ms), 3) if samples_ms else 0,
+        'p50_ms': round(percentile(samples_ms, 50), 3),
+        'p95_ms': round(percentile(samples_ms, 95), 3),
+        'max_ms': round(max(samples_ms), 3) if samples_ms else 0,
+    }
+    row.update(extra)
+    return row
+
+
+def measure_retained(build):
+    """Returns (result, bytes still allocated by ``build()``, seconds)."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    result = build()
+    seconds = time.perf_counter() - started
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return result, retained, seconds
+
+
+def parsed_event_dicts(rows):
+    """Master rows in the dict form get_master_schedule_data used to cache."""
+    events = []
+    for item in rows:
+        start_time, end_time = parse_time_range(item["Time"])
+        display_code, normalized_code, details = parse_course_string(item["Course"])
+        events.append({
+            'day': item["Day"].title(),
+            'start_time': start_time,
+            'end_time': end_time,
+            'location': item["Venue"],
+            'course_code': display_code,
+            'normalized_code': normalized_code,
+            'details': details,
+            'lecturer': item["Instructor(s)"],
+        })
+    return events
+
+
+def _copied(events):
+    # Rows straight from the DB driver never share string objects; copy the
+    # strings so the dict baseline is not flattered by the generator's reuse.
+    return [{k: (''.join(v) if isinstance(v, str) else v) for k, v in e.items()}
+            for e in events]
+
+
+@benchmark('schedule_memory')
+def schedule_memory(events=10000, seed=0, **options):
+    """Retained and pickled size of cached schedules: dicts vs EventRecords."""
+    source = _copied(parsed_event_dicts(make_master_rows(events, seed)))
+
+    results = []
+    dicts, size, seconds = measure_retained(lambda: _copied(source))
+    results.append({
+        'form': 'dict list',
+        'events': len(dicts),
+        'retained_kb': size // 1024,
+        'pickled_kb': len(pickle.dumps(dicts, pickle.HIGHEST_PROTOCOL)) // 1024,
+        'build_ms': round(seconds * 1000, 1),
+    })
+    del dicts
+
+    records, size, seconds = measure_retained(
+        lambda: [EventRecord.from_dict(e) for e in _copied(source)])
+    results.append({
+        'form': 'EventRecord list',
+        'events': len(records),
+        'retained_kb': size // 1024,
+        'pickled_kb': len(pickle.dumps(records, pickle.HIGHEST_PROTOCOL)) // 1024,
+        'build_ms': round(seconds * 1000, 1),
+    })
+
+    index, size, seconds = measure_retained(lambda: ScheduleIndex(records))
+    results.append({
+        'form': '+ ScheduleIndex',
+        'events': len(index),
+        'retained_kb': size // 1024,
+        'pickled_kb': '',
+        'build_ms': round(seconds * 1000, 1),
+    })
+    return results
+
+
+def registration_corpus(corpus=None, count=20, seed=0):
+    """[(name, pdf bytes)] from a directory of PDFs, or synthetic slips."""
+    if corpus:
+        names = sorted(n for n in os.listdir(corpus) if n.lower().endswith('.pdf'))
+        pdfs = []
+        for name in names:
+            with open(os.path.join(corpus, name), 'rb') as f:
+                pdfs.append((name, f.read()))
+        return pdfs
+    catalog = course_catalog(400, seed)
+    return [(f'synthetic_{i}.pdf', make_registration_pdf(codes, seed + i))
+            for i, codes in enumerate(course_sets(catalog, count, seed=seed))]
+
+
+def legacy_extract(data, max_pages):
+    """The original per-page extract_table() + extract_text() approach."""
+    import pdfplumber
+    from io import BytesIO
+
+    codes, raw_codes = set(), []
+    with pdfplumber.open(BytesIO(data)) as pdf:
+        for page in pdf.pages:
+            table = page.extract_table()
+            if table:
+                for row in table[1:]:
+                    if row and len(row) > 1 and row[1]:
+                        raw_codes.append(row[1].strip())
+                        normalized = normalize_course_code(row[1])
+                        if normalized:
+                            codes.add(normalized)
+            text = page.extract_text()
+            if text:
+                codes |= codes_in_text(text, raw_codes)
+        return codes, raw_codes, len(pdf.pages)
+
+
+@benchmark('extraction')
+def extraction(corpus=None, count=20, seed=0, max_pages=10, **options):
+    """Registration PDF course code extraction: original approach vs tiered pipeline."""
+    pdfs = registration_corpus(corpus, count, seed)
+    max_bytes = 50 * 1024 * 1024
+
+    results = []
+    reference = {}
+    legacy = [('legacy', legacy_extract)]
+    for label, strategies in [('original', legacy), ('pipeline', STRATEGIES)] + \
+            [(name, [(name, func)]) for name, func in STRATEGIES]:
+        samples, used, misses = [], Counter(), 0
+        for name, data in pdfs:
+            started = time.perf_counter()
+            result = extract_course_codes(data, max_pages, max_bytes, strategies)
+            samples.append((time.perf_counter() - started) * 1000)
+            used[result.strategy] += 1
+            if label == 'original':
+                reference[name] = result.codes
+            elif not reference[name] <= result.codes:
+                misses += 1
+        results.append(timing_row(
+            label, samples,
+            strategies=' '.join(f'{k}={v}' for k, v in sorted(used.items(), key=str)),
+            missed_codes=misses))
+    return results
+
+
+def peak_memory(func):
+    """Peak bytes allocated by Python while ``func()`` runs."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def student_schedules(events, count, seed):
+    """Student timetables ({day: [EventRecord]}) drawn from a synthetic master."""
+    index = ScheduleIndex.from_dicts(parsed_event_dicts(make_master_rows(events, seed)))
+    catalog = sorted(index.by_code)
+    return [index.schedule_for(codes) for codes in course_sets(catalog, count, seed=seed)]
+
+
+@benchmark('rendering')
+def pdf_rendering(events=10000, count=20, seed=0, **options):
+    """Timetable PDF latency and peak Python memory per renderer backend and template."""
+    from . import rendering
+
+    schedules = student_schedules(events, count, seed)
+    results = []
+    for template in rendering.TEMPLATES:
+        for backend in rendering.PDF_RENDERERS:
+            try:
+                renderer = rendering.get_renderer(backend)
+            except ImportError as e:
+                results.append({'case': f'{template}/{backend}', 'n': 0, 'error': str(e)})
+                continue
+
+            def render(schedule):
+                return renderer.render(schedule, DAYS_OF_WEEK, 'Synthetic Semester', template)
+
+            render(schedules[0])  # warm fonts and templates
+            samples, sizes = [], []
+            for schedule in schedules:
+                started = time.perf_counter()
+                sizes.append(len(render(schedule)))
+                samples.append((time.perf_counter() - started) * 1000)
+            peak = peak_memory(lambda: render(schedules[0]))
+            results.append(timing_row(
+                f'{template}/{backend}', samples,
+                peak_kb=peak // 1024, avg_kb=sum(sizes) // len(sizes) // 1024))
+    return results
+
+
+@benchmark('images')
+def image_rendering(events=10000, count=20, seed=0, **options):
+    """Timetable image throughput per output format, with and without the cached base frame."""
+    from .rendering import image
+
+    schedules = student_schedules(events, count, seed)
+    image.fonts()
+    cases = [('jpg (frame redrawn)', 'jpg', True)] + [(fmt, fmt, False) for fmt in image.IMAGE_FORMATS]
+
+    results = []
+    for label, fmt, cold in cases:
+        image.render_timetable_image(schedules[0], 'Synthetic Semester', fmt)
+        samples, sizes = [], []
+        for schedule in schedules:
+            if cold:
+                image._frames.clear()
+            started = time.perf_counter()
+            sizes.append(len(image.render_timetable_image(schedule, 'Synthetic Semester', fmt)))
+            samples.append((time.perf_counter() - started) * 1000)
+        row = timing_row(label, samples, avg_kb=sum(sizes) // len(sizes) // 1024)
+        row['images_per_sec'] = round(1000 * len(samples) / sum(samples), 1)
+        results.append(row)
+    return results
+
+
+class _Rollback(Exception):
+    pass
+
+
+@benchmark('ingest')
+def ingest(sizes=(1000, 10000, 100000), seed=0, **options):
+    """Master JSON ingest (first load, then an unchanged re-ingest diff) at each size, rolled back."""
+    from django.conf import settings
+    from django.db import transaction
+
+    from .ingest import ingest_master_timetable
+    from .models import TimetableSource, User
+
+    directory = os.path.join(settings.MEDIA_ROOT, 'master_timetables')
+    os.makedirs(directory, exist_ok=True)
+    results = []
+    for size in sizes:
+        fd, path = tempfile.mkstemp(dir=directory, prefix='benchmark_', suffix='.json')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(make_master_rows(size, seed), f)
+            try:
+                with transaction.atomic():
+                    user = User.objects.create_user(f'benchmark-{os.getpid()}-{size}')
+                    source = TimetableSource.objects.create(
+                        academic_year='0000', semester='Benchmark', display_name='Benchmark',
+                        source_json=os.path.relpath(path, settings.MEDIA_ROOT), uploader=user)
+                    for label in ('load', 'reingest'):
+                        # Forget the file hash so the re-ingest diffs every row
+                        source.content_hash = ''
+                        stats = ingest_master_timetable(source)
+                        results.append({
+                            'case': f'{label} {size}',
+                            'rows': stats.rows_read,
+                            'created': stats.events_created,
+                            'unchanged': stats.events_unchanged,
+                            'seconds': round(stats.seconds, 3),
+                            'rows_per_sec': round(stats.rows_per_sec),
+                        })
+                    raise _Rollback
+            except _Rollback:
+                pass
+        finally:
+            os.unlink(path)
+    return results
+
+
+@benchmark('assembly')
+def assembly(events=10000, count=20, seed=0, rounds=50, **options):
+    """
+    Student schedule assembly per call, by number of courses (5-12): from the
+    memory-mapped snapshot that production serves, and from the in-memory
+    ScheduleIndex for comparison. The last row is compiling and mapping the
+    snapshot itself.
+    """
+    from .snapshots import Snapshot, compile_snapshot
+
+    index = ScheduleIndex.from_dicts(parsed_event_dicts(make_master_rows(events, seed)))
+    catalog = sorted(index.by_code)
+
+    samples = []
+    for _ in range(max(1, rounds // 10)):
+        started = time.perf_counter()
+        data = compile_snapshot(index.events, 1)
+        samples.append((time.perf_counter() - started) * 1000)
+    fd, path = tempfile.mkstemp(prefix='benchmark_', suffix='.snap')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        started = time.perf_counter()
+        snapshot = Snapshot(path)
+        map_ms = (time.perf_counter() - started) * 1000
+        compiled = timing_row('compile snapshot', samples, kb=len(data) // 1024,
+                              map_ms=round(map_ms, 2))
+
+        results = []
+        for courses in range(5, 13):
+            selections = course_sets(catalog, count, courses, courses, seed)
+            matched = sum(len(v) for codes in selections for v in index.schedule_for(codes).values())
+            for label, schedules in (('snapshot', snapshot), ('index', index)):
+                # A single call takes microseconds; each sample is a round over
+                # all selections, divided back down to one call
+                samples = []
+                for _ in range(rounds):
+                    started = time.perf_counter()
+                    for codes in selections:
+                        schedules.schedule_for(codes)
+                    samples.append((time.perf_counter() - started) * 1000 / len(selections))
+                results.append(timing_row(f'{label} {courses} courses', samples,
+                                          avg_events=round(matched / len(selections), 1)))
+        results.append(compiled)
+        snapshot.close()
+    finally:
+        os.unlink(path)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Rows of (benchmark, case, field, baseline, current, change) for every
+    result that has a baseline value, plus the number of regressions, i.e.
+    values more than ``tolerance`` (a fraction) above the baseline.
+    """
+    rows, regressions = [], 0
+    for name, current_rows in results.items():
+        previous = {row.get('case'): row for row in baseline.get(name, [])}
+        for row in current_rows:
+            before = previous.get(row.get('case'))
+            if not before:
+                continue
+            for field in COMPARED_FIELDS:
+                old, new = before.get(field), row.get(field)
+                if not isinstance(old, (int, float)) or not isinstance(new, (int, float)) or not old:
+                    continue
+                change = (new - old) / old
+                regressed = change > tolerance
+                regressions += regressed
+                rows.append({
+                    'benchmark': name,
+                    'case': row['case'],
+                    'field': field,
+                    'baseline': old,
+                    'current': new,
+                    'change': f'{change:+.1%}',
+                    'status': 'REGRESSED' if regressed else 'ok',
+                })
+    return rows, regressions
@@ -0,0 +1,267 @@
+# core/cohort.py
+"""
+Timetables for a whole cohort in one go, returned as a ZIP.
+
+Input is a list of CohortItem (a student name and their course codes), read
+from a CSV or from a batch of registration PDFs. Identical course sets are
+rendered once; renders not already in the artifact cache are spread over a
+process pool, and each file is written to the ZIP as soon as it's ready so
+the response can stream. ``report.csv`` at the end of the archive has the
+per-student timings and the total.
+"""
+import csv
+import io
+import multiprocessing
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+
+from . import artifacts, rendering
+from .extraction import ExtractionError, codes_in_text
+from .schedule import DAYS_OF_WEEK
+
+# Below this many renders the pool's startup costs more than it saves
+MIN_PARALLEL_RENDERS = 4
+
+
+class CohortError(Exception):
+    pass
+
+
+class CohortItem:
+    def __init__(self, name, codes):
+        self.name = name
+        self.codes = sorted(set(codes))
+        self.filename = None
+        self.status = None      # rendered, cached, duplicate, empty or failed
+        self.events = 0
+        self.render_ms = 0.0
+
+    def __repr__(self):
+        return f"<CohortItem {self.name}: {len(self.codes)} codes>"
+
+
+def items_from_csv(text):
+    """
+    One student per row: a name or ID, then their course codes, either in one
+    cell ("ACT 404; CSM 101") or spread over the remaining columns. A header
+    row without course codes is skipped.
+    """
+    items = []
+    for row in csv.reader(io.StringIO(text)):
+        if not row or not row[0].strip():
+            continue
+        codes = codes_in_text(' '.join(row[1:]), [])
+        if codes:
+            items.append(CohortItem(row[0].strip(), codes))
+    return items
+
+
+def items_from_pdfs(files, extract):
+    """
+    ``files`` is [(filename, bytes)]; ``extract`` returns an ExtractionResult
+    for PDF bytes. Unreadable PDFs are kept as failed items.
+    """
+    items = []
+    for filename, data in files:
+        name = os.path.splitext(os.path.basename(filename))[0]
+        try:
+            items.append(CohortItem(name, extract(data).codes))
+        except ExtractionError as e:
+            print(f"Cohort: could not read {filename}: {e}")
+            item = CohortItem(name, [])
+            item.status = 'failed'
+            items.append(item)
+    return items
+
+
+def safe_filename(name):
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', name).strip('._') or 'student'
+
+
+def render_one(fmt, template, source_name, schedule):
+    """
+    Runs in a pool process; returns (bytes, milliseconds, cacheable), where
+    fallback PDF output is not cacheable under the primary backend's key.
+    """
+    started = time.perf_counter()
+    cacheable = True
+    if fmt == 'pdf':
+        data, produced_by = rendering.render_timetable_pdf(schedule, DAYS_OF_WEEK, source_name, template)
+        cacheable = produced_by == settings.PDF_RENDERER
+    else:
+        from .rendering import image
+        data = image.render_timetable_image(schedule, source_name, fmt)
+    return data, (time.perf_counter() - started) * 1000, cacheable
+
+
+def _init_render_worker():
+    import django
+    django.setup()
+
+
+class _ZipBuffer:
+    """Write-only file object whose contents are drained after each entry."""
+
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class CohortJob:
+    def __init__(self, source, schedule_index, items, template='modern', fmt='pdf', workers=None):
+        if fmt != 'pdf' and fmt not in rendering.IMAGE_FORMATS:
+            raise CohortError(f"Unknown format: {fmt}")
+        if template not in rendering.TEMPLATES:
+            template = rendering.DEFAULT_TEMPLATE
+        self.source = source
+        self.index = schedule_index
+        self.items = items
+        self.template = template
+        self.fmt = fmt
+        self.workers = workers or settings.COHORT_WORKERS or os.cpu_count()
+        self.total_ms = 0.0
+        self.unique_sets = 0
+
+    @property
+    def extension(self):
+        if self.fmt == 'pdf':
+            return 'pdf'
+        return rendering.IMAGE_FORMATS[self.fmt][2]
+
+    def _assign_filenames(self):
+        seen = {}
+        for item in self.items:
+            base = safe_filename(item.name)
+            seen[base] = seen.get(base, 0) + 1
+            suffix = f'_{seen[base]}' if seen[base] > 1 else ''
+            item.filename = f'{base}{suffix}.{self.extension}'
+
+    def _groups(self):
+        """{course set: [items]} in first-seen order, skipping unusable items."""
+        groups = {}
+        for item in self.items:
+            if item.status == 'failed':
+                continue
+            if not item.codes:
+                item.status = 'empty'
+                continue
+            groups.setdefault(tuple(item.codes), []).append(item)
+        return groups
+
+    def iter_zip(self):
+        """Yields the ZIP archive in chunks as timetables are rendered."""
+        started = time.perf_counter()
+        self._assign_filenames()
+        groups = self._groups()
+        self.unique_sets = len(groups)
+
+        buf = _ZipBuffer()
+        archive = zipfile.ZipFile(buf, 'w', zipfile.ZIP_STORED)
+
+        def emit(codes, data, status, ms):
+            for n, item in enumerate(groups[codes]):
+                item.status = status if n == 0 else 'duplicate'
+                item.render_ms = ms if n == 0 else 0.0
+                archive.writestr(item.filename, data)
+
+        # Serve what the render cache already has, collect the rest
+        pending = []
+        for codes, members in groups.items():
+            schedule = self.index.schedule_for(codes)
+            events = sum(len(v) for v in schedule.values())
+            for item in members:
+                item.events = events
+            key = rendering.cache_key(self.source, self.index.version, self.fmt, self.template, codes)
+            cached = artifacts.get(key)
+            if cached is not None:
+                emit(codes, cached, 'cached', 0.0)
+                yield buf.drain()
+            else:
+                pending.append((codes, key, schedule))
+
+        for codes, key, data, ms, cacheable in self._render(pending):
+            if data is None:
+                for item in groups[codes]:
+                    item.status = 'failed'
+                continue
+            if cacheable:
+                artifacts.put(key, data)
+            emit(codes, data, 'rendered', ms)
+            yield buf.drain()
+
+        self.total_ms = (time.perf_counter() - started) * 1000
+        archive.writestr('report.csv', self.report_csv(), compress_type=zipfile.ZIP_DEFLATED)
+        archive.close()
+        yield buf.drain()
+
+    def _render(self, pending):
+        """
+        Yields (codes, key, data, ms, cacheable) as renders finish. A render
+        that raises yields data None: one bad timetable must not cut the ZIP
+        short.
+        """
+        name = self.source.display_name
+        if len(pending) < MIN_PARALLEL_RENDERS or self.workers <= 1:
+            for codes, key, schedule in pending:
+                try:
+                    data, ms, cacheable = render_one(self.fmt, self.template, name, schedule)
+                except Exception as e:
+                    print(f"Cohort: rendering {' '.join(codes)} failed: {e}")
+                    data, ms, cacheable = None, 0.0, False
+                yield codes, key, data, ms, cacheable
+            return
+
+        context = multiprocessing.get_context(settings.COHORT_START_METHOD)
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(pending)), mp_context=context,
+                                 initializer=_init_render_worker) as pool:
+            futures = {pool.submit(render_one, self.fmt, self.template, name, schedule): (codes, key)
+                       for codes, key, schedule in pending}
+            for future in as_completed(futures):
+                codes, key = futures[future]
+                try:
+                    data, ms, cacheable = future.result()
+                except Exception as e:
+                    print(f"Cohort: rendering {' '.join(codes)} failed: {e}")
+                    data, ms, cacheable = None, 0.0, False
+                yield codes, key, data, ms, cacheable
+
+    def report_rows(self):
+        return [{
+            'student': item.name,
+            'file': item.filename if item.status not in ('empty', 'failed') else '',
+            'codes': ' '.join(item.codes),
+            'events': item.events,
+            'status': item.status,
+            'render_ms': round(item.render_ms, 1),
+        } for item in self.items]
+
+    def report_csv(self):
+        out = io.StringIO()
+        writer = csv.DictWriter(out, fieldnames=['student', 'file', 'codes', 'events', 'status', 'render_ms'])
+        writer.writeheader()
+        writer.writerows(self.report_rows())
+        writer.writerow({'student': 'TOTAL', 'file': f'{len(self.items)} students',
+                         'codes': f'{self.unique_sets} unique course sets',
+                         'render_ms': round(self.total_ms, 1)})
+        return out.getvalue()
@@ -0,0 +1,134 @@
+# core/extraction.py
+"""
+Course code extraction from student registration PDFs.
+
+Strategies run cheapest first and the pipeline stops at the first one that
+finds any codes:
+
+    pdfium_text   raw text layer through pypdfium2 (no layout analysis)
+    plumber_text  pdfplumber's simple text extraction
+    plumber_table pdfplumber table detection, course code column
+
+Inputs are capped by REGISTRATION_PDF_MAX_BYTES and REGISTRATION_PDF_MAX_PAGES
+so a huge upload can't pin a worker.
+"""
+from io import BytesIO
+
+from .parsing import COURSE_CODE_RE, normalize_course_code
+
+
+class ExtractionError(Exception):
+    """The upload was rejected before or during extraction."""
+
+
+class ExtractionResult:
+    def __init__(self, codes, raw_codes, strategy, pages):
+        self.codes = codes          # set of normalized codes
+        self.raw_codes = raw_codes  # as found, for debugging
+        self.strategy = strategy    # name of the strategy that found them
+        self.pages = pages          # pages examined by that strategy
+
+    def __repr__(self):
+        return f"<ExtractionResult {len(self.codes)} codes via {self.strategy}>"
+
+
+def codes_in_text(text, raw_codes):
+    codes = set()
+    for dept_code, course_num in COURSE_CODE_RE.findall(text.upper()):
+        course_code = f"{dept_code} {course_num}"
+        raw_codes.append(course_code)
+        codes.add(course_code)
+    return codes
+
+
+def pdfium_text(data, max_pages):
+    import pypdfium2
+
+    pdf = pypdfium2.PdfDocument(data)
+    try:
+        pages = min(len(pdf), max_pages)
+        raw_codes, codes = [], set()
+        for i in range(pages):
+            page = pdf[i]
+            textpage = page.get_textpage()
+            codes |= codes_in_text(textpage.get_text_range(), raw_codes)
+            textpage.close()
+            page.close()
+        return codes, raw_codes, pages
+    finally:
+        pdf.close()
+
+
+def _plumber_pages(data, max_pages):
+    import pdfplumber
+
+    pdf = pdfplumber.open(BytesIO(data))
+    return pdf, pdf.pages[:max_pages]
+
+
+def plumber_text(data, max_pages):
+    pdf, pages = _plumber_pages(data, max_pages)
+    with pdf:
+        raw_codes, codes = [], set()
+        for page in pages:
+            text = page.extract_text_simple()
+            if text:
+                codes |= codes_in_text(text, raw_codes)
+        return codes, raw_codes, len(pages)
+
+
+def plumber_table(data, max_pages):
+    pdf, pages = _plumber_pages(data, max_pages)
+    with pdf:
+        raw_codes, codes = [], set()
+        for page in pages:
+            table = page.extract_table()
+            if not table:
+                continue
+            for row in table[1:]:  # Skip header
+                if row and len(row) > 1 and row[1]:
+                    course_code = row[1].strip()
+                    raw_codes.append(course_code)
+                    normalized = normalize_course_code(course_code)
+                    if normalized:
+                        codes.add(normalized)
+        return codes, raw_codes, len(pages)
+
+
+STRATEGIES = [
+    ('pdfium_text', pdfium_text),
+    ('plumber_text', plumber_text),
+    ('plumber_table', plumber_table),
+]
+
+
+def extract_course_codes(data, max_pages, max_bytes, strategies=STRATEGIES):
+    """
+    Runs the extraction strategies over the PDF bytes and returns an
+    ExtractionResult. Raises ExtractionError if the upload is over the byte
+    cap or no strategy could read it at all.
+    """
+    if len(data) > max_bytes:
+        raise ExtractionError(
+            f"The file is too large ({len(data) // 1024} KB, limit {max_bytes // 1024} KB).")
+
+    attempted, errors = 0, []
+    for name, strategy in strategies:
+        try:
+            attempted += 1
+            codes, raw_codes, pages = strategy(data, max_pages)
+        except ImportError:
+            attempted -= 1
+            continue
+        except (ExtractionError, MemoryError):
+            # Resource limits apply to the whole upload, not one strategy
+            raise
+        except Exception as e:
+            errors.append(f"{name}: {e}")
+            continue
+        if codes:
+            return ExtractionResult(codes, raw_codes, name, pages)
+
+    if errors and len(errors) == attempted:
+        raise ExtractionError('; '.join(errors))
+    return ExtractionResult(set(), [], None, 0)
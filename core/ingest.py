@@ -0,0 +1,379 @@
+# core/ingest.py
+import json
+import time
+import hashlib
+import resource
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+
+from . import master_pdf, snapshots
+from .models import TimetableSource, TimetableEvent
+from .parsing import parse_time_range, parse_course_string
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+
+UPDATE_FIELDS = ['day', 'start_time', 'end_time', 'location', 'course_code',
+                 'normalized_code', 'details', 'lecturer', 'row_hash']
+
+
+class IngestStats:
+    """Counters and timings collected while ingesting one master file."""
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.content_hash = ''
+        self.unchanged_file = False
+        self.rows_read = 0
+        self.rows_skipped = 0
+        self.events_created = 0
+        self.events_updated = 0
+        self.events_deleted = 0
+        self.events_unchanged = 0
+        self.batches = 0
+        self.seconds = 0.0
+        self.peak_memory_kb = None  # Python heap peak, only when traced
+        self.max_rss_kb = None
+        self.pages = []  # per-page extraction, only for a master PDF
+
+    @property
+    def rows_per_sec(self):
+        if not self.seconds:
+            return 0.0
+        return self.rows_read / self.seconds
+
+    @property
+    def changed(self):
+        return bool(self.events_created or self.events_updated or self.events_deleted)
+
+    def as_dict(self):
+        return {
+            'batch_size': self.batch_size,
+            'content_hash': self.content_hash,
+            'unchanged_file': self.unchanged_file,
+            'rows_read': self.rows_read,
+            'rows_skipped': self.rows_skipped,
+            'events_created': self.events_created,
+            'events_updated': self.events_updated,
+            'events_deleted': self.events_deleted,
+            'events_unchanged': self.events_unchanged,
+            'batches': self.batches,
+            'seconds': round(self.seconds, 4),
+            'rows_per_sec': round(self.rows_per_sec, 1),
+            'peak_memory_kb': self.peak_memory_kb,
+            'max_rss_kb': self.max_rss_kb,
+            'pages': self.pages,
+        }
+
+    def __str__(self):
+        if self.unchanged_file:
+            return f"file unchanged ({self.content_hash[:12]}), nothing to do"
+        peak = f", peak {self.peak_memory_kb} KiB" if self.peak_memory_kb is not None else ""
+        pdf = ""
+        if self.pages:
+            missed = sum(page['missed'] for page in self.pages)
+            pdf = f" from {len(self.pages)} PDF pages ({missed} classes unreadable)"
+        return (f"{self.rows_read} rows{pdf} in {self.seconds:.3f}s "
+                f"({self.rows_per_sec:.0f} rows/s): {self.events_created} created, "
+                f"{self.events_updated} updated, {self.events_deleted} deleted, "
+                f"{self.events_unchanged} unchanged ({self.batches} batches of "
+                f"{self.batch_size}{peak}, max RSS {self.max_rss_kb} KiB)")
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """sha256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def event_row_hash(event):
+    """Fingerprint of the stored fields of a TimetableEvent."""
+    parts = (
+        event.day,
+        event.start_time.strftime('%H:%M'),
+        event.end_time.strftime('%H:%M'),
+        event.location or '',
+        event.course_code,
+        event.normalized_code,
+        event.details or '',
+        event.lecturer or '',
+    )
+    return hashlib.blake2b('\x1f'.join(parts).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def event_identity(day, normalized_code, details):
+    """Rows sharing this key are treated as the same class when diffing."""
+    return (day, normalized_code, details or '')
+
+
+def iter_json_array(fp, chunk_size=65536):
+    """
+    Yields the elements of a top-level JSON array one at a time.
+
+    Only one element (plus one read chunk) is held in memory at once, so the
+    cost of reading a master file no longer grows with the number of rows.
+    """
+    buf = ''
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            eof = True
+        buf = buf[pos:] + chunk
+        pos = 0
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            if pos < len(buf) or eof:
+                return
+            fill()
+
+    skip_whitespace()
+    if buf[pos:pos + 1] != '[':
+        raise ValueError("Master timetable JSON must be a list of rows.")
+    pos += 1
+
+    skip_whitespace()
+    if buf[pos:pos + 1] == ']':
+        return
+
+    while True:
+        skip_whitespace()
+        while True:
+            try:
+                item, end = _decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+                continue
+            # A value touching the end of the buffer may still be cut short
+            # (e.g. a number), so only trust it once more input has been seen.
+            if end == len(buf) and not eof:
+                fill()
+                continue
+            break
+        pos = end
+        yield item
+
+        skip_whitespace()
+        sep = buf[pos:pos + 1]
+        pos += 1
+        if sep == ']':
+            return
+        if sep != ',':
+            raise ValueError(
+                f"Malformed master timetable JSON near offset {pos}.")
+
+
+@contextmanager
+def _json_rows(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        yield iter_json_array(f, settings.INGEST_READ_CHUNK_SIZE)
+
+
+def build_event(source, item):
+    """Turns one raw master row into an unsaved TimetableEvent, or None."""
+    start_time, end_time = parse_time_range(item.get("Time"))
+    display_code, normalized_code, details = parse_course_string(
+        item.get("Course", ""))
+
+    if not all([start_time, end_time, display_code]):
+        return None
+
+    event = TimetableEvent(
+        source=source,
+        day=item.get("Day", "").title(),
+        start_time=start_time,
+        end_time=end_time,
+        location=item.get("Venue", ""),
+        course_code=display_code,
+        normalized_code=normalized_code,
+        details=details,
+        lecturer=item.get("Instructor(s)", ""),
+    )
+    event.row_hash = event_row_hash(event)
+    return event
+
+
+def ingest_master_timetable(source, batch_size=None, trace_memory=False, full=False, workers=None):
+    """
+    Streams the source's master JSON into TimetableEvent rows and returns an
+    IngestStats. A master PDF is read page by page on ``workers`` processes
+    (core/master_pdf.py) and its rows take the same path from there.
+
+    If the file hash matches the one the current events were built from the
+    call is a no-op. Otherwise each row is fingerprinted and only rows that
+    differ from what is stored are inserted, updated or deleted; a row whose
+    (day, course, details) survives with new times/venue/lecturer becomes an
+    UPDATE. ``full=True`` skips the diff and rewrites every row.
+
+    Raises on malformed input; the caller decides how to record failure.
+    """
+    batch_size = batch_size or settings.INGEST_BATCH_SIZE
+    stats = IngestStats(batch_size)
+
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        path = source.source_json.path
+        stats.content_hash = file_hash(path)
+        if (not full and source.events_parsed
+                and source.content_hash == stats.content_hash):
+            stats.unchanged_file = True
+            stats.events_unchanged = source.total_events
+            if source.status != TimetableSource.COMPLETED:
+                source.status = TimetableSource.COMPLETED
+                source.save(update_fields=['status'])
+            return stats
+
+        if master_pdf.is_pdf(path):
+            # Extracted before the transaction opens: it's the slow part
+            rows, pages = master_pdf.extract_rows(path, workers)
+            stats.pages = [page.as_dict() for page in pages]
+            reader = nullcontext(rows)
+        else:
+            reader = _json_rows(path)
+
+        with transaction.atomic():
+            if full:
+                source.events.all().delete()
+            existing = _existing_rows(source)
+
+            with reader as rows:
+                if existing:
+                    _apply_diff(source, rows, existing, stats)
+                else:
+                    _insert_all(source, rows, stats)
+
+            source.status = TimetableSource.COMPLETED
+            source.events_parsed = True
+            source.total_events = (stats.events_created + stats.events_updated
+                                   + stats.events_unchanged)
+            source.content_hash = stats.content_hash
+            if stats.changed:
+                source.schedule_version += 1
+                transaction.on_commit(partial(_publish_snapshot, source.id))
+            source.save()
+    finally:
+        stats.seconds = time.perf_counter() - started
+        if trace_memory:
+            stats.peak_memory_kb = tracemalloc.get_traced_memory()[1] // 1024
+            tracemalloc.stop()
+        stats.max_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return stats
+
+
+def _publish_snapshot(source_id):
+    # Runs after commit. If the new version can't be published, unpublish the
+    # old one so readers rebuild from the database rather than keep serving it.
+    try:
+        with snapshots.build_lock(source_id, settings.SCHEDULE_REBUILD_WAIT) as acquired:
+            if acquired:
+                snapshots.publish_source(source_id)
+                return
+        print(f"Timed out publishing schedule snapshot for source {source_id}")
+    except Exception as e:
+        print(f"Error publishing schedule snapshot for source {source_id}: {e}")
+    snapshots.invalidate(source_id)
+
+
+def _parsed_events(source, rows, stats):
+    for item in rows:
+        stats.rows_read += 1
+        event = build_event(source, item)
+        if event is None:
+            stats.rows_skipped += 1
+            continue
+        yield event
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _insert_all(source, rows, stats):
+    """First ingest: nothing to diff against, insert in streaming batches."""
+    batch = []
+    for event in _parsed_events(source, rows, stats):
+        batch.append(event)
+        if len(batch) >= stats.batch_size:
+            TimetableEvent.objects.bulk_create(batch)
+            stats.events_created += len(batch)
+            stats.batches += 1
+            batch = []
+
+    if batch:
+        TimetableEvent.objects.bulk_create(batch)
+        stats.events_created += len(batch)
+        stats.batches += 1
+
+
+def _existing_rows(source):
+    """{row_hash: [(id, identity), ...]} for the events currently stored."""
+    existing = defaultdict(list)
+    rows = source.events.values_list(
+        'id', 'row_hash', 'day', 'normalized_code', 'details')
+    for event_id, row_hash, day, normalized_code, details in rows.iterator():
+        existing[row_hash].append(
+            (event_id, event_identity(day, normalized_code, details)))
+    return existing
+
+
+def _apply_diff(source, rows, existing, stats):
+    # Exact fingerprint matches are left alone. Only the rows that changed
+    # are kept in memory until the whole file has been seen.
+    added = []
+    for event in _parsed_events(source, rows, stats):
+        matches = existing.get(event.row_hash)
+        if matches:
+            matches.pop()
+            stats.events_unchanged += 1
+        else:
+            added.append(event)
+
+    removed = defaultdict(list)
+    for matches in existing.values():
+        for event_id, identity in matches:
+            removed[identity].append(event_id)
+
+    inserts, updates = [], []
+    for event in added:
+        ids = removed.get(event_identity(event.day, event.normalized_code, event.details))
+        if ids:
+            event.pk = ids.pop()
+            updates.append(event)
+        else:
+            inserts.append(event)
+    deletes = [event_id for ids in removed.values() for event_id in ids]
+
+    for chunk in _chunks(deletes, stats.batch_size):
+        TimetableEvent.objects.filter(id__in=chunk).delete()
+        stats.batches += 1
+    if updates:
+        TimetableEvent.objects.bulk_update(updates, UPDATE_FIELDS, batch_size=stats.batch_size)
+        stats.batches += (len(updates) + stats.batch_size - 1) // stats.batch_size
+    for chunk in _chunks(inserts, stats.batch_size):
+        TimetableEvent.objects.bulk_create(chunk)
+        stats.batches += 1
+
+    stats.events_deleted = len(deletes)
+    stats.events_updated = len(updates)
+    stats.events_created = len(inserts)
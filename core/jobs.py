@@ -0,0 +1,95 @@
+# core/jobs.py
+import os
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .ingest import ingest_master_timetable
+from .models import TimetableSource, IngestJob
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue_ingest(source):
+    """Marks the source as PROCESSING and queues an ingest job for it."""
+    with transaction.atomic():
+        source.status = TimetableSource.PROCESSING
+        source.save(update_fields=['status'])
+        return IngestJob.objects.create(source=source)
+
+
+def has_pending_ingest(source):
+    return source.ingest_jobs.filter(
+        status__in=[IngestJob.QUEUED, IngestJob.RUNNING]).exists()
+
+
+def claim_next_job(name=None):
+    """
+    Claims the oldest queued job for this worker, or returns None.
+
+    The claim is a conditional UPDATE on the QUEUED status, so two workers
+    racing for the same row cannot both win, on SQLite or PostgreSQL.
+    """
+    name = name or worker_name()
+    candidates = IngestJob.objects.filter(
+        status=IngestJob.QUEUED).values_list('id', flat=True)[:10]
+    for job_id in candidates:
+        if _claim(job_id, name):
+            return IngestJob.objects.select_related('source').get(id=job_id)
+    return None
+
+
+def _claim(job_id, name):
+    """True if ``name`` won the job; the UPDATE only matches it while QUEUED."""
+    return IngestJob.objects.filter(id=job_id, status=IngestJob.QUEUED).update(
+        status=IngestJob.RUNNING,
+        worker=name,
+        started_at=timezone.now(),
+        attempts=F('attempts') + 1,
+    ) == 1
+
+
+def requeue_stale_jobs():
+    """
+    Puts RUNNING jobs whose worker went away back in the queue, or fails
+    them once they have used up INGEST_JOB_MAX_ATTEMPTS.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.INGEST_JOB_TIMEOUT)
+    stale = IngestJob.objects.filter(
+        status=IngestJob.RUNNING, started_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=settings.INGEST_JOB_MAX_ATTEMPTS)
+    for job in failed.select_related('source'):
+        _finish(job, IngestJob.FAILED, 'Worker timed out too many times.')
+    return stale.update(status=IngestJob.QUEUED, worker='')
+
+
+def _finish(job, status, error=''):
+    job.status = status
+    job.error = error
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished_at'])
+    if status == IngestJob.FAILED:
+        TimetableSource.objects.filter(id=job.source_id).update(
+            status=TimetableSource.FAILED)
+
+
+def run_job(job):
+    """Runs one claimed job and records the outcome on the job and source."""
+    try:
+        stats = ingest_master_timetable(job.source)
+    except Exception:
+        # The traceback names the bad row or file, which is what the
+        # uploader needs to fix it
+        _finish(job, IngestJob.FAILED, traceback.format_exc())
+        return False
+
+    print(f"Ingested source {job.source_id}: {stats}")
+    _finish(job, IngestJob.DONE)
+    return True
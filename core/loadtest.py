@@ -0,0 +1,245 @@
+# core/loadtest.py
+"""
+Load generator for the student and admin flows, over real HTTP.
+
+A student flow is one student visit: log in, upload a registration PDF to
+the student dashboard, download the timetable as PDF and JPG, then open the
+dashboard again and reuse the saved registration. An admin flow logs in as
+staff, uploads a master timetable JSON on the admin dashboard, polls the
+dashboard until the ingest worker has marked the new source Completed (or
+Failed), then deletes it again. Flows run on a pool of threads (one virtual
+user each), either back to back or arriving at a fixed rate, and every
+request's latency and status is recorded per endpoint. Only the standard
+library is used, so it runs offline against a server on the same box (see
+`manage.py loadtest`).
+"""
+import http.cookiejar
+import re
+import threading
+import time
+import urllib.parse
+import urllib.request
+import uuid
+from urllib.error import HTTPError, URLError
+
+from .benchmarks import percentile
+
+REUSE_LINK = re.compile(rb'/reuse-registration/(\d+)/')
+
+# Seconds between admin dashboard polls while an upload is being ingested
+POLL_INTERVAL = 1.0
+
+# Status badges on the admin dashboard, as TimetableSource statuses
+SOURCE_STATUSES = ((b'Active (', 'COMPLETED'), (b'Processing', 'PROCESSING'), (b'Failed', 'FAILED'))
+
+
+class LoadStats:
+    """Latency samples and status counts per endpoint, shared by the threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}   # endpoint -> [ms]
+        self.statuses = {}  # endpoint -> {status: count}
+        self.errors = {}    # endpoint -> count
+
+    def record(self, endpoint, ms, status, ok):
+        with self._lock:
+            self.samples.setdefault(endpoint, []).append(ms)
+            counts = self.statuses.setdefault(endpoint, {})
+            counts[status] = counts.get(status, 0) + 1
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + (not ok)
+
+    def rows(self, seconds):
+        rows = []
+        for endpoint, samples in self.samples.items():
+            errors = self.errors[endpoint]
+            rows.append({
+                'endpoint': endpoint,
+                'requests': len(samples),
+                'errors': errors,
+                'error_rate': f'{errors / len(samples):.1%}',
+                'p50_ms': round(percentile(samples, 50), 1),
+                'p95_ms': round(percentile(samples, 95), 1),
+                'p99_ms': round(percentile(samples, 99), 1),
+                'max_ms': round(max(samples), 1),
+                'rps': round(len(samples) / seconds, 2) if seconds else 0,
+                'statuses': ' '.join(f'{k}:{v}' for k, v in sorted(self.statuses[endpoint].items(), key=str)),
+            })
+        return rows
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Redirects are part of the response being measured, not followed
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+def source_status(body, name):
+    """(id, status) of the source called ``name`` on the admin dashboard, or (None, None)."""
+    title = re.escape(f'>{name}</h3>'.encode())
+    match = re.search(title + rb'(.*?)confirmDelete\(\'(\d+)\'', body, re.S)
+    if not match:
+        return None, None
+    for badge, status in SOURCE_STATUSES:
+        if badge in match.group(1):
+            return int(match.group(2)), status
+    return int(match.group(2)), None
+
+
+def multipart(fields, files):
+    """(body, content type) for ``fields`` {name: value} and ``files`` [(name, filename, type, bytes)]."""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, filename, content_type, data in files:
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; '
+                     f'filename="{filename}"\r\nContent-Type: {content_type}\r\n\r\n'.encode())
+        parts.append(data + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+class Session:
+    """One browser: a cookie jar and the requests every flow makes."""
+
+    def __init__(self, base_url, stats, timeout=60):
+        self.base_url = base_url.rstrip('/')
+        self.stats = stats
+        self.timeout = timeout
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect)
+
+    def csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        return ''
+
+    def request(self, endpoint, path, data=None, content_type=None, expect=(200,)):
+        """Returns (status, body); records the latency under ``endpoint``."""
+        req = urllib.request.Request(self.base_url + path, data=data)
+        if content_type:
+            req.add_header('Content-Type', content_type)
+        started = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=self.timeout) as response:
+                status, body = response.status, response.read()
+        except HTTPError as e:
+            status, body = e.code, e.read()
+        except (URLError, OSError) as e:
+            status, body = type(e).__name__, b''
+        self.stats.record(endpoint, (time.perf_counter() - started) * 1000, status, status in expect)
+        return status, body
+
+    def login(self, username, password):
+        self.request('login_page', '/login/')
+        form = urllib.parse.urlencode({
+            'username': username,
+            'password': password,
+            'csrfmiddlewaretoken': self.csrf_token(),
+        }).encode()
+        status, _ = self.request('login', '/login/', form, 'application/x-www-form-urlencoded', expect=(302,))
+        return status == 302
+
+
+class StudentSession(Session):
+    """The student flow: registration PDF upload, downloads and reuse."""
+
+    def upload(self, source_id, pdf):
+        body, content_type = multipart(
+            {'csrfmiddlewaretoken': self.csrf_token(), 'timetable_source': source_id},
+            [('course_reg_pdf', 'registration.pdf', 'application/pdf', pdf)])
+        return self.request('student_dashboard', '/student-dashboard/', body, content_type)
+
+    def run_flow(self, source_id, username, password, pdf, codes):
+        started = time.perf_counter()
+        ok = self.login(username, password)
+        if ok:
+            status, _ = self.upload(source_id, pdf)
+            ok = status == 200
+            query = urllib.parse.urlencode({'source_id': source_id, 'codes': ','.join(codes)})
+            self.request('download_timetable_pdf', f'/download-timetable/?{query}')
+            self.request('download_timetable_jpg', f'/download-timetable-jpg/?{query}')
+            # Coming back later: the saved registration is listed on the dashboard
+            _, body = self.request('student_dashboard_page', '/student-dashboard/')
+            match = REUSE_LINK.search(body) if ok else None
+            if match:
+                self.request('reuse_course_registration', f'/reuse-registration/{match.group(1).decode()}/')
+            else:
+                ok = False
+        self.stats.record('flow', (time.perf_counter() - started) * 1000, 'ok' if ok else 'failed', ok)
+
+
+class AdminSession(Session):
+    """The admin flow: master timetable upload, waiting out its ingest, delete."""
+
+    def upload_master(self, name, master_json):
+        body, content_type = multipart(
+            {'csrfmiddlewaretoken': self.csrf_token(), 'academic_year': '2024/2025',
+             'semester': 'Load test', 'display_name': name},
+            [('source_json', f'{name}.json', 'application/json', master_json)])
+        status, _ = self.request('admin_dashboard', '/dashboard/admin', body, content_type, expect=(302,))
+        return status == 302
+
+    def wait_for_ingest(self, name, timeout):
+        """Polls the dashboard until ``name`` leaves Processing; returns (id, status)."""
+        deadline = time.monotonic() + timeout
+        while True:
+            _, body = self.request('admin_dashboard_page', '/dashboard/admin')
+            source_id, status = source_status(body, name)
+            if status not in (None, 'PROCESSING') or time.monotonic() >= deadline:
+                return source_id, status
+            time.sleep(POLL_INTERVAL)
+
+    def delete(self, source_id):
+        form = urllib.parse.urlencode({'csrfmiddlewaretoken': self.csrf_token()}).encode()
+        status, _ = self.request('delete_timetable_source', f'/delete-timetable/{source_id}/', form,
+                                 'application/x-www-form-urlencoded')
+        return status == 200
+
+    def run_flow(self, username, password, name, master_json, ingest_timeout):
+        started = time.perf_counter()
+        ok = self.login(username, password) and self.upload_master(name, master_json)
+        if ok:
+            source_id, status = self.wait_for_ingest(name, ingest_timeout)
+            ok = status == 'COMPLETED'
+            # Upload to a finished ingest, as the admin sees it
+            self.stats.record('ingest', (time.perf_counter() - started) * 1000, status or 'missing', ok)
+            if source_id is not None:
+                ok = self.delete(source_id) and ok
+        self.stats.record('admin_flow', (time.perf_counter() - started) * 1000, 'ok' if ok else 'failed', ok)
+
+
+def run(base_url, flows, concurrency=10, rate=0.0, timeout=60):
+    """
+    Runs ``flows`` ([(session class, run_flow arguments)]) on ``concurrency``
+    threads, each flow in a fresh session. With ``rate`` > 0 flow n starts
+    no earlier than n / rate seconds in (an arrival rate); otherwise they
+    run back to back. Returns (LoadStats, seconds).
+    """
+    stats = LoadStats()
+    lock = threading.Lock()
+    pending = iter(enumerate(flows))
+    started = time.perf_counter()
+
+    def worker():
+        while True:
+            with lock:
+                try:
+                    n, (session, args) = next(pending)
+                except StopIteration:
+                    return
+            if rate > 0:
+                delay = started + n / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            session(base_url, stats, timeout).run_flow(*args)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, concurrency))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats, time.perf_counter() - started
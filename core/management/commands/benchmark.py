@@ -0,0 +1,123 @@
+import json
+import os
+import platform
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarks import BENCHMARKS, SUITE, compare
+from core.management.utils import print_table
+
+
+class Command(BaseCommand):
+    help = 'Run named performance benchmarks (or the whole suite), print, save and compare the results'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='+', metavar='name', choices=sorted(BENCHMARKS) + ['suite'])
+        parser.add_argument(
+            '--events',
+            type=int,
+            default=10000,
+            help='Number of synthetic events to generate',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--corpus',
+            help='Directory of sample registration PDFs (synthetic ones are generated otherwise)',
+        )
+        parser.add_argument(
+            '--count',
+            type=int,
+            default=20,
+            help='Number of synthetic inputs to generate',
+        )
+        parser.add_argument(
+            '--sizes',
+            default='1000,10000,100000',
+            help='Comma-separated event counts for the ingest benchmark',
+        )
+        parser.add_argument('--output', help='Write the results as JSON to this path')
+        parser.add_argument(
+            '--baseline',
+            default=settings.BENCHMARK_BASELINE,
+            help='Baseline JSON to compare against (default: BENCHMARK_BASELINE)',
+        )
+        parser.add_argument(
+            '--save-baseline',
+            action='store_true',
+            help='Store these results as the new baseline instead of comparing',
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.2,
+            help='Allowed slowdown against the baseline, as a fraction (default 0.2)',
+        )
+
+    def handle(self, *args, **options):
+        names = []
+        for name in options.pop('names'):
+            for n in (SUITE if name == 'suite' else [name]):
+                if n not in names:
+                    names.append(n)
+        try:
+            options['sizes'] = [int(s) for s in options['sizes'].split(',') if s.strip()]
+        except ValueError:
+            raise CommandError('--sizes must be comma-separated integers')
+
+        results = {}
+        for name in names:
+            func = BENCHMARKS[name]
+            self.stdout.write(f'Running {func.__name__}: {func.__doc__}')
+            try:
+                results[name] = func(**options)
+            except Exception as e:
+                raise CommandError(f'Benchmark {name} failed: {e}')
+            print_table(self.stdout, results[name])
+            self.stdout.write('')
+
+        report = {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'machine': platform.node(),
+            'cpus': os.cpu_count(),
+            'options': {k: options[k] for k in ('events', 'seed', 'count', 'sizes')},
+            'results': results,
+        }
+        if options['output']:
+            self.write_json(options['output'], report)
+            self.stdout.write(f'Results written to {options["output"]}')
+
+        baseline_path = options['baseline']
+        if options['save_baseline']:
+            baseline = self.read_json(baseline_path) if os.path.exists(baseline_path) else {'results': {}}
+            baseline.update({k: v for k, v in report.items() if k != 'results'})
+            baseline['results'].update(results)
+            self.write_json(baseline_path, baseline)
+            self.stdout.write(self.style.SUCCESS(f'✓ Baseline saved to {baseline_path}'))
+            return
+        if not os.path.exists(baseline_path):
+            self.stdout.write(f'No baseline at {baseline_path}; run with --save-baseline to create one')
+            return
+
+        baseline = self.read_json(baseline_path)
+        rows, regressions = compare(results, baseline['results'], options['tolerance'])
+        self.stdout.write(f'Compared with {baseline_path} ({baseline.get("created")}):')
+        print_table(self.stdout, rows)
+        if regressions:
+            raise CommandError(f'{regressions} measurements regressed by more than {options["tolerance"]:.0%}')
+        self.stdout.write(self.style.SUCCESS(f'✓ No regressions beyond {options["tolerance"]:.0%}'))
+
+    def read_json(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not read {path}: {e}')
+
+    def write_json(self, path, data):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2, default=str)
@@ -0,0 +1,83 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.cohort import CohortError, CohortJob, items_from_csv, items_from_pdfs
+from core.extraction import extract_course_codes
+from core.management.utils import print_table
+from core.models import TimetableSource
+from core.rendering import TEMPLATES
+from core.views import get_schedule_index
+
+
+class Command(BaseCommand):
+    help = 'Render timetables for a cohort of students into a ZIP and report per-student timings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source_id', type=int)
+        parser.add_argument(
+            '--csv',
+            help='CSV with one student per row: name or ID, then course codes',
+        )
+        parser.add_argument(
+            '--pdf-dir',
+            help='Directory of student registration PDFs (file name = student)',
+        )
+        parser.add_argument('--template', choices=TEMPLATES, default='modern')
+        parser.add_argument('--format', choices=['pdf', 'jpg', 'png', 'webp'], default='pdf')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Render processes (defaults to COHORT_WORKERS, or one per core)',
+        )
+        parser.add_argument('--output', help='ZIP path (default: cohort_<source_id>.zip)')
+
+    def handle(self, *args, **options):
+        if not options['csv'] and not options['pdf_dir']:
+            raise CommandError('Give --csv and/or --pdf-dir')
+        try:
+            source = TimetableSource.objects.get(id=options['source_id'])
+        except TimetableSource.DoesNotExist:
+            raise CommandError(f"TimetableSource {options['source_id']} does not exist")
+        schedule_index = get_schedule_index(source.id)
+        if not schedule_index:
+            raise CommandError(f'"{source}" has no parsed schedule yet')
+
+        items = []
+        if options['csv']:
+            with open(options['csv'], encoding='utf-8-sig') as f:
+                items += items_from_csv(f.read())
+        if options['pdf_dir']:
+            items += items_from_pdfs(self.read_pdfs(options['pdf_dir']), self.extract)
+        if not items:
+            raise CommandError('No students with course codes found')
+
+        try:
+            job = CohortJob(source, schedule_index, items, options['template'],
+                            options['format'], options['workers'])
+        except CohortError as e:
+            raise CommandError(str(e))
+
+        output = options['output'] or f'cohort_{source.id}.zip'
+        self.stdout.write(f'Rendering {len(items)} timetables for "{source}" with {job.workers} workers...')
+        with open(output, 'wb') as f:
+            for chunk in job.iter_zip():
+                f.write(chunk)
+
+        print_table(self.stdout, job.report_rows())
+        rendered = sum(1 for item in items if item.status == 'rendered')
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {output}: {len(items)} students, {job.unique_sets} unique course sets, '
+            f'{rendered} rendered in {job.total_ms / 1000:.2f}s'))
+
+    def read_pdfs(self, directory):
+        for name in sorted(os.listdir(directory)):
+            if name.lower().endswith('.pdf'):
+                with open(os.path.join(directory, name), 'rb') as f:
+                    yield name, f.read()
+
+    def extract(self, data):
+        return extract_course_codes(data, max_pages=settings.REGISTRATION_PDF_MAX_PAGES,
+                                    max_bytes=settings.REGISTRATION_PDF_MAX_BYTES)
@@ -0,0 +1,183 @@
+import json
+import os
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from core import artifacts, snapshots
+from core.ingest import ingest_master_timetable
+from core.management.utils import print_table
+from core.models import CourseRegistrationHistory, TimetableEvent, TimetableSource, User
+from core.synthetic import FIRST_NAMES, SURNAMES, iter_master_rows, registration_sets
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic users, timetable semesters, events and registration history at scale'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000, help='Number of users (mostly students)')
+        parser.add_argument('--sources', type=int, default=3, help='Number of semesters (TimetableSources)')
+        parser.add_argument('--events', type=int, default=20000, help='Events per semester')
+        parser.add_argument(
+            '--history',
+            type=int,
+            default=3,
+            help='Most registration history entries per student (0 to N, one semester each)',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--prefix',
+            default='scale',
+            help='Username/file prefix marking generated data, so --clear can remove it',
+        )
+        parser.add_argument('--password', default='password', help='Password of every generated user')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Rows per bulk_create batch (defaults to INGEST_BATCH_SIZE)',
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Delete previously generated data with this prefix first',
+        )
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        batch_size = options['batch_size'] or settings.INGEST_BATCH_SIZE
+        rng = random.Random(options['seed'])
+        timings = []
+
+        if options['clear']:
+            started = time.perf_counter()
+            deleted = self.clear(prefix)
+            timings.append({'step': 'clear', 'rows': deleted, 'seconds': round(time.perf_counter() - started, 2)})
+        elif User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(f'Generated data with prefix "{prefix}" already exists; use --clear or another --prefix')
+
+        started = time.perf_counter()
+        users = self.create_users(prefix, options['users'], options['password'], rng, batch_size)
+        timings.append({'step': 'users', 'rows': len(users), 'seconds': round(time.perf_counter() - started, 2)})
+
+        admin = next((u for u in users if u.is_staff), users[0])
+        sources = []
+        for n in range(options['sources']):
+            started = time.perf_counter()
+            source = self.create_source(prefix, n, options['events'], options['seed'] + n, admin, batch_size)
+            sources.append(source)
+            timings.append({'step': f'source {source.display_name}', 'rows': source.total_events,
+                            'seconds': round(time.perf_counter() - started, 2)})
+
+        started = time.perf_counter()
+        students = [u for u in users if u.role == User.STUDENT]
+        histories = self.create_history(students, sources, options['history'], options['seed'], rng, batch_size)
+        timings.append({'step': 'history', 'rows': histories, 'seconds': round(time.perf_counter() - started, 2)})
+
+        print_table(self.stdout, timings)
+        total = sum(t['seconds'] for t in timings)
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {len(users)} users, {len(sources)} sources, {sum(s.total_events for s in sources)} events, '
+            f'{histories} history entries in {total:.1f}s (log in as {users[0].username} / {options["password"]})'))
+
+    def clear(self, prefix):
+        sources = TimetableSource.objects.filter(uploader__username__startswith=f'{prefix}_')
+        for source in sources:
+            if source.source_json:
+                source.source_json.delete(save=False)
+            snapshots.drop(source.id)
+            artifacts.drop(source.id)
+        # Sources, events and history all cascade from the generated users
+        deleted, _ = User.objects.filter(username__startswith=f'{prefix}_').delete()
+        return deleted
+
+    def create_users(self, prefix, count, password, rng, batch_size):
+        # Hashing is the slow part of creating users; every user shares one hash
+        hashed = make_password(password)
+        users = []
+        for i in range(count):
+            r = rng.random()
+            role = User.STAFF if r < 0.01 else User.TEACHER if r < 0.05 else User.STUDENT
+            first, last = rng.choice(FIRST_NAMES), rng.choice(SURNAMES)
+            username = f'{prefix}_{i:06d}'
+            users.append(User(
+                username=username,
+                first_name=first,
+                last_name=last,
+                email=f'{username}@example.edu',
+                password=hashed,
+                role=role,
+                is_staff=role == User.STAFF,
+            ))
+        if users and not any(u.is_staff for u in users):
+            users[0].role, users[0].is_staff = User.STAFF, True
+        return User.objects.bulk_create(users, batch_size=batch_size)
+
+    def create_source(self, prefix, n, events, seed, uploader, batch_size):
+        """Writes a synthetic master JSON and ingests it like an upload."""
+        year = 2024 - n // 2
+        semester = ('Semester 1', 'Semester 2')[n % 2]
+        name = f'{prefix}_{year}_{year + 1}_{semester.replace(" ", "_").lower()}.json'
+        relative = os.path.join('master_timetables', name)
+        path = os.path.join(settings.MEDIA_ROOT, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(list(iter_master_rows(events, seed)), f)
+
+        source = TimetableSource.objects.create(
+            academic_year=f'{year}/{year + 1}',
+            semester=semester,
+            display_name=f'{year}/{year + 1} {semester} ({prefix})',
+            source_json=relative,
+            uploader=uploader,
+        )
+        ingest_master_timetable(source, batch_size=batch_size)
+        return source
+
+    def create_history(self, students, sources, per_student, seed, rng, batch_size):
+        if not students or not sources or per_student <= 0:
+            return 0
+        catalogs = {
+            s.id: sorted(set(TimetableEvent.objects.filter(source=s).values_list('normalized_code', flat=True)))
+            for s in sources
+        }
+        wanted = [rng.randint(0, min(per_student, len(sources))) for _ in students]
+        # Draw all registrations per source up front, then hand them out
+        pools = {s.id: registration_sets(catalogs[s.id], sum(wanted), seed=seed + s.id) for s in sources}
+        now = timezone.now()
+
+        created = 0
+        batch = []
+        with transaction.atomic():
+            for student, count in zip(students, wanted):
+                for source in rng.sample(sources, count):
+                    program, level, codes = next(pools[source.id])
+                    batch.append(CourseRegistrationHistory(
+                        user=student,
+                        source=source,
+                        course_codes=json.dumps(codes),
+                        display_name=f'{program} ({level}) - {source.display_name} - {len(codes)} courses',
+                        program=program,
+                        level=level,
+                    ))
+                if len(batch) >= batch_size:
+                    created += self.insert_history(batch, now, rng)
+                    batch = []
+            if batch:
+                created += self.insert_history(batch, now, rng)
+        return created
+
+    def insert_history(self, batch, now, rng):
+        rows = CourseRegistrationHistory.objects.bulk_create(batch)
+        # bulk_create stamps last_used (auto_now) with the current time;
+        # spread it over the past semester, which bulk_update leaves alone
+        for row in rows:
+            row.last_used = now - timedelta(minutes=rng.randint(0, 60 * 24 * 120))
+        CourseRegistrationHistory.objects.bulk_update(rows, ['last_used'])
+        return len(rows)
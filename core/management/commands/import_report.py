@@ -0,0 +1,100 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.management.utils import print_table
+
+# Heavy third-party backends, each now imported on first use
+BACKENDS = [
+    ('pdfplumber', 'registration PDF parsing (pool workers)'),
+    ('pypdfium2', 'registration PDF text (pool workers)'),
+    ('xhtml2pdf.pisa', 'HTML PDF renderer'),
+    ('reportlab.pdfgen.canvas', 'canvas PDF renderer'),
+    ('PIL.ImageDraw', 'timetable images'),
+]
+
+# Runs in a fresh interpreter: sets Django up, imports argv[1:] and prints
+# timings and resident memory as JSON
+PROBE = '''
+import importlib, json, os, sys, time
+
+def rss_kb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+started = time.perf_counter()
+import django
+django.setup()
+setup_ms = (time.perf_counter() - started) * 1000
+setup_rss, setup_modules = rss_kb(), len(sys.modules)
+started = time.perf_counter()
+for name in sys.argv[1:]:
+    importlib.import_module(name)
+print(json.dumps({
+    'setup_ms': setup_ms,
+    'import_ms': (time.perf_counter() - started) * 1000,
+    'setup_rss_kb': setup_rss,
+    'rss_kb': rss_kb(),
+    'modules': len(sys.modules) - setup_modules,
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Measure process startup: import time and resident memory of the view layer and each heavy backend'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=3, help='Fresh interpreters per case (median is shown)')
+        parser.add_argument('--output', help='Write the results as JSON to this path')
+
+    def handle(self, *args, **options):
+        backends = [name for name, _ in BACKENDS]
+        cases = [
+            ('django.setup()', [], 'baseline for every row below'),
+            ('view layer (core.urls)', ['core.urls'], 'what a worker loads now'),
+            ('view layer + all backends', ['core.urls'] + backends, 'everything loaded up front, as before'),
+        ] + [(name, [name], purpose) for name, purpose in BACKENDS]
+
+        rows = []
+        for label, modules, note in cases:
+            runs = [self.probe(modules) for _ in range(max(1, options['repeat']))]
+            rows.append({
+                'case': label,
+                'setup_ms': round(statistics.median(r['setup_ms'] for r in runs), 1),
+                'import_ms': round(statistics.median(r['import_ms'] for r in runs), 1),
+                'rss_kb': int(statistics.median(r['rss_kb'] for r in runs)),
+                'added_rss_kb': int(statistics.median(r['rss_kb'] - r['setup_rss_kb'] for r in runs)),
+                'modules': runs[0]['modules'],
+                'note': note,
+            })
+        print_table(self.stdout, rows)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(rows, f, indent=2)
+            self.stdout.write(f'Results written to {options["output"]}')
+
+        lazy, eager = rows[1], rows[2]
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Lazy backends save {eager["import_ms"] - lazy["import_ms"]:.0f} ms of imports and '
+            f'{(eager["rss_kb"] - lazy["rss_kb"]) / 1024:.1f} MiB RSS per process until first use'))
+
+    def probe(self, modules):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'chronopars.settings'))
+        result = subprocess.run([sys.executable, '-c', PROBE, *modules], cwd=settings.BASE_DIR,
+                                env=env, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise CommandError(f'Importing {" ".join(modules) or "django"} failed:\n{result.stderr}')
+        # Settings may print on import; the probe's JSON is the last line
+        return json.loads(result.stdout.strip().splitlines()[-1])
@@ -0,0 +1,68 @@
+import os
+
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+
+from core.ingest import ingest_master_timetable
+from core.management.utils import print_table
+from core.models import TimetableSource
+
+
+class Command(BaseCommand):
+    help = 'Ingest (or re-ingest) the master JSON or PDF of a timetable source and report throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source_id', type=int)
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Rows per bulk_create batch (defaults to INGEST_BATCH_SIZE)',
+        )
+        parser.add_argument(
+            '--file',
+            help='Replace the source JSON or PDF with this file before ingesting',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Processes reading a master PDF (defaults to MASTER_PDF_WORKERS, 0 = one per core)',
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Rewrite every event instead of applying only the changed rows',
+        )
+        parser.add_argument(
+            '--trace-memory',
+            action='store_true',
+            help='Measure the peak Python heap with tracemalloc (slower)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            source = TimetableSource.objects.get(id=options['source_id'])
+        except TimetableSource.DoesNotExist:
+            raise CommandError(f"TimetableSource {options['source_id']} does not exist")
+
+        if options['file']:
+            with open(options['file'], 'rb') as f:
+                source.source_json.save(os.path.basename(options['file']), File(f))
+
+        self.stdout.write(f'Ingesting {source.source_json.name} for "{source}"...')
+        try:
+            stats = ingest_master_timetable(
+                source,
+                batch_size=options['batch_size'],
+                trace_memory=options['trace_memory'],
+                full=options['full'],
+                workers=options['workers'],
+            )
+        except Exception as e:
+            source.status = TimetableSource.FAILED
+            source.save()
+            raise CommandError(f'Ingest failed: {e}')
+
+        print_table(self.stdout, stats.pages)
+        self.stdout.write(self.style.SUCCESS(f'✓ {stats}'))
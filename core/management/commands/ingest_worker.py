@@ -0,0 +1,64 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.jobs import claim_next_job, requeue_stale_jobs, run_job, worker_name
+
+
+class Command(BaseCommand):
+    help = 'Process queued master timetable ingest jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the queue and exit instead of polling forever',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=None,
+            help='Seconds to sleep when the queue is empty (defaults to INGEST_WORKER_POLL_INTERVAL)',
+        )
+
+    def handle(self, *args, **options):
+        poll_interval = options['poll_interval'] or settings.INGEST_WORKER_POLL_INTERVAL
+        name = worker_name()
+        self.stopping = False
+
+        def stop(signum, frame):
+            self.stdout.write('Stopping after the current job...')
+            self.stopping = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        self.stdout.write(f'Ingest worker {name} started')
+        requeued = requeue_stale_jobs()
+        if requeued:
+            self.stdout.write(self.style.WARNING(f'⚠ Requeued {requeued} stale job(s)'))
+
+        while not self.stopping:
+            close_old_connections()
+            job = claim_next_job(name)
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(poll_interval)
+                requeue_stale_jobs()
+                continue
+
+            self.stdout.write(f'Processing job {job.id} for "{job.source}" (attempt {job.attempts})...')
+            started = time.perf_counter()
+            if run_job(job):
+                job.source.refresh_from_db()
+                self.stdout.write(self.style.SUCCESS(
+                    f'✓ Job {job.id} done: {job.source.total_events} events '
+                    f'in {time.perf_counter() - started:.2f}s'))
+            else:
+                self.stdout.write(self.style.ERROR(f'✗ Job {job.id} failed'))
+
+        self.stdout.write('Ingest worker stopped')
@@ -0,0 +1,213 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+import uuid
+from itertools import cycle
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core import artifacts, loadtest, snapshots
+from core.management.utils import print_table
+from core.models import TimetableEvent, TimetableSource, User
+from core.synthetic import make_registration_pdf, registration_sets
+
+
+class Command(BaseCommand):
+    help = ('Drive the student flow (login, PDF upload, PDF/JPG download, reuse) and the admin '
+            'flow (master JSON upload, wait for its ingest, delete) over HTTP and report latency '
+            'percentiles, throughput and errors per endpoint')
+
+    def add_arguments(self, parser):
+        parser.add_argument('source_id', type=int)
+        parser.add_argument(
+            '--url',
+            help='Server to test; by default gunicorn is started on a free local port',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Workers for the started gunicorn (defaults to gunicorn.conf.py)',
+        )
+        parser.add_argument('--students', type=int, default=200, help='Number of student flows to run')
+        parser.add_argument('--concurrency', type=int, default=20, help='Simultaneous virtual students')
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=0.0,
+            help='Flow arrivals per second (0 = start each flow as soon as a virtual student is free)',
+        )
+        parser.add_argument(
+            '--prefix',
+            default='scale',
+            help='Log in as the students created by generate_scale_data with this prefix',
+        )
+        parser.add_argument('--password', default='password')
+        parser.add_argument(
+            '--admins',
+            type=int,
+            default=1,
+            help="Admin flows to mix in; each re-uploads the source's master JSON as a new source",
+        )
+        parser.add_argument(
+            '--admin',
+            help='Staff user for the admin flows (defaults to the first staff user with --prefix)',
+        )
+        parser.add_argument(
+            '--ingest-timeout',
+            type=float,
+            default=600.0,
+            help='Seconds an admin flow waits for its upload to be ingested',
+        )
+        parser.add_argument('--timeout', type=float, default=60.0, help='Per-request timeout in seconds')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the results as JSON to this path')
+
+    def handle(self, *args, **options):
+        try:
+            source = TimetableSource.objects.get(id=options['source_id'])
+        except TimetableSource.DoesNotExist:
+            raise CommandError(f"TimetableSource {options['source_id']} does not exist")
+        usernames = list(User.objects.filter(
+            username__startswith=f"{options['prefix']}_", role=User.STUDENT,
+        ).order_by('username').values_list('username', flat=True)[:options['students']])
+        if not usernames:
+            raise CommandError(f'No "{options["prefix"]}_*" students; run generate_scale_data first')
+        catalog = sorted(set(TimetableEvent.objects.filter(source=source).values_list('normalized_code', flat=True)))
+        if not catalog:
+            raise CommandError(f'"{source}" has no parsed events')
+
+        # Every student uploads their own slip, as in a real registration rush
+        self.stdout.write(f'Preparing {options["students"]} registration PDFs...')
+        sets = registration_sets(catalog, options['students'], seed=options['seed'])
+        students = cycle(usernames)
+        flows = [(loadtest.StudentSession, (source.id, next(students), options['password'],
+                                            make_registration_pdf(codes, options['seed'] + n), codes))
+                 for n, (_, _, codes) in enumerate(sets)]
+
+        names = []
+        if options['admins'] > 0:
+            admin = self.admin_user(options['admin'], options['prefix'])
+            with source.source_json.open('rb') as f:
+                master_json = f.read()
+            names = [f'loadtest-{uuid.uuid4().hex[:12]}' for _ in range(options['admins'])]
+            # Spread through the run rather than all at the start
+            step = max(1, len(flows) // len(names))
+            for n, name in reversed(list(enumerate(names))):
+                flows.insert(n * step, (loadtest.AdminSession, (
+                    admin, options['password'], name, master_json, options['ingest_timeout'])))
+
+        processes = []
+        url = options['url']
+        if not url:
+            server, url = self.start_server(options['workers'])
+            processes.append(server)
+            if names:
+                processes.append(self.start_ingest_worker())
+        try:
+            arrivals = f", {options['rate']}/s arrivals" if options['rate'] else ''
+            self.stdout.write(f'Running {len(flows)} flows ({len(names)} admin) against {url} with '
+                              f'concurrency {options["concurrency"]}{arrivals}...')
+            stats, seconds = loadtest.run(url, flows, options['concurrency'],
+                                          options['rate'], options['timeout'])
+        finally:
+            for process in processes:
+                self.stop_server(process)
+            self.remove_uploads(names)
+
+        rows = stats.rows(seconds)
+        print_table(self.stdout, rows)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'url': url, 'seconds': round(seconds, 2), 'options': {
+                    k: options[k] for k in ('students', 'admins', 'concurrency', 'rate', 'workers')},
+                    'results': rows}, f, indent=2)
+            self.stdout.write(f'Results written to {options["output"]}')
+
+        flow = next(r for r in rows if r['endpoint'] == 'flow')
+        summary = (f'{flow["requests"]} flows in {seconds:.1f}s ({flow["rps"]} flows/s), '
+                   f'{flow["errors"]} failed, flow p95 {flow["p95_ms"]} ms')
+        admin_flow = next((r for r in rows if r['endpoint'] == 'admin_flow'), None)
+        if admin_flow:
+            summary += f'; {admin_flow["requests"]} admin flows, {admin_flow["errors"]} failed'
+        if flow['errors'] or (admin_flow and admin_flow['errors']):
+            self.stdout.write(self.style.WARNING(f'⚠ {summary}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✓ {summary}'))
+
+    def admin_user(self, username, prefix):
+        staff = User.objects.filter(is_staff=True)
+        if username:
+            staff = staff.filter(username=username)
+        else:
+            staff = staff.filter(username__startswith=f'{prefix}_')
+        admin = staff.order_by('username').values_list('username', flat=True).first()
+        if admin is None:
+            raise CommandError('No staff user for the admin flows; pass --admin or --admins 0')
+        return admin
+
+    def remove_uploads(self, names):
+        """Deletes what the admin flows left behind: unfinished sources and the uploaded files."""
+        for source in TimetableSource.objects.filter(display_name__in=names):
+            snapshots.drop(source.id)
+            artifacts.drop(source.id)
+            source.delete()
+        directory = os.path.join(settings.MEDIA_ROOT, 'master_timetables')
+        if not names or not os.path.isdir(directory):
+            return
+        for filename in os.listdir(directory):
+            if filename.startswith(tuple(names)):
+                os.remove(os.path.join(directory, filename))
+
+    def start_ingest_worker(self):
+        # Admin uploads are only ingested by the worker, as in production
+        log_path = os.path.join(settings.BASE_DIR, 'var', 'loadtest', 'ingest_worker.log')
+        log = open(log_path, 'ab')
+        worker = subprocess.Popen([sys.executable, 'manage.py', 'ingest_worker'], cwd=settings.BASE_DIR,
+                                  stdout=log, stderr=subprocess.STDOUT)
+        log.close()
+        self.stdout.write(f'Started the ingest worker (log: {log_path})')
+        return worker
+
+    def start_server(self, workers):
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            port = s.getsockname()[1]
+        log_dir = os.path.join(settings.BASE_DIR, 'var', 'loadtest')
+        os.makedirs(log_dir, exist_ok=True)
+        log_path = os.path.join(log_dir, 'server.log')
+        command = [sys.executable, '-m', 'gunicorn', 'chronopars.wsgi:application',
+                   '-c', os.path.join(settings.BASE_DIR, 'gunicorn.conf.py'),
+                   '--bind', f'127.0.0.1:{port}', '--pid', os.path.join(log_dir, 'gunicorn.pid')]
+        if workers:
+            command += ['--workers', str(workers)]
+        self.stdout.write(f'Starting gunicorn on port {port} (log: {log_path})...')
+        log = open(log_path, 'ab')
+        server = subprocess.Popen(command, cwd=settings.BASE_DIR, stdout=log, stderr=subprocess.STDOUT)
+        log.close()
+
+        url = f'http://127.0.0.1:{port}'
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'gunicorn exited with {server.returncode}; see {log_path}')
+            try:
+                urllib.request.urlopen(f'{url}/login/', timeout=2).close()
+                return server, url
+            except OSError:
+                time.sleep(0.25)
+        self.stop_server(server)
+        raise CommandError(f'gunicorn did not answer within 60s; see {log_path}')
+
+    def stop_server(self, server):
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            server.wait()
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from core.prewarm import prewarm_sources
+
+
+class Command(BaseCommand):
+    help = 'Compile and map the schedule snapshots of the most recent completed sources'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Number of sources to warm (defaults to SCHEDULE_PREWARM_SOURCES)',
+        )
+
+    def handle(self, *args, **options):
+        report = prewarm_sources(options['limit'])
+        self.stdout.write(self.style.SUCCESS(f'✓ {report}'))
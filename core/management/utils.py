@@ -0,0 +1,19 @@
+# core/management/utils.py
+"""
+Helpers shared by the management commands.
+"""
+
+
+def print_table(stdout, rows):
+    """
+    Writes a list of dicts as aligned columns, one row per dict. Columns are
+    every key in first-seen order, so rows may carry extra fields.
+    """
+    if not rows:
+        return
+    columns = list(dict.fromkeys(c for row in rows for c in row))
+    widths = {c: max(len(c), *(len(str(r.get(c, ''))) for r in rows)) for c in columns}
+    stdout.write('  '.join(c.ljust(widths[c]) for c in columns))
+    stdout.write('  '.join('-' * widths[c] for c in columns))
+    for row in rows:
+        stdout.write('  '.join(str(row.get(c, '')).ljust(widths[c]) for c in columns))
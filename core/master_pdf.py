@@ -0,0 +1,213 @@
+# core/master_pdf.py
+"""
+Rows straight from the university's master timetable PDF.
+
+Each page of the master PDF is one day: a table headed by the day name, with
+one band per room. The first cell of a band is the venue and its capacity;
+to its right every class is three short lines stacked in its merged cell:
+the course ("ENV 633 Lec 1"), the time ("7:00a - 9:55a") and the lecturer(s).
+pdfplumber's table cells split classes that span several hours, so bands are
+read from words and positions instead. Time strings have one fixed format,
+so each becomes an anchor: every word above or below it in the same band
+belongs to the time with the nearest horizontal centre.
+
+Pages are independent. ``extract_rows`` hands them to a process pool, one
+page per task, with every worker opening the file itself, and returns rows
+shaped like the master JSON ({'Day', 'Time', 'Course', 'Venue',
+'Instructor(s)'}) in page order, so both paths share build_event().
+"""
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+
+from .schedule import DAYS_OF_WEEK
+
+TIME_RE = re.compile(r'(?<![\d:])(?:1[0-2]|[1-9]):[0-5]\d[ap]\s*-\s*(?:1[0-2]|[1-9]):[0-5]\d[ap]')
+TIME_POINT_RE = re.compile(r'\d:\d{2}[ap]')
+
+# Words whose tops are this close (in points) are on the same line
+LINE_TOLERANCE = 3
+
+# Words further apart than this (in points) can't be one time string
+WORD_GAP = 8
+
+# Words whose centre is further than this from every time string on their
+# band are left out rather than pinned on a neighbouring class
+MAX_OFFSET = 70
+
+# Below this many pages the pool's startup costs more than it saves
+MIN_PARALLEL_PAGES = 2
+
+
+class MasterPdfError(Exception):
+    pass
+
+
+class PageResult:
+    def __init__(self, page, day, rows, missed, ms):
+        self.page = page  # 1-based
+        self.day = day
+        self.rows = rows
+        self.missed = missed  # classes whose time couldn't be read
+        self.ms = ms
+
+    def as_dict(self):
+        return {'page': self.page, 'day': self.day, 'rows': len(self.rows),
+                'missed': self.missed, 'ms': round(self.ms, 1)}
+
+
+def _lines(words):
+    """Groups words into lines top to bottom, each sorted left to right."""
+    lines = []
+    for word in sorted(words, key=lambda w: (w['top'], w['x0'])):
+        if lines and abs(word['top'] - lines[-1][0]['top']) <= LINE_TOLERANCE:
+            lines[-1].append(word)
+        else:
+            lines.append([word])
+    return [sorted(line, key=lambda w: w['x0']) for line in lines]
+
+
+def _text(words):
+    return ' '.join(w['text'] for w in words)
+
+
+def _times(line):
+    """(time string, x centre) for each time range on a line of words."""
+    anchors = []
+    text, owners = '', []
+    for n, word in enumerate(line):
+        if n:
+            # A wide gap separates neighbouring cells; keep the regex from
+            # joining one class's start time to the next one's
+            sep = ' ' if word['x0'] - line[n - 1]['x1'] <= WORD_GAP else ' | '
+            text += sep
+            owners.extend([None] * len(sep))
+        text += word['text']
+        owners.extend([word] * len(word['text']))
+    for match in TIME_RE.finditer(text):
+        covered = [w for w in owners[match.start():match.end()] if w is not None]
+        x0, x1 = covered[0]['x0'], covered[-1]['x1']
+        anchors.append((re.sub(r'\s*-\s*', ' - ', match.group()), (x0 + x1) / 2))
+    return anchors
+
+
+def _nearest(anchors, word):
+    """Index of the anchor closest to ``word``, or None if none is close."""
+    centre = (word['x0'] + word['x1']) / 2
+    best = min(range(len(anchors)), key=lambda i: abs(anchors[i][1] - centre))
+    return best if abs(anchors[best][1] - centre) <= MAX_OFFSET else None
+
+
+def _day(words):
+    for word in words:
+        if word['text'].title() in DAYS_OF_WEEK:
+            return word['text'].title()
+    return ''
+
+
+def _venue_cells(page):
+    """Bounding boxes of the first-column cells that start a room band."""
+    cells = []
+    for table in page.find_tables():
+        left = table.bbox[0]
+        for row in table.rows:
+            cell = row.cells[0] if row.cells else None
+            if cell is not None and abs(cell[0] - left) < 1:
+                cells.append(cell)
+    return cells
+
+
+def rows_from_page(page):
+    """
+    (day, rows, missed) for one pdfplumber page, rows top to bottom and left
+    to right. In cramped one-hour cells the PDF can print a class's lines on
+    top of each other; such a class has no readable time and is counted in
+    ``missed`` instead (every class prints two time points).
+    """
+    words = page.extract_words(use_text_flow=True)
+    day = _day(words)
+    rows = []
+    for _, top, x1, bottom in _venue_cells(page):
+        band = [w for w in words if w['top'] >= top - 1 and w['bottom'] <= bottom + 1]
+        venue = [w for w in band if w['x1'] <= x1 + 1]
+        grid = _lines([w for w in band if w['x0'] >= x1 - 1])
+        time_lines = [i for i, line in enumerate(grid) if _times(line)]
+        if not time_lines:
+            # The header row, or a room with nothing booked
+            continue
+        at = time_lines[0]
+        anchors = _times(grid[at])
+        courses = [[] for _ in anchors]
+        lecturers = [[] for _ in anchors]
+        for i, line in enumerate(grid):
+            if i == at:
+                continue
+            into = courses if i < at else lecturers
+            for word in line:
+                if word['text'] == '-' or TIME_POINT_RE.search(word['text']):
+                    # Pieces of an unreadable time from a cramped cell
+                    continue
+                nearest = _nearest(anchors, word)
+                if nearest is not None:
+                    into[nearest].append(word)
+        for (time_range, _), course, lecturer in zip(anchors, courses, lecturers):
+            rows.append({
+                'Day': day,
+                'Time': time_range,
+                'Course': _text(course),
+                'Venue': ' '.join(_text(line) for line in _lines(venue)),
+                'Instructor(s)': _text(lecturer),
+            })
+    points = sum(len(TIME_POINT_RE.findall(w['text'])) for w in words)
+    return day, rows, max(0, points // 2 - len(rows))
+
+
+def extract_page(path, index):
+    """Runs in a pool process; returns a PageResult for page ``index`` (0-based)."""
+    import pdfplumber
+
+    started = time.perf_counter()
+    with pdfplumber.open(path) as pdf:
+        day, rows, missed = rows_from_page(pdf.pages[index])
+    return PageResult(index + 1, day, rows, missed, (time.perf_counter() - started) * 1000)
+
+
+def is_pdf(path):
+    with open(path, 'rb') as f:
+        return f.read(5) == b'%PDF-'
+
+
+def page_count(path):
+    import pdfplumber
+
+    try:
+        with pdfplumber.open(path) as pdf:
+            return len(pdf.pages)
+    except Exception as e:
+        raise MasterPdfError(f"Could not open master PDF {os.path.basename(path)}: {e}") from e
+
+
+def extract_pages(path, workers=None):
+    """PageResult for every page of the master PDF, in page order."""
+    pages = page_count(path)
+    workers = min(workers or settings.MASTER_PDF_WORKERS or os.cpu_count(), pages)
+    if pages < MIN_PARALLEL_PAGES or workers <= 1:
+        return [extract_page(path, index) for index in range(pages)]
+
+    context = multiprocessing.get_context(settings.MASTER_PDF_START_METHOD)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        return list(pool.map(extract_page, [path] * pages, range(pages)))
+
+
+def extract_rows(path, workers=None):
+    """(rows, [PageResult]) for the whole file, rows in page order."""
+    results = extract_pages(path, workers)
+    rows = [row for result in results for row in result.rows]
+    if not rows:
+        # Not a master timetable; ingesting nothing would delete every event
+        raise MasterPdfError(f"No timetable rows found in {os.path.basename(path)}")
+    return rows, results
@@ -0,0 +1,196 @@
+# core/memprofile.py
+"""
+Opt-in allocation profiling to find what grows in long-lived workers.
+
+With MEMORY_PROFILE_ENABLED, every MEMORY_PROFILE_EVERY-th request to each
+endpoint is bracketed by tracemalloc snapshots (after a gc pass): one as it
+starts and one as the worker's next request starts, once the request and its
+response are gone. A sync worker handles one request at a time, so the diff
+belongs to that request alone.
+
+A single diff is noisy: objects freed a request or two later, free lists and
+one-off lazy imports all show up as growth. So a source line only counts
+once it has grown on MEMORY_PROFILE_STREAK profiled requests of the same
+endpoint in a row; from then on its growth, including that of the requests
+in the streak, is added to the endpoint's totals until a request where it
+doesn't grow starts the count over. The endpoint therefore reports sustained
+growth only. A site that keeps growing on nearly every request is a leak;
+one that stops after a while is a cache warming up.
+
+Each worker writes its totals to its own file under MEMORY_PROFILE_DIR and
+``report()`` merges them for the staff endpoint; totals of workers that have
+exited are folded into one aggregate file (core/workerfiles.py). Tracing
+slows everything down noticeably, so this is for a test box or a single
+canary worker.
+"""
+import gc
+import os
+import threading
+import tracemalloc
+
+from django.conf import settings
+
+from .workerfiles import WorkerFiles
+
+_lock = threading.Lock()
+_seen = {}       # endpoint -> requests so far
+_endpoints = {}  # endpoint -> {'requests', 'retained', 'sites': {site: [bytes, blocks, grew]}}
+_streaks = {}    # endpoint -> {site: [requests in a row, bytes, blocks not yet counted]}
+_pending = None  # (endpoint, snapshot) of the profiled request before this one
+
+
+def _filters():
+    return [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    ]
+
+
+def start():
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(settings.MEMORY_PROFILE_FRAMES)
+
+
+def should_profile(endpoint):
+    with _lock:
+        n = _seen[endpoint] = _seen.get(endpoint, 0) + 1
+    return n % max(1, settings.MEMORY_PROFILE_EVERY) == 0
+
+
+def snapshot():
+    gc.collect()
+    return tracemalloc.take_snapshot().filter_traces(_filters())
+
+
+def checkpoint(endpoint):
+    """
+    Called as each request starts, with its URL name (None if it has none):
+    closes the previous profiled request and opens this one if it's sampled.
+    """
+    global _pending
+    if _files.reset_pending():
+        # reset() ran in another worker
+        _pending = None
+        with _lock:
+            _seen.clear()
+            _endpoints.clear()
+            _streaks.clear()
+    profile = endpoint is not None and should_profile(endpoint)
+    if _pending is None and not profile:
+        return
+    current = snapshot()
+    if _pending is not None:
+        record(_pending[0], _pending[1], current)
+    _pending = (endpoint, current) if profile else None
+
+
+def record(endpoint, before, after):
+    """
+    Adds what survived between the two snapshots to ``endpoint``'s totals,
+    for the sites on a growth streak of MEMORY_PROFILE_STREAK or more.
+    """
+    diff = after.compare_to(before, 'traceback' if settings.MEMORY_PROFILE_FRAMES > 1 else 'lineno')
+    streak = max(1, settings.MEMORY_PROFILE_STREAK)
+    with _lock:
+        totals = _endpoints.setdefault(endpoint, {'requests': 0, 'retained': 0, 'sites': {}})
+        totals['requests'] += 1
+        previous, growing = _streaks.get(endpoint, {}), {}
+        for stat in diff:
+            if stat.size_diff <= 0:
+                continue
+            site = ' <- '.join(f'{frame.filename}:{frame.lineno}' for frame in stat.traceback)
+            run = growing[site] = previous.get(site, [0, 0, 0])
+            run[0] += 1
+            run[1] += stat.size_diff
+            run[2] += stat.count_diff
+            if run[0] < streak:
+                continue
+            entry = totals['sites'].setdefault(site, [0, 0, 0])
+            entry[0] += run[1]
+            entry[1] += run[2]
+            entry[2] += streak if run[0] == streak else 1
+            totals['retained'] += run[1]
+            run[1] = run[2] = 0
+        # Sites that didn't grow this time start over
+        _streaks[endpoint] = growing
+        # Keep the file small: only the largest sites survive between requests
+        keep = settings.MEMORY_PROFILE_TOP * 5
+        if len(totals['sites']) > keep:
+            totals['sites'] = dict(sorted(totals['sites'].items(), key=lambda kv: -kv[1][0])[:keep])
+    flush()
+
+
+def _merge(total, data):
+    """Adds one file's endpoint totals to ``total``."""
+    total = total or {'endpoints': {}}
+    keep = settings.MEMORY_PROFILE_TOP * 5
+    for endpoint, totals in data['endpoints'].items():
+        into = total['endpoints'].setdefault(endpoint, {'requests': 0, 'retained': 0, 'sites': {}})
+        into['requests'] += totals['requests']
+        into['retained'] += totals['retained']
+        for site, (size, blocks, grew) in totals['sites'].items():
+            entry = into['sites'].setdefault(site, [0, 0, 0])
+            entry[0] += size
+            entry[1] += blocks
+            entry[2] += grew
+        if len(into['sites']) > keep:
+            into['sites'] = dict(sorted(into['sites'].items(), key=lambda kv: -kv[1][0])[:keep])
+    return total
+
+
+_files = WorkerFiles('MEMORY_PROFILE_DIR', _merge)
+
+
+def flush():
+    with _lock:
+        payload = {
+            'pid': os.getpid(),
+            'traced_kb': tracemalloc.get_traced_memory()[0] // 1024 if tracemalloc.is_tracing() else 0,
+            'endpoints': _endpoints,
+        }
+        _files.write(payload)
+
+
+def report(top=None):
+    """
+    {'workers': [...], 'endpoints': {name: {...}}} merged over every worker
+    file, with each endpoint's ``top`` sites by bytes retained. Only growth
+    sustained for MEMORY_PROFILE_STREAK profiled requests is included.
+    """
+    top = top or settings.MEMORY_PROFILE_TOP
+    workers, total = [], None
+    for name, data in _files.read_all():
+        if name != 'aggregate':
+            workers.append({'file': name, 'pid': data['pid'], 'traced_kb': data['traced_kb']})
+        total = _merge(total, data)
+    merged = total['endpoints'] if total else {}
+
+    endpoints = {}
+    for endpoint, totals in sorted(merged.items(), key=lambda kv: -kv[1]['retained']):
+        requests = totals['requests']
+        sites = sorted(totals['sites'].items(), key=lambda kv: -kv[1][0])[:top]
+        endpoints[endpoint] = {
+            'profiled_requests': requests,
+            'retained_kb': round(totals['retained'] / 1024, 1),
+            'retained_per_request_kb': round(totals['retained'] / 1024 / requests, 2) if requests else 0,
+            'top_sites': [{
+                'site': site,
+                'retained_kb': round(size / 1024, 1),
+                'blocks': blocks,
+                # Share of profiled requests this site grew on, counting only
+                # its streaks: near 1.0 is a leak
+                'grew_on': round(grew / requests, 2) if requests else 0,
+            } for site, (size, blocks, grew) in sites],
+        }
+    return {'workers': workers, 'streak': settings.MEMORY_PROFILE_STREAK, 'endpoints': endpoints}
+
+
+def reset():
+    global _pending
+    _pending = None
+    with _lock:
+        _seen.clear()
+        _endpoints.clear()
+        _streaks.clear()
+    _files.clear()
@@ -0,0 +1,143 @@
+# core/metrics.py
+"""
+Named stage timings, aggregated into histograms across worker processes.
+
+Wrap a step in ``with stage('extract'):`` and its duration is added to that
+stage's histogram in this process. At the end of each request the process
+writes its histograms to its own file under METRICS_DIR (only if something
+changed), and ``exposition()`` merges every worker's file into Prometheus
+text format. Histograms of workers that have exited are folded into one
+aggregate file (core/workerfiles.py), so the counters never go backwards
+when gunicorn recycles a worker and the directory doesn't grow; ``reset()``
+clears them all.
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+
+from .workerfiles import WorkerFiles
+
+METRIC = 'chronoparse_stage_seconds'
+
+_lock = threading.Lock()
+_stages = {}        # name -> {'buckets': [count per bound], 'sum': s, 'count': n}
+_dirty = False
+
+
+def buckets():
+    return [float(b) for b in settings.METRICS_BUCKETS]
+
+
+def observe(name, seconds):
+    global _dirty
+    bounds = buckets()
+    with _lock:
+        hist = _stages.get(name)
+        if hist is None:
+            hist = _stages[name] = {'buckets': [0] * len(bounds), 'sum': 0.0, 'count': 0}
+        for i, bound in enumerate(bounds):
+            if seconds <= bound:
+                hist['buckets'][i] += 1
+                break
+        hist['sum'] += seconds
+        hist['count'] += 1
+        _dirty = True
+
+
+@contextmanager
+def stage(name):
+    """Times the block as stage ``name``, whether or not it raises."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started)
+
+
+def _merge(total, data):
+    """Adds one file's histograms to ``total``; other bucket bounds are skipped."""
+    bounds = buckets()
+    if total is None or total.get('buckets') != bounds:
+        total = {'buckets': bounds, 'stages': {}}
+    if data.get('buckets') != bounds:
+        # Written before METRICS_BUCKETS changed; not comparable
+        return total
+    for stage_name, hist in data['stages'].items():
+        into = total['stages'].setdefault(stage_name, {'buckets': [0] * len(bounds), 'sum': 0.0, 'count': 0})
+        into['buckets'] = [a + b for a, b in zip(into['buckets'], hist['buckets'])]
+        into['sum'] += hist['sum']
+        into['count'] += hist['count']
+    return total
+
+
+_files = WorkerFiles('METRICS_DIR', _merge)
+
+
+def flush(**kwargs):
+    """Writes this process's histograms if they changed since the last flush."""
+    global _dirty
+    if not _dirty or not settings.METRICS_DIR:
+        return
+    with _lock:
+        payload = {'buckets': buckets(), 'stages': json.loads(json.dumps(_stages))}
+        _dirty = False
+    _files.write(payload)
+
+
+def drop_if_reset(**kwargs):
+    """At request start: forgets what this process holds if reset() ran elsewhere."""
+    if settings.METRICS_DIR and _files.reset_pending():
+        with _lock:
+            _stages.clear()
+
+
+request_started.connect(drop_if_reset, dispatch_uid='core.metrics.drop_if_reset')
+request_finished.connect(flush, dispatch_uid='core.metrics.flush')
+
+
+def collect():
+    """{stage: histogram} summed over every worker file with the current buckets."""
+    if not settings.METRICS_DIR:
+        with _lock:
+            return json.loads(json.dumps(_stages))
+    flush()
+    total = None
+    for _, data in _files.read_all():
+        total = _merge(total, data)
+    return total['stages'] if total else {}
+
+
+def _le(bound):
+    return f'{bound:g}'
+
+
+def exposition():
+    """Prometheus text format (version 0.0.4) of the merged histograms."""
+    bounds = buckets()
+    lines = [
+        f'# HELP {METRIC} Time spent in named request stages.',
+        f'# TYPE {METRIC} histogram',
+    ]
+    for name, hist in sorted(collect().items()):
+        cumulative = 0
+        for bound, count in zip(bounds, hist['buckets']):
+            cumulative += count
+            lines.append(f'{METRIC}_bucket{{stage="{name}",le="{_le(bound)}"}} {cumulative}')
+        lines.append(f'{METRIC}_bucket{{stage="{name}",le="+Inf"}} {hist["count"]}')
+        lines.append(f'{METRIC}_sum{{stage="{name}"}} {hist["sum"]:.6f}')
+        lines.append(f'{METRIC}_count{{stage="{name}"}} {hist["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    """Forgets all recorded timings, in this process and on disk."""
+    global _dirty
+    with _lock:
+        _stages.clear()
+        _dirty = False
+    if settings.METRICS_DIR:
+        _files.clear()
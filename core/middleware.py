@@ -0,0 +1,196 @@
+# core/middleware.py
+"""
+Per-request cost accounting.
+
+RequestCostMiddleware counts the queries each view runs and the time spent
+in the database (through ``execute_wrapper`` on every connection) along with
+the wall time of the whole request. The numbers go out in a ``Server-Timing``
+header, so they show up in the browser's network panel, and as one JSON log
+line per request on the ``core.requests`` logger.
+
+Views can have budgets in REQUEST_BUDGETS, keyed by URL name, with
+REQUEST_BUDGET_DEFAULT for the rest. A request over budget logs a warning;
+with REQUEST_BUDGET_STRICT (on by default under ``manage.py test``) it raises
+RequestBudgetExceeded instead, so a test that adds a query to a hot view
+fails.
+
+MemoryProfileMiddleware feeds core/memprofile.py and drops out of the stack
+unless MEMORY_PROFILE_ENABLED is set. AdmissionMiddleware turns requests away
+from saturated expensive endpoints (core/admission.py).
+"""
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+
+from . import memprofile, metrics
+from .admission import Admission, group_for
+
+logger = logging.getLogger('core.requests')
+
+# Budget keys and the measurement each one limits
+BUDGET_FIELDS = ('queries', 'db_ms', 'wall_ms')
+
+
+class RequestBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryCounter:
+    """execute_wrapper callable that tallies queries and their duration."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_ms = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_ms += (time.perf_counter() - started) * 1000
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else None
+
+
+def budget_for(name):
+    budget = dict(settings.REQUEST_BUDGET_DEFAULT)
+    budget.update(settings.REQUEST_BUDGETS.get(name, {}))
+    return budget
+
+
+def over_budget(costs, budget):
+    """Names of the budget fields ``costs`` exceeds."""
+    return [field for field in BUDGET_FIELDS
+            if budget.get(field) is not None and costs[field] > budget[field]]
+
+
+def server_timing(costs):
+    return (f'db;dur={costs["db_ms"]:.1f};desc="{costs["queries"]} queries", '
+            f'app;dur={costs["wall_ms"]:.1f}')
+
+
+class RequestCostMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+        costs = {
+            'queries': counter.queries,
+            'db_ms': round(counter.db_ms, 1),
+            'wall_ms': round((time.perf_counter() - started) * 1000, 1),
+        }
+        response['Server-Timing'] = server_timing(costs)
+
+        name = view_name(request)
+        if name is None:
+            # Static files and 404s that never reached a view
+            return response
+        exceeded = over_budget(costs, budget_for(name))
+        record = {'view': name, 'method': request.method, 'status': response.status_code, **costs}
+        if exceeded:
+            record['over_budget'] = exceeded
+            if settings.REQUEST_BUDGET_STRICT:
+                raise RequestBudgetExceeded(f'{name} over budget: {json.dumps(record)}')
+            logger.warning(json.dumps(record))
+        else:
+            logger.info(json.dumps(record))
+        return response
+
+
+class MemoryProfileMiddleware:
+    """Samples requests for allocation profiling (core/memprofile.py); off by default."""
+
+    def __init__(self, get_response):
+        if not settings.MEMORY_PROFILE_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        memprofile.start()
+        try:
+            endpoint = resolve(request.path_info).view_name
+        except Resolver404:
+            endpoint = None
+        memprofile.checkpoint(endpoint)
+        return self.get_response(request)
+
+
+class _ReleasingStream:
+    """
+    A streamed body that gives up its admission slot once the server closes
+    it, whether or not it was ever iterated.
+    """
+
+    def __init__(self, content, admission):
+        self.content = iter(content)
+        self.admission = admission
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.content)
+
+    def close(self):
+        try:
+            if hasattr(self.content, 'close'):
+                self.content.close()
+        finally:
+            self.admission.release()
+
+
+class AdmissionMiddleware:
+    """Fast 503 with Retry-After when an expensive endpoint is saturated host-wide."""
+
+    def __init__(self, get_response):
+        if not settings.ADMISSION_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            group = group_for(resolve(request.path_info).view_name, request.method)
+        except Resolver404:
+            group = None
+        if group is None:
+            return self.get_response(request)
+
+        admission = Admission(group)
+        if not admission.acquire():
+            logger.warning(json.dumps({'view': view_name(request) or request.path_info, 'group': group,
+                                       'rejected': admission.reason}))
+            response = HttpResponse('The server is busy, please try again in a few seconds.',
+                                    status=503, content_type='text/plain')
+            response['Retry-After'] = str(settings.ADMISSION_RETRY_AFTER)
+            return response
+        if admission.waited:
+            metrics.observe(f'admission_wait_{group}', admission.waited)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            admission.release()
+            raise
+        if response.streaming:
+            # Streamed bodies (cohort ZIPs) do their work after we return;
+            # the response closes its content when the server is done
+            response.streaming_content = _ReleasingStream(response.streaming_content, admission)
+        else:
+            admission.release()
+        return response
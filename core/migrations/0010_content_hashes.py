@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-17 17:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_ingestjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timetableevent',
+            name='row_hash',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='timetablesource',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-17 17:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_content_hashes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timetablesource',
+            name='schedule_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
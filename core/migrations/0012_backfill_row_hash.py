@@ -0,0 +1,47 @@
+import hashlib
+
+from django.db import migrations
+
+BATCH_SIZE = 2000
+
+
+def event_row_hash(event):
+    # Frozen copy of core.ingest.event_row_hash as of this migration
+    parts = (
+        event.day,
+        event.start_time.strftime('%H:%M'),
+        event.end_time.strftime('%H:%M'),
+        event.location or '',
+        event.course_code,
+        event.normalized_code,
+        event.details or '',
+        event.lecturer or '',
+    )
+    return hashlib.blake2b('\x1f'.join(parts).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def backfill_row_hash(apps, schema_editor):
+    # Events stored before 0010 have no fingerprint, so the first re-ingest
+    # would see every one of them as changed
+    TimetableEvent = apps.get_model('core', 'TimetableEvent')
+    pending = TimetableEvent.objects.filter(row_hash='').order_by('id')
+    batch = []
+    for event in pending.iterator(chunk_size=BATCH_SIZE):
+        event.row_hash = event_row_hash(event)
+        batch.append(event)
+        if len(batch) >= BATCH_SIZE:
+            TimetableEvent.objects.bulk_update(batch, ['row_hash'])
+            batch = []
+    if batch:
+        TimetableEvent.objects.bulk_update(batch, ['row_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_timetablesource_schedule_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_row_hash, migrations.RunPython.noop),
+    ]
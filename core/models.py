@@ -45,6 +45,10 @@ class TimetableSource(models.Model):
         max_length=10, choices=STATUS_CHOICES, default=PROCESSING)
     events_parsed = models.BooleanField(default=False)
     total_events = models.IntegerField(default=0)
+    # sha256 of the source_json file the stored events were built from
+    content_hash = models.CharField(max_length=64, blank=True)
+    # Bumped whenever ingest changes the events; names the shared snapshot
+    schedule_version = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.display_name
@@ -61,6 +65,8 @@ class TimetableEvent(models.Model):
     normalized_code = models.CharField(max_length=20, db_index=True)
     details = models.CharField(max_length=100, blank=True, null=True)
     lecturer = models.CharField(max_length=255, blank=True, null=True)
+    # Fingerprint of all the fields above, used to diff re-ingests
+    row_hash = models.CharField(max_length=32, blank=True)
 
     class Meta:
         indexes = [
@@ -93,3 +99,39 @@ class CourseRegistrationHistory(models.Model):
 
     def __str__(self):
         return f"{self.user.username} - {self.display_name}"
+
+
+class IngestJob(models.Model):
+    """A queued master timetable ingest, picked up by `manage.py ingest_worker`."""
+    QUEUED = 'QUEUED'
+    RUNNING = 'RUNNING'
+    DONE = 'DONE'
+    FAILED = 'FAILED'
+
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    source = models.ForeignKey(
+        TimetableSource, on_delete=models.CASCADE, related_name='ingest_jobs')
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    # hostname:pid of the worker that claimed the job
+    worker = models.CharField(max_length=100, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"Ingest {self.source_id} ({self.status})"
@@ -0,0 +1,85 @@
+# core/parsing.py
+import re
+from datetime import datetime
+from functools import lru_cache
+
+# "3-4 letters, optional space, 3 digits", e.g. "ACT 404" or "ENV324"
+COURSE_CODE_RE = re.compile(r'([A-Z]{3,4})\s?(\d{3})')
+
+# --- HELPER 1: For parsing time like "7:00a - 9:55a" ---
+
+
+@lru_cache(maxsize=4096)
+def parse_time_range(time_str):
+    # A master file only uses a few hundred distinct time ranges, so the
+    # strptime work is memoized across rows and across ingests.
+    try:
+        start_str, end_str = time_str.split(' - ')
+
+        # Handle both "7:00a" and "7:00AM" formats
+        # Convert single letter suffixes to full AM/PM
+        if start_str.endswith('a'):
+            start_str = start_str[:-1] + 'AM'
+        elif start_str.endswith('p'):
+            start_str = start_str[:-1] + 'PM'
+
+        if end_str.endswith('a'):
+            end_str = end_str[:-1] + 'AM'
+        elif end_str.endswith('p'):
+            end_str = end_str[:-1] + 'PM'
+
+        start_time = datetime.strptime(start_str, '%I:%M%p').time()
+        end_time = datetime.strptime(end_str, '%I:%M%p').time()
+        return start_time, end_time
+    except (ValueError, AttributeError):
+        return None, None
+
+# --- HELPER 2 (FIXED): Robust parser for course strings ---
+
+
+def parse_course_string(course_str):
+    """
+    Finds a course code like 'ACT 404' or 'ENV324' within a larger string,
+    and returns the display version, a normalized version, and the details.
+    """
+    # Made more flexible to handle various formats
+    match = COURSE_CODE_RE.search(course_str.upper())
+    if match:
+        dept_code = match.group(1)  # e.g., "ACT"
+        course_num = match.group(2)  # e.g., "404"
+
+        # Create both display and normalized versions
+        display_code = f"{dept_code} {course_num}"  # e.g., "ACT 404"
+        normalized_code = f"{dept_code} {course_num}"  # e.g., "ACT404"
+
+        # Extract details (everything after the course code)
+        details = course_str[match.end():].strip()  # e.g., "Lec 1"
+
+        return display_code, normalized_code, details
+
+    # Fallback if no standard code is found
+    return course_str, course_str.replace(' ', ''), ''
+
+# --- HELPER 3 (NEW): Normalize course codes consistently ---
+
+
+def normalize_course_code(code_str):
+    """
+    Normalizes course codes to a consistent format for matching.
+    Handles various input formats like 'ACT 404', 'ACT404', 'act 404', etc.
+    """
+    if not code_str:
+        return ""
+
+    # Clean the string
+    clean_code = code_str.strip().upper()
+
+    # Try to match the pattern
+    match = COURSE_CODE_RE.search(clean_code)
+    if match:
+        dept_code = match.group(1)
+        course_num = match.group(2)
+        return f"{dept_code} {course_num}"  # Always return without spaces
+
+    # If no match, return the cleaned version
+    return clean_code.replace(' ', '')
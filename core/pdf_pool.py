@@ -0,0 +1,265 @@
+# core/pdf_pool.py
+"""
+Registration PDF extraction in long-lived worker processes.
+
+Each web worker keeps its own extraction processes and reuses them from one
+request to the next. They are started on first use and kept until they have
+run PDF_POOL_MAX_JOBS jobs or break a limit. With the forkserver start
+method the PDF libraries are preloaded, so a replacement starts warm.
+Concurrency is bounded host-wide, not per web worker: a job holds one of
+PDF_POOL_WORKERS flock'd slot files under ADMISSION_DIR (core/admission.py)
+while it runs. A request that can't get a slot within PDF_POOL_QUEUE_WAIT
+seconds gets PoolBusy instead of queueing behind a slow upload.
+
+Extraction processes run with an address space cap (PDF_POOL_MEMORY_MB).
+The web worker watches each job it hands out. Once the job has used
+PDF_POOL_CPU_SECONDS of CPU (plus KILL_GRACE_SECONDS), or PDF_POOL_TIMEOUT
+has passed, it SIGKILLs that one process and starts a replacement. The kill
+holds even when the job is stuck inside pdfium or pdfminer. Before that, a
+soft RLIMIT_CPU raises CPUBudgetExceeded in the process whenever Python
+gets control back, so the process survives and is reused.
+
+Results are memoized per process by the SHA-256 of the uploaded bytes, so a
+student re-uploading the same slip skips extraction entirely.
+"""
+import hashlib
+import multiprocessing
+import os
+import resource
+import signal
+import threading
+import time
+import traceback
+
+from django.conf import settings
+
+from .admission import host_slot
+from .extraction import ExtractionError, extract_course_codes
+from .memo import LRUMemo
+
+
+class PoolBusy(Exception):
+    """Every extraction slot is taken; the client should retry shortly."""
+
+
+class CPUBudgetExceeded(ExtractionError):
+    pass
+
+
+# Extra CPU seconds a job gets past its soft limit before it is killed
+KILL_GRACE_SECONDS = 2
+
+# How often a waiting web worker checks its job's CPU time
+WATCHDOG_INTERVAL = 0.25
+
+# Imported once in the forkserver, so each new process starts warm
+PRELOAD = ['core.pdf_pool', 'pdfplumber', 'pypdfium2']
+
+# Host-wide slot files live under ADMISSION_DIR/<SLOT_NAME>
+SLOT_NAME = 'pdf'
+
+_lock = threading.Lock()
+_idle = []  # processes ready for a job
+_results = None
+
+_CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+
+
+def _on_sigxcpu(signum, frame):
+    raise CPUBudgetExceeded("The PDF took too long to process.")
+
+
+def _cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _serve(conn, memory_mb):
+    """Main loop of an extraction process: one job per message until EOF."""
+    if memory_mb:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    signal.signal(signal.SIGXCPU, _on_sigxcpu)
+    # The web worker handles Ctrl-C and shutdown; we end when it goes away
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        try:
+            data, max_pages, max_bytes, cpu_seconds = conn.recv()
+        except (EOFError, OSError):
+            return
+        if cpu_seconds:
+            # Soft limit only: SIGXCPU each second past it, never a kill,
+            # and it can be lifted again for the next job
+            soft = int(_cpu_seconds()) + cpu_seconds + 1
+            resource.setrlimit(resource.RLIMIT_CPU, (soft, resource.RLIM_INFINITY))
+        try:
+            reply = ('ok', extract_course_codes(data, max_pages=max_pages, max_bytes=max_bytes))
+        except ExtractionError as e:
+            reply = ('error', e)
+        except MemoryError:
+            reply = ('error', ExtractionError("The PDF needs too much memory to process."))
+        except Exception:
+            traceback.print_exc()
+            reply = ('error', ExtractionError("The PDF could not be processed."))
+        finally:
+            resource.setrlimit(resource.RLIMIT_CPU, (resource.RLIM_INFINITY, resource.RLIM_INFINITY))
+        conn.send(reply)
+
+
+class _Process:
+    """One extraction process and the web worker's end of its pipe."""
+
+    def __init__(self):
+        context = multiprocessing.get_context(settings.PDF_POOL_START_METHOD)
+        if settings.PDF_POOL_START_METHOD == 'forkserver':
+            context.set_forkserver_preload(PRELOAD)
+        self.conn, child = context.Pipe()
+        self.process = context.Process(
+            target=_serve, args=(child, settings.PDF_POOL_MEMORY_MB), daemon=True)
+        self.process.start()
+        child.close()
+        self.jobs = 0
+        self.busy = False  # a job was sent and its reply not yet read
+
+    def cpu_time(self):
+        """CPU seconds the process has used, or None where /proc is missing."""
+        try:
+            with open(f'/proc/{self.process.pid}/stat') as f:
+                # Fields after the parenthesised command name; utime, stime
+                # are the 14th and 15th fields overall
+                fields = f.read().rsplit(')', 1)[1].split()
+            return (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+        except (OSError, IndexError, ValueError):
+            return None
+
+    def run(self, data, max_pages, max_bytes, cpu_seconds, wall_seconds):
+        """
+        The job's ExtractionResult. Raises ExtractionError for a rejected PDF,
+        or after killing the process if the job breaks a limit or the
+        process dies.
+        """
+        self.jobs += 1
+        started_cpu = self.cpu_time()
+        deadline = time.monotonic() + wall_seconds
+        try:
+            self.conn.send((data, max_pages, max_bytes, cpu_seconds))
+        except OSError:
+            self.kill()
+            raise ExtractionError("The PDF could not be processed.")
+        self.busy = True
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.kill()
+                raise ExtractionError("The PDF took too long to process.")
+            if self.conn.poll(min(WATCHDOG_INTERVAL, remaining)):
+                try:
+                    status, value = self.conn.recv()
+                except (EOFError, OSError):
+                    # Died mid-job, e.g. at the hands of the OOM killer
+                    self.kill()
+                    raise ExtractionError("The PDF could not be processed.")
+                self.busy = False
+                if status == 'error':
+                    raise value
+                return value
+            used = self.cpu_time()
+            if cpu_seconds and used is not None and started_cpu is not None \
+                    and used - started_cpu > cpu_seconds + KILL_GRACE_SECONDS:
+                self.kill()
+                raise CPUBudgetExceeded("The PDF took too long to process.")
+            if not self.process.is_alive():
+                self.kill()
+                raise ExtractionError("The PDF could not be processed.")
+
+    @property
+    def alive(self):
+        return self.process.exitcode is None
+
+    def kill(self):
+        if self.process.exitcode is None:
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+def _forget():
+    # A forked child must not talk to its parent's processes
+    _idle.clear()
+
+
+os.register_at_fork(after_in_child=_forget)
+
+
+def _checkout():
+    with _lock:
+        while _idle:
+            proc = _idle.pop()
+            if proc.alive:
+                return proc
+            proc.kill()
+    return _Process()
+
+
+def _checkin(proc):
+    if proc.busy:
+        # Abandoned mid-job (the request was interrupted); its late reply
+        # would go to the next job
+        proc.kill()
+    if not proc.alive:
+        # Killed by the watchdog: start its replacement now, off the next
+        # request's clock
+        proc = _Process()
+    elif proc.jobs >= settings.PDF_POOL_MAX_JOBS:
+        proc.kill()
+        proc = _Process()
+    with _lock:
+        if len(_idle) < settings.PDF_POOL_WORKERS:
+            _idle.append(proc)
+            return
+    proc.kill()
+
+
+def extract_in_pool(data):
+    """
+    Extracts course codes from PDF bytes in an extraction process and returns
+    an ExtractionResult. Raises PoolBusy when every host-wide slot is taken
+    and ExtractionError when the PDF is rejected, too expensive or slower
+    than PDF_POOL_TIMEOUT.
+    """
+    max_pages = settings.REGISTRATION_PDF_MAX_PAGES
+    max_bytes = settings.REGISTRATION_PDF_MAX_BYTES
+    if not settings.PDF_POOL_ENABLED:
+        return extract_course_codes(data, max_pages=max_pages, max_bytes=max_bytes)
+
+    with host_slot(SLOT_NAME, settings.PDF_POOL_WORKERS, settings.PDF_POOL_QUEUE_WAIT) as acquired:
+        if not acquired:
+            raise PoolBusy("The server is busy processing other uploads.")
+        proc = _checkout()
+        try:
+            return proc.run(data, max_pages, max_bytes,
+                            settings.PDF_POOL_CPU_SECONDS, settings.PDF_POOL_TIMEOUT)
+        finally:
+            _checkin(proc)
+
+
+def result_memo():
+    global _results
+    if _results is None:
+        _results = LRUMemo(settings.EXTRACTION_MEMO_SIZE)
+    return _results
+
+
+def extract_cached(data):
+    """
+    extract_in_pool() memoized on the content of the upload. Returns
+    (ExtractionResult, cached). Failures are not memoized.
+    """
+    memo = result_memo()
+    key = hashlib.sha256(data).hexdigest()
+    result = memo.get(key)
+    if result is not None:
+        return result, True
+    result = extract_in_pool(data)
+    memo.set(key, result)
+    return result, False
@@ -0,0 +1,67 @@
+# core/prewarm.py
+import os
+import resource
+import time
+
+from django.conf import settings
+from django.db import connections
+
+from .models import TimetableSource
+
+
+def current_rss_kb():
+    """Resident set size of this process in KiB."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class PrewarmReport:
+    def __init__(self):
+        self.sources = []  # (source_id, display_name, events, ms)
+        self.seconds = 0.0
+        self.rss_before_kb = 0
+        self.rss_after_kb = 0
+
+    def __str__(self):
+        warmed = ', '.join(f"{sid} ({events} events, {ms:.0f} ms)"
+                           for sid, _, events, ms in self.sources) or 'none'
+        return (f"Prewarmed {len(self.sources)} source(s) in {self.seconds:.2f}s: "
+                f"{warmed}; RSS {self.rss_before_kb} -> {self.rss_after_kb} KiB")
+
+
+def prewarm_sources(limit=None):
+    """
+    Maps the schedule snapshots of the ``limit`` most recent COMPLETED sources,
+    compiling any that are missing, and faults their pages in.
+
+    Called in the gunicorn master before it forks (see gunicorn.conf.py), so
+    workers inherit the mappings and decoded string tables copy-on-write.
+    """
+    # Imported here so gunicorn.conf.py can import this module cheaply
+    from .views import get_schedule_index
+
+    limit = settings.SCHEDULE_PREWARM_SOURCES if limit is None else limit
+    report = PrewarmReport()
+    report.rss_before_kb = current_rss_kb()
+    started = time.perf_counter()
+
+    sources = TimetableSource.objects.filter(
+        status=TimetableSource.COMPLETED).order_by('-created_at')[:limit]
+    for source in sources:
+        source_started = time.perf_counter()
+        snapshot = get_schedule_index(source.id)
+        if not snapshot:
+            continue
+        snapshot.warm()
+        report.sources.append((source.id, source.display_name, len(snapshot),
+                               (time.perf_counter() - source_started) * 1000))
+
+    # Forked workers must not share the master's database connection
+    connections.close_all()
+
+    report.seconds = time.perf_counter() - started
+    report.rss_after_kb = current_rss_kb()
+    return report
@@ -0,0 +1,97 @@
+# core/rendering/__init__.py
+"""
+Timetable PDF renderers.
+
+Backends are looked up by name in PDF_RENDERERS and imported on first use,
+so a missing optional dependency only disables that backend:
+
+    canvas  draws the layouts directly with reportlab (fast)
+    html    renders the timetable_pdf_*.html templates through xhtml2pdf
+
+render_timetable_pdf() tries settings.PDF_RENDERER first and falls back to
+the HTML templates if it can't be used. Image downloads are drawn by
+core.rendering.image; the formats and encoder options live here so views can
+validate requests and build cache keys without importing Pillow.
+"""
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .. import artifacts
+from .base import RenderError, PdfRenderer
+
+PDF_RENDERERS = {
+    'canvas': 'core.rendering.canvas.CanvasRenderer',
+    'html': 'core.rendering.html.HtmlRenderer',
+}
+FALLBACK_RENDERER = 'html'
+
+TEMPLATES = ('modern', 'minimal', 'neon', 'grid')
+DEFAULT_TEMPLATE = 'modern'
+
+# image format name -> (Pillow format, content type, file extension)
+IMAGE_FORMATS = {
+    'jpg': ('JPEG', 'image/jpeg', 'jpg'),
+    'webp': ('WEBP', 'image/webp', 'webp'),
+    'png': ('PNG', 'image/png', 'png'),
+}
+
+_instances = {}
+
+
+def get_renderer(name):
+    """Returns the renderer instance for ``name``; raises ImportError if unusable."""
+    if name not in _instances:
+        try:
+            path = PDF_RENDERERS[name]
+        except KeyError:
+            raise RenderError(f"Unknown PDF renderer: {name}")
+        _instances[name] = import_string(path)()
+    return _instances[name]
+
+
+def render_timetable_pdf(schedule, days_of_week, source_name, template, backend=None):
+    """
+    Renders a student's schedule ({day: [events]}) to PDF bytes. Returns
+    (data, name of the backend that produced it).
+    """
+    if template not in TEMPLATES:
+        template = DEFAULT_TEMPLATE
+    names = [backend or settings.PDF_RENDERER]
+    if FALLBACK_RENDERER not in names:
+        names.append(FALLBACK_RENDERER)
+
+    errors = []
+    for name in names:
+        try:
+            renderer = get_renderer(name)
+            return renderer.render(schedule, days_of_week, source_name, template), name
+        except Exception as e:
+            print(f"PDF renderer {name} failed: {e}")
+            errors.append(f"{name}: {e}")
+    raise RenderError('; '.join(errors))
+
+
+def encode_options(fmt):
+    """Pillow save() options for image format ``fmt``, from settings."""
+    if fmt == 'jpg':
+        return {'quality': settings.TIMETABLE_IMAGE_JPEG_QUALITY, 'optimize': True}
+    if fmt == 'webp':
+        return {'quality': settings.TIMETABLE_IMAGE_WEBP_QUALITY,
+                'method': settings.TIMETABLE_IMAGE_WEBP_METHOD}
+    return {'compress_level': settings.TIMETABLE_IMAGE_PNG_COMPRESS_LEVEL}
+
+
+def cache_key(source, version, fmt, template, course_codes):
+    """
+    Render cache key for a download: ``fmt`` is 'pdf' or an image format.
+    Covers the PDF backend and image encoder settings as well, so only bytes
+    from settings.PDF_RENDERER may be stored under it, never fallback output.
+    """
+    if fmt == 'pdf':
+        if template not in TEMPLATES:
+            template = DEFAULT_TEMPLATE
+        variant = f'{settings.PDF_RENDERER}:{template}'
+    else:
+        options = ','.join(f'{k}={v}' for k, v in sorted(encode_options(fmt).items()))
+        variant = f'minimal:{options}'
+    return artifacts.artifact_key(fmt, source, version, variant, course_codes)
@@ -0,0 +1,16 @@
+# core/rendering/base.py
+
+
+class RenderError(Exception):
+    """No backend could produce the document."""
+
+
+class PdfRenderer:
+    """
+    A backend that turns a schedule ({day: [EventRecord]}, days in order)
+    into PDF bytes for one of the named templates.
+    """
+    name = None
+
+    def render(self, schedule, days_of_week, source_name, template):
+        raise NotImplementedError
@@ -0,0 +1,313 @@
+# core/rendering/canvas.py
+"""
+Timetable PDFs drawn directly onto a reportlab canvas.
+
+Two layouts cover the four templates, with the colours of the matching
+HTML template:
+
+    slots  days x hourly columns (7 AM - 7 PM), cards stacked in each
+           column; used by modern, minimal and neon
+    rows   one row of cards per day; used by grid
+
+Everything fits on one A4 landscape page: when a busy timetable needs more
+height than the page has, the cards are scaled down.
+"""
+from io import BytesIO
+
+from reportlab.lib.colors import HexColor
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen.canvas import Canvas
+
+from .base import PdfRenderer
+
+PAGE_WIDTH, PAGE_HEIGHT = landscape(A4)
+MARGIN = 21.6  # 0.3in, as in the templates' @page rule
+HOURS = range(7, 20)
+FOOTER_TEXT = "Powered by ChronoParse - Your AI Timetable Assistant"
+
+BOLD = 'Helvetica-Bold'
+REGULAR = 'Helvetica'
+ITALIC = 'Helvetica-Oblique'
+
+THEMES = {
+    'modern': {
+        'layout': 'slots', 'title': 'My Timetable', 'title_size': 18, 'radius': 9,
+        'page': '#667eea', 'container': '#ffffff', 'frame': None,
+        'title_color': '#667eea', 'subtitle': '#7f8c8d', 'meta': '#95a5a6',
+        'head_bg': '#4a5568', 'head_fg': '#ffffff', 'day_bg': '#4a5568', 'day_fg': '#ffffff',
+        'cell': '#f8f9fa', 'line': '#e2e8f0', 'card': '#4299e1', 'card_border': '#3182ce',
+        'accent': None, 'code': '#1a202c', 'time': '#1a202c', 'detail': '#1a202c',
+        'empty': '#a0aec0', 'footer': '#7f8c8d', 'rule': None,
+    },
+    'minimal': {
+        'layout': 'slots', 'title': 'My Timetable', 'title_size': 16, 'radius': 0,
+        'page': '#ffffff', 'container': '#ffffff', 'frame': None,
+        'title_color': '#333333', 'subtitle': '#666666', 'meta': '#999999',
+        'head_bg': '#f8f9fa', 'head_fg': '#333333', 'day_bg': '#f8f9fa', 'day_fg': '#333333',
+        'cell': '#fafafa', 'line': '#dddddd', 'card': '#f8f9fa', 'card_border': '#dddddd',
+        'accent': None, 'code': '#333333', 'time': '#666666', 'detail': '#777777',
+        'empty': '#999999', 'footer': '#999999', 'rule': '#dddddd',
+    },
+    'neon': {
+        'layout': 'slots', 'title': 'MY TIMETABLE', 'title_size': 16, 'radius': 0,
+        'page': '#0a0a0a', 'container': '#111111', 'frame': '#00ff88',
+        'title_color': '#00ff88', 'subtitle': '#00ccff', 'meta': '#ffff00',
+        'head_bg': '#001a0f', 'head_fg': '#00ff88', 'day_bg': '#001a0f', 'day_fg': '#00ff88',
+        'cell': '#0a0a0a', 'line': '#00ff88', 'card': '#001a0f', 'card_border': '#00ff88',
+        'accent': None, 'code': '#00ccff', 'time': '#ffff00', 'detail': '#00ff88',
+        'empty': '#666666', 'footer': '#00ff88', 'rule': '#00ff88',
+    },
+    'grid': {
+        'layout': 'rows', 'title': 'My Timetable', 'title_size': 24, 'radius': 9,
+        'page': '#667eea', 'container': '#ffffff', 'frame': None,
+        'title_color': '#667eea', 'subtitle': '#64748b', 'meta': '#94a3b8',
+        'head_bg': '#667eea', 'head_fg': '#ffffff', 'day_bg': '#1e293b', 'day_fg': '#ffffff',
+        'cell': '#f8fafc', 'line': '#e2e8f0', 'card': '#4299e1', 'card_border': None,
+        'accent': '#2b6cb0', 'code': '#ffffff', 'time': '#ffffff', 'detail': '#ffffff',
+        'empty': '#94a3b8', 'footer': '#64748b', 'rule': None,
+    },
+}
+
+# Card metrics at scale 1 for each layout: padding, font sizes of the code,
+# time and detail lines, card width (None = column width) and gap
+CARD_METRICS = {
+    'slots': {'pad': 2.5, 'code': 7, 'time': 5.5, 'detail': 5, 'width': None, 'gap': 2, 'min_row': 40},
+    'rows': {'pad': 6, 'code': 10, 'time': 8, 'detail': 7, 'width': 120, 'gap': 9, 'min_row': 56},
+}
+
+_colors = {}
+
+
+def color(value):
+    if value not in _colors:
+        _colors[value] = HexColor(value)
+    return _colors[value]
+
+
+def clock(t):
+    """7:05 AM style, like the templates' "g:i A"."""
+    return f"{t.hour % 12 or 12}:{t.minute:02d} {'AM' if t.hour < 12 else 'PM'}"
+
+
+def fit(text, font, size, width, min_scale=0.8):
+    """
+    Returns (text, size) fitting ``width`` points: shrinks the font by up to
+    ``min_scale``, then truncates with an ellipsis.
+    """
+    natural = stringWidth(text, font, size)
+    if natural <= width:
+        return text, size
+    if natural * min_scale <= width:
+        return text, size * width / natural
+    size *= min_scale
+    while text and stringWidth(text + '…', font, size) > width:
+        text = text[:-1]
+    return text + '…', size
+
+
+class Page:
+    """Top-down coordinates over a reportlab canvas."""
+
+    def __init__(self, canvas):
+        self.c = canvas
+
+    def rect(self, x, top, w, h, fill=None, stroke=None, radius=0, line_width=0.5):
+        c = self.c
+        if fill:
+            c.setFillColor(color(fill))
+        if stroke:
+            c.setStrokeColor(color(stroke))
+            c.setLineWidth(line_width)
+        y = PAGE_HEIGHT - top - h
+        if radius:
+            c.roundRect(x, y, w, h, radius, stroke=1 if stroke else 0, fill=1 if fill else 0)
+        else:
+            c.rect(x, y, w, h, stroke=1 if stroke else 0, fill=1 if fill else 0)
+
+    def line(self, x1, top, x2, stroke, line_width=0.5):
+        self.c.setStrokeColor(color(stroke))
+        self.c.setLineWidth(line_width)
+        y = PAGE_HEIGHT - top
+        self.c.line(x1, y, x2, y)
+
+    def text(self, x, baseline, text, font, size, fill, align='left', width=None):
+        c = self.c
+        if width is not None:
+            text, size = fit(text, font, size, width)
+        c.setFont(font, size)
+        c.setFillColor(color(fill))
+        y = PAGE_HEIGHT - baseline
+        if align == 'center':
+            c.drawCentredString(x, y, text)
+        else:
+            c.drawString(x, y, text)
+
+
+def card_lines(event, theme, metrics, scale):
+    return [
+        (event.course_code, BOLD, metrics['code'] * scale, theme['code']),
+        (f"{clock(event.start_time)}-{clock(event.end_time)}", REGULAR, metrics['time'] * scale, theme['time']),
+        (event.location, REGULAR, metrics['detail'] * scale, theme['detail']),
+        (event.lecturer or '', REGULAR, metrics['detail'] * scale, theme['detail']),
+    ]
+
+
+def card_height(metrics, scale):
+    sizes = metrics['code'] + metrics['time'] + 2 * metrics['detail']
+    return (2 * metrics['pad'] + sizes * 1.25) * scale
+
+
+def draw_card(page, event, x, top, w, theme, metrics, scale):
+    h = card_height(metrics, scale)
+    page.rect(x, top, w, h, fill=theme['card'], stroke=theme['card_border'],
+              radius=min(3, theme['radius']) * scale)
+    pad = metrics['pad'] * scale
+    if theme['accent']:
+        page.rect(x, top, 3 * scale, h, fill=theme['accent'])
+        x += 3 * scale
+        w -= 3 * scale
+    baseline = top + pad
+    for text, font, size, fill in card_lines(event, theme, metrics, scale):
+        baseline += size
+        page.text(x + pad, baseline, text, font, size, fill, width=w - 2 * pad)
+        baseline += size * 0.25
+    return h
+
+
+def row_heights(needed, available, minimum):
+    """Row heights and the card scale that fits ``needed`` into ``available``."""
+    share = max(minimum, min(available / max(len(needed), 1), 90))
+    heights = [max(share, n) for n in needed]
+    total = sum(heights)
+    if total <= available:
+        return heights, 1.0
+    scale = available / total
+    return [h * scale for h in heights], scale
+
+
+class CanvasRenderer(PdfRenderer):
+    name = 'canvas'
+
+    def render(self, schedule, days_of_week, source_name, template):
+        theme = THEMES[template]
+        out = BytesIO()
+        canvas = Canvas(out, pagesize=(PAGE_WIDTH, PAGE_HEIGHT), pageCompression=1)
+        canvas.setTitle(f"{theme['title']} - {source_name}")
+        page = Page(canvas)
+
+        # Page background and the container card
+        page.rect(0, 0, PAGE_WIDTH, PAGE_HEIGHT, fill=theme['page'])
+        inset = MARGIN if theme['page'] != theme['container'] else MARGIN / 2
+        x0, top0 = inset, inset
+        width, height = PAGE_WIDTH - 2 * inset, PAGE_HEIGHT - 2 * inset
+        page.rect(x0, top0, width, height, fill=theme['container'], stroke=theme['frame'],
+                  radius=theme['radius'], line_width=1.5)
+
+        # Header
+        center = x0 + width / 2
+        baseline = top0 + 14 + theme['title_size']
+        page.text(center, baseline, theme['title'], BOLD, theme['title_size'], theme['title_color'], 'center')
+        baseline += 15
+        page.text(center, baseline, f"{source_name} - Second Semester", REGULAR, 10, theme['subtitle'], 'center')
+        baseline += 12
+        page.text(center, baseline, "Generated by ChronoParse AI", REGULAR, 7.5, theme['meta'], 'center')
+        header_bottom = baseline + 10
+        if theme['rule']:
+            page.line(x0, header_bottom, x0 + width, theme['rule'])
+
+        # Footer
+        footer_top = top0 + height - 24
+        if theme['rule']:
+            page.line(x0, footer_top, x0 + width, theme['rule'])
+        page.text(center, footer_top + 15, FOOTER_TEXT, REGULAR, 7.5, theme['footer'], 'center')
+
+        table = (x0 + 8, header_bottom + 6, width - 16, footer_top - header_bottom - 12)
+        days = [day for day in days_of_week if day in schedule] or list(schedule)
+        if theme['layout'] == 'rows':
+            self.draw_rows(page, schedule, days, theme, *table)
+        else:
+            self.draw_slots(page, schedule, days, theme, *table)
+
+        canvas.showPage()
+        canvas.save()
+        return out.getvalue()
+
+    def draw_head(self, page, theme, x, top, cells):
+        h = 16
+        for label, cx, w in cells:
+            page.rect(cx, top, w, h, fill=theme['head_bg'], stroke=theme['line'])
+            page.text(cx + w / 2, top + 11, label, BOLD, 7, theme['head_fg'], 'center', width=w - 2)
+        return h
+
+    def draw_slots(self, page, schedule, days, theme, x, top, width, height):
+        metrics = CARD_METRICS['slots']
+        day_w = width * 0.08
+        col_w = (width - day_w) / len(HOURS)
+        first, last = HOURS[0], HOURS[-1]
+
+        labels = [('Day', x, day_w)] + [
+            (f"{h % 12 or 12}:00 {'AM' if h < 12 else 'PM'}", x + day_w + i * col_w, col_w)
+            for i, h in enumerate(HOURS)]
+        head_h = self.draw_head(page, theme, x, top, labels)
+
+        # Events outside the teaching day go in the first/last column
+        cells = []
+        for day in days:
+            by_hour = {}
+            for event in schedule[day]:
+                hour = min(max(event.start_time.hour, first), last)
+                by_hour.setdefault(hour, []).append(event)
+            cells.append(by_hour)
+
+        gap = metrics['gap']
+        card_h = card_height(metrics, 1.0)
+        needed = [4 + max((len(v) for v in by_hour.values()), default=0) * (card_h + gap)
+                  for by_hour in cells]
+        heights, scale = row_heights(needed, height - head_h, metrics['min_row'])
+
+        row_top = top + head_h
+        for day, by_hour, row_h in zip(days, cells, heights):
+            page.rect(x, row_top, day_w, row_h, fill=theme['day_bg'], stroke=theme['line'])
+            page.text(x + day_w / 2, row_top + row_h / 2 + 3, day.upper(), BOLD, 7.5,
+                      theme['day_fg'], 'center', width=day_w - 2)
+            for i, hour in enumerate(HOURS):
+                cx = x + day_w + i * col_w
+                page.rect(cx, row_top, col_w, row_h, fill=theme['cell'], stroke=theme['line'])
+                card_top = row_top + 2 * scale
+                for event in by_hour.get(hour, ()):
+                    card_top += draw_card(page, event, cx + 2, card_top, col_w - 4,
+                                          theme, metrics, scale) + gap * scale
+            row_top += row_h
+
+    def draw_rows(self, page, schedule, days, theme, x, top, width, height):
+        metrics = CARD_METRICS['rows']
+        day_w = width * 0.12
+        events_w = width - day_w
+        head_h = self.draw_head(page, theme, x, top, [('Day', x, day_w), ('Classes', x + day_w, events_w)])
+
+        gap = metrics['gap']
+        per_line = max(1, int((events_w - gap) // (metrics['width'] + gap)))
+        card_h = card_height(metrics, 1.0)
+        lines = [-(-len(schedule[day]) // per_line) for day in days]
+        needed = [gap + n * (card_h + gap) for n in lines]
+        heights, scale = row_heights(needed, height - head_h, metrics['min_row'])
+
+        card_w = metrics['width'] * scale
+        row_top = top + head_h
+        for day, row_h in zip(days, heights):
+            page.rect(x, row_top, day_w, row_h, fill=theme['day_bg'], stroke=theme['line'])
+            page.text(x + day_w / 2, row_top + row_h / 2 + 4, day.upper(), BOLD, 10,
+                      theme['day_fg'], 'center', width=day_w - 4)
+            page.rect(x + day_w, row_top, events_w, row_h, fill=theme['cell'], stroke=theme['line'])
+
+            events = schedule[day]
+            if not events:
+                page.text(x + day_w + events_w / 2, row_top + row_h / 2 + 3, "No classes scheduled",
+                          ITALIC, 9, theme['empty'], 'center')
+            for n, event in enumerate(events):
+                line, col = divmod(n, per_line)
+                cx = x + day_w + gap * scale + col * (card_w + gap * scale)
+                card_top = row_top + gap * scale + line * (card_h + gap) * scale
+                draw_card(page, event, cx, card_top, card_w, theme, metrics, scale)
+            row_top += row_h
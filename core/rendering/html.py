@@ -0,0 +1,29 @@
+# core/rendering/html.py
+"""The original HTML/CSS templates converted by xhtml2pdf."""
+from io import BytesIO
+
+from django.template.loader import get_template
+from xhtml2pdf import pisa
+
+from .base import PdfRenderer, RenderError
+
+TEMPLATE_MAP = {
+    'modern': 'core/timetable_pdf_modern.html',
+    'minimal': 'core/timetable_pdf_minimal.html',
+    'neon': 'core/timetable_pdf_neon.html',
+    'grid': 'core/timetable_pdf_grid.html'
+}
+
+
+class HtmlRenderer(PdfRenderer):
+    name = 'html'
+
+    def render(self, schedule, days_of_week, source_name, template):
+        html = get_template(TEMPLATE_MAP[template]).render(
+            {'schedule': schedule, 'days_of_week': days_of_week, 'source_name': source_name, 'template_type': template})
+
+        result = BytesIO()
+        pdf = pisa.pisaDocument(BytesIO(html.encode("UTF-8")), result)
+        if pdf.err:
+            raise RenderError("Error Generating PDF")
+        return result.getvalue()
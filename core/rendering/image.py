@@ -0,0 +1,196 @@
+# core/rendering/image.py
+"""
+Timetable images (the minimal-style day rows) drawn with Pillow.
+
+Fonts are loaded once per process. Everything except the event cards, i.e.
+header, table frame, day labels and footer, depends only on the source
+title, so each title's base frame is drawn once, kept in a small LRU and
+copied per request. Card text (course codes, rooms, lecturers, times)
+repeats across students, so rasterized text masks are cached too. Output
+can be JPEG, WebP or PNG with encoder settings from TIMETABLE_IMAGE_*
+settings.
+"""
+from io import BytesIO
+
+from django.conf import settings
+from PIL import Image, ImageDraw, ImageFont
+
+from . import IMAGE_FORMATS, encode_options
+from ..memo import LRUMemo
+from ..schedule import DAYS_OF_WEEK
+
+WIDTH, HEIGHT = 1400, 900
+HEADER_HEIGHT = 80
+CELL_HEIGHT = 140
+START_X, START_Y = 30, HEADER_HEIGHT + 20
+DAY_COL_WIDTH = 120
+EVENTS_COL_WIDTH = WIDTH - DAY_COL_WIDTH - 60
+EVENTS_X = START_X + DAY_COL_WIDTH
+TABLE_WIDTH = DAY_COL_WIDTH + EVENTS_COL_WIDTH
+
+CARD_WIDTH, CARD_HEIGHT, CARD_SPACING = 200, 110, 12
+CARDS_PER_ROW = EVENTS_COL_WIDTH // (CARD_WIDTH + CARD_SPACING)
+
+FONT_SIZES = {'title': 32, 'subtitle': 18, 'header': 16, 'text': 14, 'small': 12}
+FONT_CANDIDATES = ('arial.ttf', 'DejaVuSans.ttf', 'LiberationSans-Regular.ttf')
+
+_fonts = None
+_frames = LRUMemo(16)
+_text_masks = LRUMemo(8192)
+
+
+def load_font(size):
+    paths = [settings.TIMETABLE_IMAGE_FONT] if settings.TIMETABLE_IMAGE_FONT else []
+    for path in paths + list(FONT_CANDIDATES):
+        try:
+            return ImageFont.truetype(path, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size)
+
+
+def fonts():
+    global _fonts
+    if _fonts is None:
+        _fonts = {name: load_font(size) for name, size in FONT_SIZES.items()}
+    return _fonts
+
+
+def text_width(draw, text, font):
+    bbox = draw.textbbox((0, 0), text, font=font)
+    return bbox[2] - bbox[0]
+
+
+def text_mask(text, font_name):
+    """
+    Anti-aliased coverage mask of ``text``, rasterized once per process, and
+    its offset from the drawing position (glyphs can overhang to the left).
+    """
+    key = (font_name, text)
+    cached = _text_masks.get(key)
+    if cached is None:
+        font = fonts()[font_name]
+        left, top, right, bottom = font.getbbox(text)
+        left, top = min(left, 0), min(top, 0)
+        mask = Image.new('L', (max(right - left, 1), max(bottom - top, 1)))
+        ImageDraw.Draw(mask).text((-left, -top), text, fill=255, font=font)
+        cached = (mask, left, top)
+        _text_masks.set(key, cached)
+    return cached
+
+
+def paste_text(img, xy, text, fill, font_name):
+    """Same result as ImageDraw.text() at ``xy``, from the cached mask."""
+    mask, left, top = text_mask(text, font_name)
+    x, y = xy[0] + left, xy[1] + top
+    img.paste(fill, (x, y, x + mask.width, y + mask.height), mask)
+
+
+def draw_frame(source_name, days):
+    """The parts of the image that don't depend on the student's courses."""
+    f = fonts()
+    img = Image.new('RGB', (WIDTH, HEIGHT), color='#fafafa')
+    draw = ImageDraw.Draw(img)
+
+    # Header
+    draw.rectangle([0, 0, WIDTH, HEADER_HEIGHT], fill='white', outline='#ddd')
+    title = "My Timetable"
+    draw.text(((WIDTH - text_width(draw, title, f['title'])) // 2, 15),
+              title, fill='#333', font=f['title'])
+    subtitle = f"{source_name} - Generated by ChronoParse AI"
+    draw.text(((WIDTH - text_width(draw, subtitle, f['subtitle'])) // 2, 50),
+              subtitle, fill='#666', font=f['subtitle'])
+
+    # Table frame and column headers
+    table_height = len(days) * CELL_HEIGHT + 40
+    draw.rectangle([START_X, START_Y, START_X + TABLE_WIDTH, START_Y + table_height],
+                   outline='#ddd', fill='white')
+    draw.rectangle([START_X, START_Y, START_X + DAY_COL_WIDTH, START_Y + 40],
+                   outline='#ddd', fill='#e9ecef')
+    draw.text((START_X + 35, START_Y + 12), "Day", fill='#333', font=f['header'])
+    draw.rectangle([EVENTS_X, START_Y, EVENTS_X + EVENTS_COL_WIDTH, START_Y + 40],
+                   outline='#ddd', fill='#e9ecef')
+    draw.text((EVENTS_X + (EVENTS_COL_WIDTH - text_width(draw, "Classes", f['header'])) // 2, START_Y + 12),
+              "Classes", fill='#333', font=f['header'])
+
+    # Day rows with empty event cells
+    for day_idx, day in enumerate(days):
+        y = START_Y + 40 + day_idx * CELL_HEIGHT
+        draw.rectangle([START_X, y, START_X + DAY_COL_WIDTH, y + CELL_HEIGHT],
+                       outline='#ddd', fill='#f8f9fa')
+        day_bbox = draw.textbbox((0, 0), day.upper(), font=f['header'])
+        day_height = day_bbox[3] - day_bbox[1]
+        draw.text((START_X + 15, y + (CELL_HEIGHT - day_height) // 2),
+                  day.upper(), fill='#333', font=f['header'])
+        draw.rectangle([EVENTS_X, y, EVENTS_X + EVENTS_COL_WIDTH, y + CELL_HEIGHT],
+                       outline='#ddd', fill='#fafafa')
+
+    # Footer
+    footer_y = START_Y + table_height + 20
+    footer_text = "Powered by ChronoParse - Your AI Timetable Assistant"
+    draw.line([START_X, footer_y, START_X + TABLE_WIDTH, footer_y], fill='#ddd', width=1)
+    draw.text(((WIDTH - text_width(draw, footer_text, f['small'])) // 2, footer_y + 10),
+              footer_text, fill='#999', font=f['small'])
+    return img
+
+
+def base_frame(source_name, days):
+    """A fresh copy of the cached frame for this title."""
+    key = (source_name, tuple(days))
+    frame = _frames.get(key)
+    if frame is None:
+        frame = draw_frame(source_name, days)
+        _frames.set(key, frame)
+    return frame.copy()
+
+
+def truncate(text, limit):
+    return text[:limit] + "..." if len(text) > limit else text
+
+
+def draw_cards(img, schedule, days):
+    draw = ImageDraw.Draw(img)
+    for day_idx, day in enumerate(days):
+        y = START_Y + 40 + day_idx * CELL_HEIGHT
+        day_events = schedule.get(day, [])
+        if not day_events:
+            text = "No classes scheduled"
+            left, _, right, _ = fonts()['text'].getbbox(text)
+            width = right - left
+            paste_text(img, (EVENTS_X + (EVENTS_COL_WIDTH - width) // 2, y + CELL_HEIGHT // 2 - 10),
+                       text, '#9ca3af', 'text')
+            continue
+
+        for event_idx, event in enumerate(day_events):
+            row, col = divmod(event_idx, CARDS_PER_ROW)
+            card_x = EVENTS_X + 10 + col * (CARD_WIDTH + CARD_SPACING)
+            card_y = y + 10 + row * (CARD_HEIGHT + 5)
+            # Cards that would overflow the day's cell are left out
+            if card_y + CARD_HEIGHT > y + CELL_HEIGHT - 10:
+                break
+
+            draw.rectangle([card_x, card_y, card_x + CARD_WIDTH, card_y + CARD_HEIGHT],
+                           outline='#2563eb', fill='#dbeafe', width=2)
+            paste_text(img, (card_x + 12, card_y + 10),
+                       truncate(event.course_code, 12), '#1e293b', 'text')
+            time_text = (f"{event.start_time.hour}:{event.start_time.minute:02d} - "
+                         f"{event.end_time.hour}:{event.end_time.minute:02d}")
+            paste_text(img, (card_x + 12, card_y + 35), time_text, '#334155', 'small')
+            paste_text(img, (card_x + 12, card_y + 60),
+                       truncate(event.location, 18), '#475569', 'small')
+            if event.lecturer:
+                paste_text(img, (card_x + 12, card_y + 85),
+                           truncate(event.lecturer, 16), '#475569', 'small')
+
+
+def encode(img, fmt):
+    out = BytesIO()
+    img.save(out, format=IMAGE_FORMATS[fmt][0], **encode_options(fmt))
+    return out.getvalue()
+
+
+def render_timetable_image(schedule, source_name, fmt='jpg', days=DAYS_OF_WEEK):
+    """Renders {day: [events]} to image bytes in ``fmt`` (a key of IMAGE_FORMATS)."""
+    img = base_frame(source_name, days)
+    draw_cards(img, schedule, days)
+    return encode(img, fmt)
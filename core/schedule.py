@@ -0,0 +1,161 @@
+# core/schedule.py
+import sys
+from datetime import time as dt_time
+from heapq import merge
+from operator import attrgetter
+
+DAYS_OF_WEEK = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+
+# One shared datetime.time per minute of the day
+_TIMES = [dt_time(minute // 60, minute % 60) for minute in range(24 * 60)]
+
+# Classes starting together keep the master file's row order
+_start = attrgetter('start', 'seq')
+
+
+def _intern(value):
+    return sys.intern(value) if value else value
+
+
+class EventRecord:
+    """
+    Compact, read-only form of a TimetableEvent for cached schedules.
+
+    Times are stored as minutes since midnight and the repetitive strings
+    (day, codes, venue, lecturer) are interned, so thousands of events share
+    a handful of string objects. ``start_time``/``end_time``, attribute and
+    ``event['key']`` access keep templates and older dict-based code working.
+    """
+    __slots__ = ('day', 'start', 'end', 'location', 'course_code',
+                 'normalized_code', 'details', 'lecturer', 'seq')
+
+    def __init__(self, day, start, end, location, course_code,
+                 normalized_code, details, lecturer, seq=0):
+        self.day = _intern(day)
+        self.start = start
+        self.end = end
+        self.location = _intern(location)
+        self.course_code = _intern(course_code)
+        self.normalized_code = _intern(normalized_code)
+        self.details = _intern(details)
+        self.lecturer = _intern(lecturer)
+        self.seq = seq  # position in the source, breaks start time ties
+
+    @classmethod
+    def from_dict(cls, event, seq=0):
+        start, end = event['start_time'], event['end_time']
+        return cls(event['day'], start.hour * 60 + start.minute,
+                   end.hour * 60 + end.minute, event['location'],
+                   event['course_code'], event['normalized_code'],
+                   event['details'], event['lecturer'], seq)
+
+    @property
+    def start_time(self):
+        return _TIMES[self.start]
+
+    @property
+    def end_time(self):
+        return _TIMES[self.end]
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def as_dict(self):
+        return {'day': self.day, 'start_time': self.start_time,
+                'end_time': self.end_time, 'location': self.location,
+                'course_code': self.course_code,
+                'normalized_code': self.normalized_code,
+                'details': self.details, 'lecturer': self.lecturer}
+
+    def __reduce__(self):
+        # Positional pickling: no per-object slot names in the payload, and
+        # pickle's memo keeps repeated strings shared after loading.
+        return (EventRecord, (self.day, self.start, self.end, self.location,
+                              self.course_code, self.normalized_code,
+                              self.details, self.lecturer, self.seq))
+
+    def __repr__(self):
+        return f"<EventRecord {self.course_code} {self.day} {self.start_time}>"
+
+
+# Column order of events in the compact JSON form of a schedule
+COMPACT_FIELDS = ('course_code', 'start', 'end', 'location', 'lecturer', 'details')
+
+
+def _hhmm(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def schedule_as_json(schedule, compact=True):
+    """
+    A {day: [EventRecord]} schedule as JSON-ready data. Compact events are
+    rows in COMPACT_FIELDS order with "HH:MM" times; otherwise each event is
+    an object with those keys.
+    """
+    days = {}
+    for day, events in schedule.items():
+        rows = [(event.course_code, _hhmm(event.start), _hhmm(event.end),
+                 event.location, event.lecturer, event.details) for event in events]
+        days[day] = rows if compact else [dict(zip(COMPACT_FIELDS, row)) for row in rows]
+    return days
+
+
+class ScheduleIndex:
+    """
+    Precompiled view of one source's master schedule (a list of EventRecord).
+
+    ``by_code`` maps each normalized course code to its events, already
+    grouped by day and sorted by start time, so building a student's
+    timetable only touches the courses they take.
+    """
+
+    def __init__(self, events):
+        self.events = events
+        self.by_code = {}
+        for event in events:
+            days = self.by_code.setdefault(event.normalized_code, {})
+            days.setdefault(event.day, []).append(event)
+        for days in self.by_code.values():
+            for day_events in days.values():
+                day_events.sort(key=_start)
+
+    @classmethod
+    def from_dicts(cls, events):
+        return cls([EventRecord.from_dict(event, seq)
+                    for seq, event in enumerate(events)])
+
+    def __len__(self):
+        return len(self.events)
+
+    def codes(self):
+        return list(self.by_code)
+
+    def __bool__(self):
+        return bool(self.events)
+
+    def events_for(self, course_codes):
+        """All events of the given courses, in no particular order."""
+        found = []
+        for code in set(course_codes):
+            for day_events in self.by_code.get(code, {}).values():
+                found.extend(day_events)
+        return found
+
+    def schedule_for(self, course_codes, days=DAYS_OF_WEEK):
+        """{day: [events sorted by start time]} for the given courses."""
+        per_code = [self.by_code[code]
+                    for code in set(course_codes) if code in self.by_code]
+        schedule = {}
+        for day in days:
+            runs = [d[day] for d in per_code if day in d]
+            if len(runs) == 1:
+                schedule[day] = list(runs[0])
+            else:
+                schedule[day] = list(merge(*runs, key=_start))
+        return schedule
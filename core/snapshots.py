@@ -0,0 +1,367 @@
+# core/snapshots.py
+"""
+Compiled master schedules shared by every worker on the host.
+
+Each (source, schedule_version) is compiled once into a read-only file under
+SCHEDULE_SNAPSHOT_DIR and memory-mapped by every process that needs it, so
+the page cache holds a single copy no matter how many gunicorn workers run.
+A ``current`` pointer file names the live version; ingest publishes a new
+version and workers notice the pointer change on their next request, with no
+TTL involved.
+
+Compiling a cold source is single-flight: one process holds the source's
+build lock while the others keep serving the version they already have
+mapped, or wait up to SCHEDULE_REBUILD_WAIT seconds when they have none.
+
+Layout (little endian):
+    header   magic, version, counts and section offsets
+    strings  u32 length + utf-8 bytes, referenced by index
+    events   fixed-size records sorted by (code, day, start time, row)
+    codes    (code string, first event, event count) directory
+"""
+import fcntl
+import mmap
+import os
+import shutil
+import struct
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from heapq import merge
+
+from django.conf import settings
+
+from .models import TimetableSource
+from .schedule import DAYS_OF_WEEK, EventRecord, _start
+
+MAGIC = b'CPSNAP02'
+HEADER = struct.Struct('<8sQIIIQQQ')
+EVENT = struct.Struct('<IHHIIIIII')
+CODE = struct.Struct('<III')
+LENGTH = struct.Struct('<I')
+NONE = 0xFFFFFFFF
+
+EVENT_FIELDS = ('day', 'start_time', 'end_time', 'location', 'course_code',
+                'normalized_code', 'details', 'lecturer')
+
+_DAY_ORDER = {day: i for i, day in enumerate(DAYS_OF_WEEK)}
+
+# Snapshots mapped by this process: {source_id: (pointer stat key, Snapshot)}
+_mapped = {}
+# Last snapshot this process served per source, used while a rebuild runs
+_last_good = {}
+
+# Build locks: a per-process RLock in front of a host-wide flock, re-entrant
+# so an ingest publishing from inside a cold build doesn't wait on itself.
+_thread_locks = defaultdict(threading.RLock)
+_lock_fds = {}
+_lock_depth = defaultdict(int)
+
+
+def load_event_records(source):
+    """Reads a source's events from the database as compact EventRecords."""
+    rows = source.events.order_by('id').values_list(*EVENT_FIELDS)
+    return [
+        EventRecord(day, start.hour * 60 + start.minute, end.hour * 60 + end.minute,
+                    location, course_code, normalized_code, details, lecturer, seq)
+        for seq, (day, start, end, location, course_code, normalized_code, details, lecturer)
+        in enumerate(rows.iterator(chunk_size=2000))
+    ]
+
+
+def compile_snapshot(records, version):
+    """Serializes EventRecords into the snapshot file format."""
+    records = sorted(records, key=lambda e: (
+        e.normalized_code, _DAY_ORDER.get(e.day, len(_DAY_ORDER)), e.start, e.seq))
+
+    strings, string_ids = [], {}
+
+    def ref(value):
+        if value is None:
+            return NONE
+        if value not in string_ids:
+            string_ids[value] = len(strings)
+            strings.append(value)
+        return string_ids[value]
+
+    events = bytearray()
+    codes = []
+    for i, e in enumerate(records):
+        code = ref(e.normalized_code)
+        if not codes or codes[-1][0] != code:
+            codes.append([code, i, 0])
+        codes[-1][2] += 1
+        events += EVENT.pack(ref(e.day), e.start, e.end, ref(e.location),
+                             ref(e.course_code), code, ref(e.details),
+                             ref(e.lecturer), e.seq)
+
+    string_table = bytearray()
+    for value in strings:
+        encoded = value.encode('utf-8')
+        string_table += LENGTH.pack(len(encoded)) + encoded
+
+    strings_offset = HEADER.size
+    events_offset = strings_offset + len(string_table)
+    codes_offset = events_offset + len(events)
+    header = HEADER.pack(MAGIC, version, len(strings), len(records), len(codes),
+                         strings_offset, events_offset, codes_offset)
+    return b''.join([header, string_table, events,
+                     b''.join(CODE.pack(*c) for c in codes)])
+
+
+class Snapshot:
+    """
+    A memory-mapped compiled schedule. Offers the same lookups as
+    ScheduleIndex but only decodes the events of the requested courses.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self.version, n_strings, self.n_events, n_codes,
+         strings_offset, self._events_offset, codes_offset) = HEADER.unpack_from(self._mm)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a schedule snapshot")
+
+        self._strings = []
+        pos = strings_offset
+        for _ in range(n_strings):
+            (length,) = LENGTH.unpack_from(self._mm, pos)
+            pos += LENGTH.size
+            self._strings.append(sys.intern(self._mm[pos:pos + length].decode('utf-8')))
+            pos += length
+
+        self.by_code = {}
+        for code, first, count in CODE.iter_unpack(
+                self._mm[codes_offset:codes_offset + n_codes * CODE.size]):
+            self.by_code[self._strings[code]] = (first, count)
+
+    def __len__(self):
+        return self.n_events
+
+    def __bool__(self):
+        return self.n_events > 0
+
+    def _string(self, idx):
+        return None if idx == NONE else self._strings[idx]
+
+    def _decode(self, first, count):
+        start = self._events_offset + first * EVENT.size
+        s = self._string
+        return [
+            EventRecord(s(day), start_min, end_min, s(location), s(course_code),
+                        s(code), s(details), s(lecturer), seq)
+            for day, start_min, end_min, location, course_code, code, details, lecturer, seq
+            in EVENT.iter_unpack(self._mm[start:start + count * EVENT.size])
+        ]
+
+    @property
+    def events(self):
+        """Every event in the snapshot (decodes the whole file)."""
+        return self._decode(0, self.n_events)
+
+    def codes(self):
+        return list(self.by_code)
+
+    def events_for(self, course_codes):
+        found = []
+        for code in set(course_codes):
+            if code in self.by_code:
+                found.extend(self._decode(*self.by_code[code]))
+        return found
+
+    def schedule_for(self, course_codes, days=DAYS_OF_WEEK):
+        # Each course's events are stored in day order, then by start time
+        runs_by_day = {day: [] for day in days}
+        for code in set(course_codes):
+            if code not in self.by_code:
+                continue
+            run = []
+            for event in self._decode(*self.by_code[code]):
+                if run and run[-1].day != event.day:
+                    if run[-1].day in runs_by_day:
+                        runs_by_day[run[-1].day].append(run)
+                    run = []
+                run.append(event)
+            if run and run[-1].day in runs_by_day:
+                runs_by_day[run[-1].day].append(run)
+
+        return {day: runs[0] if len(runs) == 1 else list(merge(*runs, key=_start))
+                for day, runs in runs_by_day.items()}
+
+    def warm(self):
+        """Faults the whole file into the page cache ahead of first use."""
+        if hasattr(mmap, 'MADV_WILLNEED'):
+            self._mm.madvise(mmap.MADV_WILLNEED)
+        page = mmap.PAGESIZE
+        return sum(self._mm[i] for i in range(0, len(self._mm), page))
+
+    def close(self):
+        self._mm.close()
+
+
+def _source_dir(source_id):
+    return os.path.join(settings.SCHEDULE_SNAPSHOT_DIR, f'source_{int(source_id)}')
+
+
+def _snapshot_path(source_id, version):
+    return os.path.join(_source_dir(source_id), f'v{version}.snap')
+
+
+def _pointer_path(source_id):
+    return os.path.join(_source_dir(source_id), 'current')
+
+
+def _lock_path(source_id):
+    return os.path.join(_source_dir(source_id), '.lock')
+
+
+@contextmanager
+def build_lock(source_id, timeout):
+    """Yields True once this process may (re)build the source's snapshot,
+    or False if the lock could not be taken within ``timeout`` seconds."""
+    source_id = int(source_id)
+    rlock = _thread_locks[source_id]
+    if not rlock.acquire(timeout=timeout if timeout > 0 else 0):
+        yield False
+        return
+    try:
+        if _lock_depth[source_id] == 0:
+            os.makedirs(_source_dir(source_id), exist_ok=True)
+            fd = os.open(_lock_path(source_id), os.O_CREAT | os.O_RDWR, 0o644)
+            deadline = time.monotonic() + timeout
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        os.close(fd)
+                        yield False
+                        return
+                    time.sleep(0.02)
+            _lock_fds[source_id] = fd
+
+        _lock_depth[source_id] += 1
+        try:
+            yield True
+        finally:
+            _lock_depth[source_id] -= 1
+            if _lock_depth[source_id] == 0:
+                fd = _lock_fds.pop(source_id)
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+    finally:
+        rlock.release()
+
+
+def _write_atomic(path, data):
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def publish(source_id, version, records):
+    """Writes the snapshot for ``version`` and makes it the current one."""
+    os.makedirs(_source_dir(source_id), exist_ok=True)
+    _write_atomic(_snapshot_path(source_id, version), compile_snapshot(records, version))
+    _write_atomic(_pointer_path(source_id), str(version).encode())
+    _prune(source_id, keep=(version, version - 1))
+
+
+def publish_source(source_id):
+    """Compiles the source's current events from the database and publishes them."""
+    source = TimetableSource.objects.get(id=source_id)
+    publish(source.id, source.schedule_version, load_event_records(source))
+    return current(source.id)
+
+
+def _prune(source_id, keep):
+    for name in os.listdir(_source_dir(source_id)):
+        if not name.endswith('.snap'):
+            continue
+        try:
+            version = int(name[1:-5])
+        except ValueError:
+            continue
+        if version not in keep:
+            try:
+                os.remove(os.path.join(_source_dir(source_id), name))
+            except FileNotFoundError:
+                pass
+
+
+def current(source_id):
+    """The mapped current Snapshot for a source, or None if none is published."""
+    source_id = int(source_id)
+    try:
+        st = os.stat(_pointer_path(source_id))
+    except FileNotFoundError:
+        return None
+
+    key = (st.st_ino, st.st_mtime_ns)
+    entry = _mapped.get(source_id)
+    if entry is not None and entry[0] == key:
+        return entry[1]
+
+    try:
+        with open(_pointer_path(source_id), 'rb') as f:
+            version = int(f.read())
+        snapshot = Snapshot(_snapshot_path(source_id, version))
+    except (FileNotFoundError, ValueError):
+        return None
+    _mapped[source_id] = (key, snapshot)
+    _last_good[source_id] = snapshot
+    return snapshot
+
+
+def get_or_build(source_id, build):
+    """
+    The current Snapshot, compiling it if the source is cold.
+
+    ``build()`` runs under the build lock and returns ``(version, records)``
+    to publish, or None if it already published (e.g. by ingesting).
+    Callers that lose the race get the previous version if this process has
+    one, else wait for the winner; None means nothing could be served.
+    """
+    snapshot = current(source_id)
+    if snapshot is not None:
+        return snapshot
+
+    stale = _last_good.get(int(source_id))
+    wait = 0 if stale is not None else settings.SCHEDULE_REBUILD_WAIT
+    with build_lock(source_id, wait) as acquired:
+        if not acquired:
+            return stale
+        # The previous holder may have just published it
+        snapshot = current(source_id)
+        if snapshot is not None:
+            return snapshot
+        built = build()
+        if built is not None:
+            publish(source_id, *built)
+    return current(source_id)
+
+
+def invalidate(source_id):
+    """Unpublishes the current version so the next request rebuilds it."""
+    try:
+        os.remove(_pointer_path(source_id))
+    except FileNotFoundError:
+        pass
+
+
+def current_version(source_id):
+    snapshot = current(source_id)
+    return snapshot.version if snapshot is not None else None
+
+
+def drop(source_id):
+    """Removes every snapshot of a deleted source."""
+    _mapped.pop(int(source_id), None)
+    _last_good.pop(int(source_id), None)
+    shutil.rmtree(_source_dir(source_id), ignore_errors=True)
@@ -0,0 +1,151 @@
+# core/synthetic.py
+"""Generators for realistic-looking master timetable data at any scale."""
+import random
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+
+# Teaching periods as they appear in the university's master files
+TIME_SLOTS = [
+    "7:00a - 9:00a", "7:00a - 9:55a", "9:10a - 11:10a", "9:10a - 12:10p",
+    "10:00a - 11:00a", "11:15a - 1:15p", "12:15p - 1:15p", "1:30p - 2:30p",
+    "1:30p - 3:30p", "2:35p - 4:35p", "3:40p - 5:40p", "4:40p - 6:40p",
+]
+SESSION_TYPES = ["Lec 1", "Lec 2", "Lec 3", "Tut 1", "Tut 2", "Lab 1", "Lab 2"]
+BLOCKS = ["A-BLOCK", "B-BLOCK", "C-BLOCK", "D-BLOCK", "SCIENCE", "ENG", "NLT"]
+SURNAMES = [
+    "Mensah", "Owusu", "Asante", "Boateng", "Oladejo", "Olutayo", "Asaah",
+    "Adjei", "Appiah", "Danso", "Nkrumah", "Quaye", "Tetteh", "Yeboah",
+    "Agyeman", "Amoah", "Darko", "Frimpong", "Kyei", "Ofori",
+]
+
+
+def department_codes(rng, count):
+    letters = "ABCDEFGHIJKLMNOPRSTUVWY"
+    codes = set()
+    while len(codes) < count:
+        codes.add(''.join(rng.choice(letters) for _ in range(rng.choice((3, 3, 4)))))
+    return sorted(codes)
+
+
+def course_catalog(n_courses, seed=0):
+    """A list of 'DEPT 123' codes with a realistic department spread."""
+    rng = random.Random(seed)
+    departments = department_codes(rng, max(5, n_courses // 25))
+    # A few large departments teach most courses
+    weights = [1.0 / (rank + 1) for rank in range(len(departments))]
+    catalog = set()
+    while len(catalog) < n_courses:
+        dept = rng.choices(departments, weights)[0]
+        catalog.add(f"{dept} {rng.randint(1, 6)}{rng.randint(0, 9)}{rng.randint(0, 9)}")
+    return sorted(catalog)
+
+
+def iter_master_rows(n_events, seed=0):
+    """Yields ``n_events`` rows shaped like the master timetable JSON."""
+    rng = random.Random(seed)
+    catalog = course_catalog(max(10, n_events // 3), seed)
+    venues = [f"{rng.choice(BLOCKS)} RM {i} ({rng.choice((40, 60, 120, 300))})"
+              for i in range(max(20, n_events // 40))]
+    lecturers = [f"{rng.choice(SURNAMES)}, {rng.choice('ABCDEFGKMNOPS')} {rng.choice('ABCDEFGKMNOPS')}"
+                 for _ in range(max(20, n_events // 15))]
+
+    emitted = 0
+    while emitted < n_events:
+        course = rng.choice(catalog)
+        lecturer = rng.choice(lecturers)
+        for _ in range(rng.choice((1, 2, 2, 3))):
+            if emitted >= n_events:
+                break
+            yield {
+                "Day": rng.choice(DAYS),
+                "Time": rng.choice(TIME_SLOTS),
+                "Course": f"{course} {rng.choice(SESSION_TYPES)}",
+                "Venue": rng.choice(venues),
+                "Instructor(s)": lecturer,
+            }
+            emitted += 1
+
+
+def make_master_rows(n_events, seed=0):
+    return list(iter_master_rows(n_events, seed))
+
+
+def course_sets(catalog, count, min_courses=5, max_courses=12, seed=0):
+    """Student course selections drawn from a catalog."""
+    rng = random.Random(seed)
+    return [rng.sample(catalog, min(len(catalog), rng.randint(min_courses, max_courses)))
+            for _ in range(count)]
+
+
+PROGRAMMES = [
+    "BSc Computer Science", "BSc Accounting", "BSc Actuarial Science",
+    "BSc Economics", "BSc Mathematics", "BSc Chemistry", "BEng Civil Engineering",
+    "BA Business Administration", "BSc Statistics", "BSc Information Technology",
+]
+LEVELS = ["Level 100", "Level 200", "Level 300", "Level 400"]
+FIRST_NAMES = [
+    "Kwame", "Ama", "Kofi", "Akosua", "Yaw", "Abena", "Kwabena", "Efua",
+    "Kojo", "Adwoa", "Tunde", "Ngozi", "Chidi", "Amina", "Emeka", "Zainab",
+]
+
+
+def registration_sets(catalog, count, min_courses=5, max_courses=12, seed=0):
+    """
+    Student course selections the way registrations actually look: most
+    courses from the student's home department, at its level, plus a couple
+    of electives. Large departments get most of the students. Yields
+    (programme, level, codes).
+    """
+    rng = random.Random(seed)
+    by_dept = {}
+    for code in catalog:
+        by_dept.setdefault(code.split()[0], []).append(code)
+    departments = sorted(by_dept, key=lambda d: -len(by_dept[d]))
+    weights = [len(by_dept[d]) for d in departments]
+    for _ in range(count):
+        dept = rng.choices(departments, weights)[0]
+        level = rng.randint(1, 4)
+        home = [c for c in by_dept[dept] if c.split()[1].startswith(str(level))] or by_dept[dept]
+        wanted = rng.randint(min_courses, max_courses)
+        codes = set(rng.sample(home, min(len(home), wanted - 2)))
+        while len(codes) < min(wanted, len(catalog)):
+            codes.add(rng.choice(catalog))
+        yield (PROGRAMMES[departments.index(dept) % len(PROGRAMMES)],
+               LEVELS[level - 1], sorted(codes))
+
+
+def make_registration_pdf(codes, seed=0):
+    """A course registration slip like the ones students upload, as PDF bytes."""
+    from io import BytesIO
+
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    rng = random.Random(seed)
+    styles = getSampleStyleSheet()
+    rows = [["No.", "Course Code", "Course Title", "Credits"]]
+    for i, code in enumerate(codes, 1):
+        rows.append([str(i), code, f"{rng.choice(('Introduction to', 'Advanced', 'Topics in'))} "
+                     f"{rng.choice(('Accounting', 'Chemistry', 'Statistics', 'Economics', 'Computing'))}",
+                     str(rng.choice((2, 3, 3, 4)))])
+
+    table = Table(rows, colWidths=[40, 100, 260, 60])
+    table.setStyle(TableStyle([
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+    ]))
+    story = [
+        Paragraph("COURSE REGISTRATION SLIP", styles['Title']),
+        Paragraph(f"Student ID: {rng.randint(10000000, 99999999)}", styles['Normal']),
+        Paragraph("Programme: BSc. Computer Science, Level 200", styles['Normal']),
+        Paragraph("Academic Year 2024/2025, Semester I", styles['Normal']),
+        Spacer(1, 12),
+        table,
+        Spacer(1, 24),
+        Paragraph(f"Total credits: {sum(int(r[3]) for r in rows[1:])}", styles['Normal']),
+    ]
+    out = BytesIO()
+    SimpleDocTemplate(out, pagesize=A4).build(story)
+    return out.getvalue()
@@ -1,3 +1,905 @@
+import csv
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import zipfile
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from django.conf import settings
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from . import artifacts, jobs, memprofile, metrics, pdf_pool, rendering, snapshots
+from .admission import Admission
+from .cohort import CohortItem, CohortJob
+from .ingest import build_event, ingest_master_timetable, iter_json_array
+from .extraction import STRATEGIES, ExtractionError, extract_course_codes, plumber_table
+from .master_pdf import rows_from_page
+from .memo import LRUMemo
+from .middleware import RequestBudgetExceeded
+from .models import IngestJob, TimetableEvent, TimetableSource, User
+from .schedule import EventRecord, ScheduleIndex
+from .synthetic import make_registration_pdf
+from .workerfiles import AGGREGATE, WorkerFiles
+
+
+def master_row(day, time, course, venue='ENG RM 1 (40)', lecturer='Mensah, B P'):
+    return {'Day': day, 'Time': time, 'Course': course, 'Venue': venue, 'Instructor(s)': lecturer}
+
+
+MASTER_ROWS = [
+    master_row('Monday', '7:00a - 9:55a', 'ENV 633 Lec 1'),
+    master_row('Monday', '10:00a - 11:00a', 'JED 540 Tut 1', venue='D-BLOCK RM 4 (120)'),
+    master_row('Tuesday', '3:40p - 5:40p', 'JED 540 Lab 2', lecturer=''),
+    master_row('Friday', '1:00p - 2:55p', 'ENV 633 Tut 1'),
+]
+
+
+def fields(event):
+    return tuple(getattr(event, name) for name in EventRecord.__slots__)
+
+
+def schedule_fields(schedule):
+    return {day: [fields(event) for event in events] for day, events in schedule.items()}
+
+
+SNAPSHOT_RECORDS = [
+    EventRecord('Monday', 420, 595, 'ENG RM 1 (40)', 'ENV 633', 'ENV 633', 'Lec 1', 'Mensah, B P', 0),
+    EventRecord('Monday', 420, 480, 'D-BLOCK RM 4 (120)', 'JED 540', 'JED 540', 'Tut 1', None, 1),
+    EventRecord('Friday', 780, 895, None, 'ENV 633', 'ENV 633', None, 'Ofori, S G', 2),
+    EventRecord('Tuesday', 940, 1060, 'Salle Ébène', 'JED 540', 'JED 540', 'Lab 2', 'Nkrumah, É', 3),
+    # Same start as seq 1: row order breaks the tie
+    EventRecord('Monday', 420, 500, 'N-BLOCK RM 2 (60)', 'ENV 633', 'ENV 633', 'Tut 2', '', 4),
+]
+
+
+class MediaRootMixin:
+    """
+    Runs each test against an empty MEDIA_ROOT, with every directory the app
+    writes state to (snapshots, renders, metrics, memory profiles, admission
+    slots) moved under it, so nothing lands in the working tree's var/.
+    """
+
+    def setUp(self):
+        super().setUp()
+        root = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(self.settings(
+            MEDIA_ROOT=root,
+            SCHEDULE_SNAPSHOT_DIR=os.path.join(root, 'snapshots'),
+            RENDER_CACHE_DIR=os.path.join(root, 'renders'),
+            METRICS_DIR=os.path.join(root, 'metrics'),
+            MEMORY_PROFILE_DIR=os.path.join(root, 'memprofile'),
+            ADMISSION_DIR=os.path.join(root, 'admission'),
+        ))
+        self.media_root = root
+        self.user = User.objects.create_user('uploader', 'uploader@example.com', 'pw')
+
+    def make_source(self, rows, name='master.json'):
+        os.makedirs(os.path.join(self.media_root, 'master_timetables'), exist_ok=True)
+        source = TimetableSource.objects.create(
+            academic_year='2024/2025', semester='Semester 1', display_name='Test semester',
+            source_json=f'master_timetables/{name}', uploader=self.user)
+        self.write_rows(source, rows)
+        return source
+
+    def write_rows(self, source, rows):
+        with open(source.source_json.path, 'w') as f:
+            json.dump(rows, f)
+
+
+class IterJsonArrayTests(TestCase):
+    def parse(self, text, chunk_size):
+        return list(iter_json_array(io.StringIO(text), chunk_size))
+
+    def test_matches_json_loads_at_every_small_chunk_size(self):
+        # Strings holding brackets and commas, and numbers that a chunk
+        # boundary can cut in two
+        data = [MASTER_ROWS[0], {'Course': 'A [1], B {2}', 'n': 12345}, 678, 'x,]', [], {}]
+        text = json.dumps(data, indent=1)
+        for chunk_size in range(1, 12):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(self.parse(text, chunk_size), data)
+
+    def test_empty_array_and_whitespace(self):
+        self.assertEqual(self.parse('  [ \n ]  ', 1), [])
+        self.assertEqual(self.parse('\n[ 1 ,\n 2 ]', 2), [1, 2])
+
+    def test_malformed_input_raises(self):
+        for text in ('{"Day": "Monday"}', '', '[1 2]', '[1, 2', '[{"Day": "Mon', '[1,, 2]'):
+            with self.subTest(text=text), self.assertRaises(ValueError):
+                self.parse(text, 3)
+
+
+class IngestDiffTests(MediaRootMixin, TestCase):
+    def ingest(self, source):
+        source.refresh_from_db()
+        return ingest_master_timetable(source)
+
+    def test_first_ingest_creates_every_row(self):
+        stats = self.ingest(self.make_source(MASTER_ROWS))
+        self.assertEqual((stats.events_created, stats.events_updated, stats.events_deleted), (4, 0, 0))
+        self.assertEqual(TimetableEvent.objects.count(), 4)
+
+    def test_unchanged_file_is_a_no_op(self):
+        source = self.make_source(MASTER_ROWS)
+        self.ingest(source)
+        stats = self.ingest(source)
+        self.assertTrue(stats.unchanged_file)
+        self.assertFalse(stats.changed)
+
+    def test_unchanged_rows_are_left_alone(self):
+        source = self.make_source(MASTER_ROWS)
+        self.ingest(source)
+        ids = set(TimetableEvent.objects.values_list('id', flat=True))
+        version = TimetableSource.objects.get(id=source.id).schedule_version
+        # Same rows in a different order, so the file hash changes
+        self.write_rows(source, MASTER_ROWS[::-1])
+
+        stats = self.ingest(source)
+        self.assertFalse(stats.unchanged_file)
+        self.assertEqual(stats.events_unchanged, 4)
+        self.assertFalse(stats.changed)
+        self.assertEqual(set(TimetableEvent.objects.values_list('id', flat=True)), ids)
+        self.assertEqual(TimetableSource.objects.get(id=source.id).schedule_version, version)
+
+    def test_counts_creates_updates_and_deletes(self):
+        source = self.make_source(MASTER_ROWS)
+        self.ingest(source)
+        moved = TimetableEvent.objects.get(course_code='ENV 633', details='Lec 1')
+        rows = [
+            # Same class in a new room: an update in place
+            dict(MASTER_ROWS[0], Venue='N-BLOCK RM 2 (60)'),
+            MASTER_ROWS[1],
+            MASTER_ROWS[2],
+            # MASTER_ROWS[3] is dropped and a new class added
+            master_row('Wednesday', '8:00a - 9:00a', 'ZZZ 999 Lec 1'),
+        ]
+        self.write_rows(source, rows)
+
+        stats = self.ingest(source)
+        self.assertEqual((stats.events_created, stats.events_updated, stats.events_deleted,
+                          stats.events_unchanged), (1, 1, 1, 2))
+        moved.refresh_from_db()
+        self.assertEqual(moved.location, 'N-BLOCK RM 2 (60)')
+        self.assertFalse(TimetableEvent.objects.filter(details='Tut 1', course_code='ENV 633').exists())
+        self.assertEqual(TimetableSource.objects.get(id=source.id).total_events, 4)
+
+
+class SnapshotTests(MediaRootMixin, TestCase):
+    source_id = 4242
+
+    def tearDown(self):
+        snapshots.drop(self.source_id)
+        super().tearDown()
+
+    def test_round_trip_matches_the_in_memory_index(self):
+        index = ScheduleIndex(SNAPSHOT_RECORDS)
+        snapshots.publish(self.source_id, 3, SNAPSHOT_RECORDS)
+        snapshot = snapshots.current(self.source_id)
+
+        self.assertEqual(snapshot.version, 3)
+        self.assertEqual(len(snapshot), len(SNAPSHOT_RECORDS))
+        self.assertEqual(sorted(snapshot.codes()), ['ENV 633', 'JED 540'])
+        for codes in (['ENV 633'], ['JED 540', 'ENV 633'], ['ENV 633', 'NOPE 101'], []):
+            with self.subTest(codes=codes):
+                self.assertEqual(schedule_fields(snapshot.schedule_for(codes)),
+                                 schedule_fields(index.schedule_for(codes)))
+        self.assertEqual(sorted(map(fields, snapshot.events)), sorted(map(fields, SNAPSHOT_RECORDS)))
+
+    def test_compiled_file_maps_directly(self):
+        path = os.path.join(self.media_root, 'direct.snap')
+        with open(path, 'wb') as f:
+            f.write(snapshots.compile_snapshot(SNAPSHOT_RECORDS, 7))
+        snapshot = snapshots.Snapshot(path)
+        try:
+            monday = snapshot.schedule_for(['ENV 633', 'JED 540'])['Monday']
+            self.assertEqual([event.seq for event in monday], [0, 1, 4])
+            self.assertEqual(monday[1].lecturer, None)
+        finally:
+            snapshot.close()
+
+    def test_publishing_a_new_version_replaces_the_mapped_one(self):
+        snapshots.publish(self.source_id, 1, SNAPSHOT_RECORDS)
+        self.assertEqual(snapshots.current_version(self.source_id), 1)
+        snapshots.publish(self.source_id, 2, SNAPSHOT_RECORDS[:2])
+        self.assertEqual(snapshots.current_version(self.source_id), 2)
+        self.assertEqual(len(snapshots.current(self.source_id)), 2)
+
+
+class SnapshotRebuildTests(MediaRootMixin, TestCase):
+    source_id = 4343
+
+    def tearDown(self):
+        snapshots.drop(self.source_id)
+        super().tearDown()
+
+    def hold_build_lock(self):
+        """Holds the source's build lock on another thread until the test ends."""
+        held, done = threading.Event(), threading.Event()
+
+        def hold():
+            with snapshots.build_lock(self.source_id, 0):
+                held.set()
+                done.wait()
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(done.set)
+        held.wait()
+
+    def test_cold_source_is_built_once(self):
+        builds = []
+
+        def build():
+            builds.append(1)
+            return 1, SNAPSHOT_RECORDS
+
+        first = snapshots.get_or_build(self.source_id, build)
+        second = snapshots.get_or_build(self.source_id, build)
+        self.assertEqual(first.version, 1)
+        self.assertIs(second, first)
+        self.assertEqual(builds, [1])
+
+    def test_serves_the_stale_snapshot_while_another_build_runs(self):
+        snapshots.publish(self.source_id, 1, SNAPSHOT_RECORDS)
+        stale = snapshots.current(self.source_id)
+        snapshots.invalidate(self.source_id)
+        self.hold_build_lock()
+
+        def build():
+            self.fail('the loser of the build race must not build')
+
+        self.assertIs(snapshots.get_or_build(self.source_id, build), stale)
+
+    def test_gives_up_after_the_wait_without_a_stale_snapshot(self):
+        self.hold_build_lock()
+        with self.settings(SCHEDULE_REBUILD_WAIT=0.05):
+            self.assertIsNone(snapshots.get_or_build(self.source_id, lambda: (1, SNAPSHOT_RECORDS)))
+
+
+class ScheduleApiTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.source = self.make_source(MASTER_ROWS)
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_master_timetable(self.source)
+        self.client.force_login(self.user)
+        self.url = reverse('api_schedule')
+        self.params = {'source_id': self.source.id, 'codes': 'ENV 633,JED540'}
+
+    def tearDown(self):
+        snapshots.drop(self.source.id)
+        super().tearDown()
+
+    def test_anonymous_request_is_401(self):
+        self.client.logout()
+        response = self.client.get(self.url, self.params)
+        self.assertEqual(response.status_code, 401)
+
+    def test_returns_the_schedule_with_an_etag(self):
+        response = self.client.get(self.url, self.params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'])
+        data = response.json()
+        self.assertEqual(data['codes'], ['ENV 633', 'JED 540'])
+        self.assertEqual(data['missing'], [])
+        self.assertEqual(data['schedule']['Monday'][0][:3], ['ENV 633', '07:00', '09:55'])
+
+    def test_matching_etag_is_304_until_the_schedule_changes(self):
+        etag = self.client.get(self.url, self.params)['ETag']
+
+        response = self.client.get(self.url, self.params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+        # Another format is another representation
+        full = self.client.get(self.url, dict(self.params, format='full'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(full.status_code, 200)
+
+        self.write_rows(self.source, [dict(MASTER_ROWS[0], Venue='N-BLOCK RM 2 (60)')] + MASTER_ROWS[1:])
+        self.source.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_master_timetable(self.source)
+        response = self.client.get(self.url, self.params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class RequestCostTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.source = self.make_source(MASTER_ROWS)
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_master_timetable(self.source)
+        self.client.force_login(self.user)
+        self.url = reverse('api_schedule')
+        self.params = {'source_id': self.source.id, 'codes': 'ENV 633'}
+        # The session lookup alone puts any logged-in view over this
+        self.tight = {'api_schedule': {'queries': 0}}
+
+    def tearDown(self):
+        snapshots.drop(self.source.id)
+        super().tearDown()
+
+    def test_server_timing_reports_db_queries_and_total(self):
+        response = self.client.get(self.url, self.params)
+        match = re.fullmatch(r'db;dur=([\d.]+);desc="(\d+) queries", app;dur=([\d.]+)',
+                             response['Server-Timing'])
+        self.assertIsNotNone(match, response['Server-Timing'])
+        db_ms, queries, wall_ms = float(match[1]), int(match[2]), float(match[3])
+        self.assertGreater(queries, 0)
+        self.assertLessEqual(db_ms, wall_ms)
+
+    def test_strict_mode_raises_over_budget(self):
+        with self.settings(REQUEST_BUDGETS=self.tight, REQUEST_BUDGET_STRICT=True):
+            with self.assertRaisesMessage(RequestBudgetExceeded, 'api_schedule over budget'):
+                self.client.get(self.url, self.params)
+
+    def test_otherwise_logs_a_warning(self):
+        with self.settings(REQUEST_BUDGETS=self.tight, REQUEST_BUDGET_STRICT=False), \
+                self.assertLogs('core.requests', 'WARNING') as logs:
+            response = self.client.get(self.url, self.params)
+        self.assertEqual(response.status_code, 200)
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record['view'], 'api_schedule')
+        self.assertEqual(record['over_budget'], ['queries'])
+
+    def test_within_budget_logs_info(self):
+        with self.settings(REQUEST_BUDGET_STRICT=True), self.assertLogs('core.requests', 'INFO') as logs:
+            self.client.get(self.url, self.params)
+        self.assertEqual([r.levelname for r in logs.records], ['INFO'])
+        self.assertNotIn('over_budget', json.loads(logs.records[-1].getMessage()))
+
+
+ADMISSION_GROUPS = {
+    'render': {'slots': 1, 'queue': 1, 'wait': 0.05, 'reserved': 1},
+    'upload': {'slots': 1, 'queue': 0, 'wait': 0, 'reserved': 1},
+}
+
+
+class AdmissionTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.enterContext(self.settings(ADMISSION_MAX_BUSY=4, ADMISSION_GROUPS=ADMISSION_GROUPS))
+
+    def admit(self, group):
+        admission = Admission(group)
+        self.addCleanup(admission.release)
+        return admission
+
+    def test_rejects_once_slots_and_queue_are_taken(self):
+        self.assertTrue(self.admit('render').acquire())
+        # Takes the queue place and times out waiting for the slot
+        waiting = self.admit('render')
+        self.assertFalse(waiting.acquire())
+        self.assertEqual(waiting.reason, 'wait timed out')
+        self.assertGreater(waiting.waited, 0)
+
+        self.assertTrue(self.admit('upload').acquire())
+        rejected = self.admit('upload')
+        self.assertFalse(rejected.acquire())
+        self.assertEqual(rejected.reason, 'queue full')
+
+    def test_release_frees_the_slot(self):
+        first = self.admit('upload')
+        self.assertTrue(first.acquire())
+        first.release()
+        first.release()
+        self.assertTrue(self.admit('upload').acquire())
+
+    def test_busy_cap_keeps_each_groups_reservation(self):
+        wide = dict(ADMISSION_GROUPS, render={'slots': 3, 'queue': 0, 'wait': 0, 'reserved': 1})
+        with self.settings(ADMISSION_MAX_BUSY=3, ADMISSION_GROUPS=wide):
+            # render holds its reserved place and the one shared place
+            self.assertTrue(self.admit('render').acquire())
+            self.assertTrue(self.admit('render').acquire())
+            third = self.admit('render')
+            self.assertFalse(third.acquire())
+            self.assertEqual(third.reason, 'host busy')
+            self.assertTrue(self.admit('upload').acquire())
+
+    def test_middleware_answers_503_with_retry_after(self):
+        self.assertTrue(self.admit('render').acquire())
+        with self.settings(ADMISSION_GROUPS=dict(ADMISSION_GROUPS, render={'slots': 1, 'reserved': 1})):
+            response = self.client.get(reverse('download_timetable_pdf'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '5')
+        # Rejections pass back through SecurityMiddleware
+        self.assertEqual(response['X-Content-Type-Options'], 'nosniff')
+
+
+MASTER_PDF = os.path.join(settings.BASE_DIR, 'master_timetables',
+                          'TEACHING_TIME_TABLE_FOR_SEMESTER_I_2024__2025__FINAL_O7xgWXm.pdf')
+
+
+class MasterPdfPageTests(TestCase):
+    def page_rows(self, index):
+        import pdfplumber
+
+        with pdfplumber.open(MASTER_PDF) as pdf:
+            return rows_from_page(pdf.pages[index])
+
+    def test_reads_every_class_on_a_page(self):
+        day, rows, missed = self.page_rows(8)
+        self.assertEqual((day, len(rows), missed), ('Friday', 32, 0))
+        self.assertEqual(rows[0], {
+            'Day': 'Friday', 'Time': '7:00a - 8:55a', 'Course': 'CHE 203 Lec 1',
+            'Venue': 'OLD LIBRARY RM2 (250, 51.50)', 'Instructor(s)': 'Abudu, F',
+        })
+        # Two lecturers stacked in one cell
+        self.assertEqual(rows[1]['Instructor(s)'], 'Achaliwie, F Doat, A')
+        self.assertEqual(rows[-1]['Venue'], 'SL BIOLOGY CLR (50, 54.50)')
+
+    def test_rows_build_events(self):
+        _, rows, _ = self.page_rows(8)
+        source = TimetableSource(id=1)
+        events = [build_event(source, row) for row in rows]
+        self.assertNotIn(None, events)
+        self.assertEqual(events[0].normalized_code, 'CHE 203')
+
+    def test_counts_classes_whose_time_is_unreadable(self):
+        day, rows, missed = self.page_rows(7)
+        self.assertEqual((day, len(rows), missed), ('Friday', 83, 1))
+
+
+class IngestJobTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.source = self.make_source(MASTER_ROWS)
+        self.job = jobs.enqueue_ingest(self.source)
+
+    def test_only_one_worker_wins_a_job(self):
+        claim = jobs._claim
+
+        def racing(job_id, name):
+            # Worker b claims the job between a's read and a's UPDATE
+            if name == 'a':
+                claim(job_id, 'b')
+            return claim(job_id, name)
+
+        with mock.patch.object(jobs, '_claim', racing):
+            self.assertIsNone(jobs.claim_next_job('a'))
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.status, self.job.worker, self.job.attempts),
+                         (IngestJob.RUNNING, 'b', 1))
+        self.assertIsNone(jobs.claim_next_job('c'))
+
+    def test_stale_jobs_are_requeued_until_attempts_run_out(self):
+        old = timezone.now() - timedelta(seconds=settings.INGEST_JOB_TIMEOUT + 1)
+        retry = jobs.claim_next_job('gone')
+        IngestJob.objects.filter(id=retry.id).update(started_at=old)
+        other = self.make_source(MASTER_ROWS, name='other.json')
+        spent = IngestJob.objects.create(
+            source=other, status=IngestJob.RUNNING, worker='gone', started_at=old,
+            attempts=settings.INGEST_JOB_MAX_ATTEMPTS)
+        fresh = IngestJob.objects.create(
+            source=other, status=IngestJob.RUNNING, worker='alive', started_at=timezone.now(), attempts=1)
+
+        self.assertEqual(jobs.requeue_stale_jobs(), 1)
+        retry.refresh_from_db()
+        spent.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual((retry.status, retry.worker), (IngestJob.QUEUED, ''))
+        self.assertEqual(spent.status, IngestJob.FAILED)
+        self.assertEqual(TimetableSource.objects.get(id=other.id).status, TimetableSource.FAILED)
+        self.assertEqual(fresh.status, IngestJob.RUNNING)
+
+    def test_successful_job_is_done(self):
+        self.assertTrue(jobs.run_job(jobs.claim_next_job('w')))
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, IngestJob.DONE)
+        self.assertEqual(TimetableSource.objects.get(id=self.source.id).total_events, 4)
+
+    def test_failed_ingest_stores_the_traceback(self):
+        with open(self.source.source_json.path, 'w') as f:
+            f.write('[{"Day": "Monday", ')
+        self.assertFalse(jobs.run_job(jobs.claim_next_job('w')))
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, IngestJob.FAILED)
+        self.assertIn('Traceback', self.job.error)
+        self.assertIn('JSONDecodeError', self.job.error)
+        self.assertEqual(TimetableSource.objects.get(id=self.source.id).status, TimetableSource.FAILED)
+
+
+class CohortZipTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.source = self.make_source(MASTER_ROWS)
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_master_timetable(self.source)
+        self.source.refresh_from_db()
+        self.index = snapshots.current(self.source.id)
+
+    def tearDown(self):
+        snapshots.drop(self.source.id)
+        super().tearDown()
+
+    def key(self, codes):
+        return rendering.cache_key(self.source, self.index.version, 'pdf', 'modern', codes)
+
+    def test_streams_every_status_into_the_zip_and_report(self):
+        artifacts.put(self.key(['JED 540']), b'cached JED 540')
+        unreadable = CohortItem('Frank', [])
+        unreadable.status = 'failed'
+        items = [
+            CohortItem('Kofi Mensah', ['ENV 633']),
+            CohortItem('Kofi Mensah', ['ENV 633']),
+            CohortItem('Ama', ['JED 540']),
+            CohortItem('Dave', []),
+            CohortItem('Erin', ['ENV 633', 'JED 540']),
+            unreadable,
+        ]
+
+        def render_one(fmt, template, name, schedule):
+            codes = {event.normalized_code for events in schedule.values() for event in events}
+            if len(codes) > 1:
+                raise RuntimeError('renderer crashed')
+            return f'rendered {" ".join(codes)}'.encode(), 12.5, True
+
+        job = CohortJob(self.source, self.index, items, template='modern', fmt='pdf', workers=1)
+        with mock.patch('core.cohort.render_one', render_one):
+            data = b''.join(job.iter_zip())
+
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            self.assertEqual(archive.namelist(),
+                             ['Ama.pdf', 'Kofi_Mensah.pdf', 'Kofi_Mensah_2.pdf', 'report.csv'])
+            self.assertEqual(archive.read('Ama.pdf'), b'cached JED 540')
+            self.assertEqual(archive.read('Kofi_Mensah.pdf'), b'rendered ENV 633')
+            self.assertEqual(archive.read('Kofi_Mensah_2.pdf'), b'rendered ENV 633')
+            report = list(csv.DictReader(io.StringIO(archive.read('report.csv').decode())))
+
+        self.assertEqual([(row['student'], row['file'], row['status'], row['render_ms']) for row in report[:-1]], [
+            ('Kofi Mensah', 'Kofi_Mensah.pdf', 'rendered', '12.5'),
+            ('Kofi Mensah', 'Kofi_Mensah_2.pdf', 'duplicate', '0.0'),
+            ('Ama', 'Ama.pdf', 'cached', '0.0'),
+            ('Dave', '', 'empty', '0.0'),
+            ('Erin', '', 'failed', '0.0'),
+            ('Frank', '', 'failed', '0.0'),
+        ])
+        self.assertEqual(report[0]['events'], '2')
+        total = report[-1]
+        self.assertEqual((total['student'], total['file'], total['codes']),
+                         ('TOTAL', '6 students', '3 unique course sets'))
+        # The fresh render went into the cache; the failed one didn't
+        self.assertEqual(artifacts.get(self.key(['ENV 633'])), b'rendered ENV 633')
+        self.assertIsNone(artifacts.get(self.key(['ENV 633', 'JED 540'])))
+
+
+def disk_usage(root):
+    return sum(os.path.getsize(os.path.join(directory, name))
+               for directory, _, names in os.walk(root) for name in names)
+
+
+class ArtifactCacheTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        # Module state from earlier tests points at another cache directory
+        self.enterContext(mock.patch.multiple(artifacts, _estimate=None, _writes=0))
+        self.root = settings.RENDER_CACHE_DIR
+
+    def test_stays_under_the_cap(self):
+        keys = [f'1-{n:040x}' for n in range(30)]
+        with self.settings(RENDER_CACHE_MAX_BYTES=1000):
+            for n, key in enumerate(keys):
+                artifacts.put(key, bytes(100))
+                # Fresh entries are newer than the rest, whatever the clock's resolution
+                os.utime(artifacts._path(key), (n, n))
+                self.assertLessEqual(disk_usage(self.root), 1000)
+        self.assertIsNotNone(artifacts.get(keys[-1]))
+        self.assertIsNone(artifacts.get(keys[0]))
+
+    def test_rescans_for_other_workers_writes(self):
+        with self.settings(RENDER_CACHE_MAX_BYTES=1000), mock.patch.object(artifacts, 'SCAN_EVERY', 3):
+            artifacts.put('1-aa', bytes(100))
+            # Another worker's write, which this process's estimate misses
+            path = artifacts._path('2-bb')
+            os.makedirs(os.path.dirname(path))
+            with open(path, 'wb') as f:
+                f.write(bytes(2000))
+            os.utime(path, (0, 0))
+            artifacts.put('1-ab', bytes(100))
+            artifacts.put('1-ac', bytes(100))
+            self.assertGreater(disk_usage(self.root), 1000)
+            artifacts.put('1-ad', bytes(100))
+        self.assertLessEqual(disk_usage(self.root), 1000)
+        self.assertFalse(os.path.exists(path))
+
+    def test_drop_removes_only_that_source(self):
+        artifacts.put('1-aa', b'one')
+        artifacts.put('12-aa', b'twelve')
+        artifacts.drop(1)
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'source-1')))
+        self.assertIsNone(artifacts.get('1-aa'))
+        self.assertEqual(artifacts.get('12-aa'), b'twelve')
+
+
+class DownloadTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.source = self.make_source(MASTER_ROWS)
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_master_timetable(self.source)
+        self.client.force_login(self.user)
+        self.params = {'source_id': self.source.id, 'codes': 'ENV 633,JED 540'}
+
+    def tearDown(self):
+        snapshots.drop(self.source.id)
+        super().tearDown()
+
+    def test_second_download_with_the_etag_is_304(self):
+        for name, content_type in [('download_timetable_pdf', 'application/pdf'),
+                                   ('download_timetable_jpg', 'image/jpeg')]:
+            with self.subTest(name):
+                url = reverse(name)
+                first = self.client.get(url, self.params)
+                self.assertEqual(first.status_code, 200)
+                self.assertEqual(first['Content-Type'], content_type)
+                etag = first['ETag']
+
+                again = self.client.get(url, self.params, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(again.status_code, 304)
+                self.assertEqual(again['ETag'], etag)
+                self.assertEqual(again.content, b'')
+
+                # Without the header the cached bytes come back as they were
+                cached = self.client.get(url, self.params)
+                self.assertEqual(cached.content, first.content)
+
+
+def add_counts(total, data):
+    total = dict(total or {})
+    for name, count in data.items():
+        total[name] = total.get(name, 0) + count
+    return total
+
+
+class WorkerFilesTests(MediaRootMixin, TestCase):
+    # Each WorkerFiles opens its own lock file, so the kernel treats two of
+    # them in one process like two workers
+
+    def worker(self):
+        files = WorkerFiles('METRICS_DIR', add_counts)
+        self.addCleanup(self.exit, files)
+        return files
+
+    def exit(self, files):
+        # What the kernel does to the flock when a worker exits
+        if files._fd is not None:
+            os.close(files._fd)
+            files._fd = None
+
+    def test_fold_merges_dead_workers_and_removes_their_files(self):
+        dead, live = self.worker(), self.worker()
+        dead.write({'renders': 2, 'uploads': 1})
+        live.write({'renders': 5})
+        self.exit(dead)
+
+        self.assertEqual(self.worker().read_all(), [
+            (live._name + '.json', {'renders': 5}),
+            ('aggregate', {'renders': 2, 'uploads': 1}),
+        ])
+        names = os.listdir(settings.METRICS_DIR)
+        self.assertNotIn(dead._name + '.json', names)
+        self.assertNotIn(dead._name + '.lock', names)
+        self.assertIn(live._name + '.lock', names)
+
+        self.exit(live)
+        self.worker().fold_dead()
+        self.assertEqual(self.worker().read_all(), [('aggregate', {'renders': 7, 'uploads': 1})])
+        self.assertEqual(sorted(n for n in os.listdir(settings.METRICS_DIR) if not n.startswith('.')),
+                         [AGGREGATE])
+
+    def test_clear_anywhere_is_seen_once_by_every_process(self):
+        one, other = self.worker(), self.worker()
+        one.write({'renders': 1})
+        self.assertFalse(one.reset_pending())
+        self.assertFalse(other.reset_pending())
+
+        other.clear()
+        self.assertEqual(self.worker().read_all(), [])
+        self.assertTrue(one.reset_pending())
+        self.assertFalse(one.reset_pending())
+        self.assertFalse(other.reset_pending())
+
+    def test_reset_elsewhere_drops_metrics_on_the_next_request(self):
+        files = WorkerFiles('METRICS_DIR', metrics._merge)
+        self.addCleanup(self.exit, files)
+        self.enterContext(mock.patch.object(metrics, '_files', files))
+        self.enterContext(mock.patch.dict(metrics._stages, clear=True))
+        metrics.drop_if_reset()
+        metrics.observe('render_pdf', 0.2)
+        metrics.flush()
+
+        # Another worker's reset() clears the files but not our memory
+        WorkerFiles('METRICS_DIR', metrics._merge).clear()
+        self.assertEqual(set(metrics._stages), {'render_pdf'})
+        metrics.drop_if_reset()
+        self.assertEqual(metrics._stages, {})
+        self.assertEqual(metrics.collect(), {})
+
+
+class LRUMemoTests(TestCase):
+    def test_counts_hits_and_misses(self):
+        memo = LRUMemo(4)
+        self.assertIsNone(memo.get('a'))
+        memo.set('a', 1)
+        self.assertEqual(memo.get('a'), 1)
+        self.assertEqual(memo.get('b', 'missing'), 'missing')
+        self.assertEqual(memo.stats(), {'entries': 1, 'max_entries': 4, 'hits': 1, 'misses': 2,
+                                        'evictions': 0, 'hit_rate': 0.333})
+
+    def test_evicts_the_least_recently_used(self):
+        memo = LRUMemo(2)
+        memo.set('a', 1)
+        memo.set('b', 2)
+        memo.get('a')       # b is now the oldest
+        memo.set('c', 3)
+        self.assertIsNone(memo.get('b'))
+        self.assertEqual((memo.get('a'), memo.get('c')), (1, 3))
+        memo.set('a', 10)   # an update refreshes too
+        memo.set('d', 4)
+        self.assertIsNone(memo.get('c'))
+        self.assertEqual(memo.get('a'), 10)
+        self.assertEqual((len(memo), memo.evictions), (2, 2))
+
+    def test_size_zero_stores_nothing(self):
+        memo = LRUMemo(0)
+        memo.set('a', 1)
+        self.assertIsNone(memo.get('a'))
+        self.assertEqual(len(memo), 0)
+
+
+class ExtractCachedTests(TestCase):
+    def setUp(self):
+        # Extract in this process, into a memo of the test's own
+        self.enterContext(self.settings(PDF_POOL_ENABLED=False, EXTRACTION_MEMO_SIZE=8))
+        self.enterContext(mock.patch.object(pdf_pool, '_results', None))
+        self.extract = self.enterContext(
+            mock.patch.object(pdf_pool, 'extract_in_pool', wraps=pdf_pool.extract_in_pool))
+
+    def test_same_upload_is_extracted_once(self):
+        data = make_registration_pdf(['ENV 633', 'JED 540'])
+        first, cached = pdf_pool.extract_cached(data)
+        self.assertFalse(cached)
+        self.assertLessEqual({'ENV 633', 'JED 540'}, first.codes)
+
+        again, cached = pdf_pool.extract_cached(bytes(data))
+        self.assertTrue(cached)
+        self.assertIs(again, first)
+        self.assertEqual(self.extract.call_count, 1)
+
+        other, cached = pdf_pool.extract_cached(make_registration_pdf(['ENV 633'], seed=1))
+        self.assertFalse(cached)
+        self.assertEqual(self.extract.call_count, 2)
+        self.assertEqual(pdf_pool.result_memo().stats()['hits'], 1)
+
+    def test_failures_are_not_memoized(self):
+        for _ in range(2):
+            with self.assertRaises(ExtractionError):
+                pdf_pool.extract_cached(b'not a pdf')
+        self.assertEqual(self.extract.call_count, 2)
+        self.assertEqual(len(pdf_pool.result_memo()), 0)
+
+
+def pages_pdf(*texts):
+    """A PDF with one line of text per page."""
+    from reportlab.pdfgen import canvas
+
+    out = io.BytesIO()
+    pdf = canvas.Canvas(out)
+    for text in texts:
+        pdf.drawString(72, 720, text)
+        pdf.showPage()
+    pdf.save()
+    return out.getvalue()
+
+
+class ExtractionTests(TestCase):
+    def setUp(self):
+        self.slip = make_registration_pdf(['ENV 633', 'JED 540'])
+        self.calls = []
+
+    def strategy(self, name, codes=(), error=None):
+        def run(data, max_pages):
+            self.calls.append(name)
+            if error:
+                raise error
+            return set(codes), list(codes), 1
+        return name, run
+
+    def extract(self, data, strategies=STRATEGIES, max_pages=10, max_bytes=1024 * 1024):
+        return extract_course_codes(data, max_pages=max_pages, max_bytes=max_bytes, strategies=strategies)
+
+    def test_cheapest_strategy_first(self):
+        self.assertEqual([name for name, _ in STRATEGIES], ['pdfium_text', 'plumber_text', 'plumber_table'])
+        result = self.extract(self.slip)
+        self.assertEqual(result.strategy, 'pdfium_text')
+        self.assertLessEqual({'ENV 633', 'JED 540'}, result.codes)
+        # The table strategy reads only the course code column
+        self.assertEqual(plumber_table(self.slip, 10)[0], {'ENV 633', 'JED 540'})
+
+    def test_falls_back_when_a_strategy_finds_nothing(self):
+        strategies = [self.strategy('empty'), self.strategy('broken', error=ValueError('bad xref')),
+                      ('plumber_table', plumber_table), self.strategy('unused', ['ACT 404'])]
+        result = self.extract(self.slip, strategies)
+        self.assertEqual(self.calls, ['empty', 'broken'])
+        self.assertEqual((result.strategy, result.codes), ('plumber_table', {'ENV 633', 'JED 540'}))
+
+    def test_nothing_found_is_an_empty_result(self):
+        result = self.extract(self.slip, [self.strategy('empty'), self.strategy('also_empty')])
+        self.assertEqual((result.codes, result.strategy), (set(), None))
+
+    def test_every_strategy_failing_raises(self):
+        with self.assertRaisesMessage(ExtractionError, 'pdfium_text: '):
+            self.extract(b'not a pdf')
+
+    def test_oversized_upload_is_rejected_before_any_strategy(self):
+        strategies = [self.strategy('pdfium_text', ['ENV 633'])]
+        with self.assertRaisesMessage(ExtractionError, 'too large'):
+            self.extract(self.slip, strategies, max_bytes=len(self.slip) - 1)
+        self.assertEqual(self.calls, [])
+
+    def test_resource_limits_stop_the_chain(self):
+        strategies = [self.strategy('slow', error=ExtractionError('The PDF took too long to process.')),
+                      self.strategy('unused', ['ACT 404'])]
+        with self.assertRaisesMessage(ExtractionError, 'too long'):
+            self.extract(self.slip, strategies)
+        self.assertEqual(self.calls, ['slow'])
+
+    def test_pages_past_the_cap_are_not_read(self):
+        data = pages_pdf('Course: ENV 633', 'Course: JED 540', 'Course: ACT 404')
+        for name, strategy in STRATEGIES[:2]:
+            with self.subTest(name):
+                result = self.extract(data, [(name, strategy)], max_pages=2)
+                self.assertEqual((result.codes, result.pages), ({'ENV 633', 'JED 540'}, 2))
+
+
+class DiffSnapshot:
+    """Stands in for a tracemalloc snapshot whose diff is ``{(file, line): bytes}``."""
+
+    def __init__(self, growth):
+        self.growth = growth
+
+    def compare_to(self, before, key_type):
+        return [SimpleNamespace(size_diff=size, count_diff=1,
+                                traceback=[SimpleNamespace(filename=filename, lineno=lineno)])
+                for (filename, lineno), size in self.growth.items()]
+
+
+class MemoryProfileTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        files = WorkerFiles('MEMORY_PROFILE_DIR', memprofile._merge)
+        self.addCleanup(lambda: files._fd is not None and os.close(files._fd))
+        self.enterContext(mock.patch.object(memprofile, '_files', files))
+        self.enterContext(mock.patch.dict(memprofile._endpoints, clear=True))
+        self.enterContext(mock.patch.dict(memprofile._streaks, clear=True))
+        self.enterContext(self.settings(MEMORY_PROFILE_STREAK=3, MEMORY_PROFILE_FRAMES=1))
+
+    def test_only_sustained_growth_is_reported(self):
+        leak, noise = ('views.py', 10), ('cache.py', 20)
+        for growth in [{leak: 1024, noise: 4096}, {leak: 1024}, {leak: 1024, noise: 4096},
+                       {leak: 1024}, {noise: 4096}]:
+            memprofile.record('student_dashboard', None, DiffSnapshot(growth))
+
+        report = memprofile.report()['endpoints']['student_dashboard']
+        self.assertEqual(report['profiled_requests'], 5)
+        # The first two requests of the streak count once it reaches three
+        self.assertEqual(report['retained_kb'], 4.0)
+        self.assertEqual(report['top_sites'], [
+            {'site': 'views.py:10', 'retained_kb': 4.0, 'blocks': 4, 'grew_on': 0.8},
+        ])
 
-# Create your tests here.
+    def test_a_break_starts_the_streak_over(self):
+        site = ('views.py', 10)
+        for growth in [{site: 1024}, {site: 1024}, {}, {site: 1024}, {site: 1024}]:
+            memprofile.record('api_schedule', None, DiffSnapshot(growth))
+        self.assertEqual(memprofile.report()['endpoints']['api_schedule']['top_sites'], [])
@@ -1,7 +1,7 @@
 # core/urls.py
 from django.urls import path
 from django.shortcuts import redirect
-from .views import AdminDashboardView, StudentDashboardView, SignupView, UserProfileView, download_timetable_pdf, download_timetable_jpg, delete_timetable_source, reuse_course_registration
+from .views import AdminDashboardView, StudentDashboardView, SignupView, UserProfileView, download_timetable_pdf, download_timetable_jpg, delete_timetable_source, reuse_course_registration, extraction_stats, stage_metrics, memory_profile, generate_cohort_timetables, api_schedule
 
 
 def home_redirect(request):
@@ -29,4 +29,14 @@ urlpatterns = [
     # --- ADDED: URL for reusing course registration ---
     path('reuse-registration/<int:history_id>/', reuse_course_registration,
          name='reuse_course_registration'),
+    path('dashboard/admin/extraction-stats/', extraction_stats,
+         name='extraction_stats'),
+    path('dashboard/admin/metrics/', stage_metrics,
+         name='stage_metrics'),
+    path('dashboard/admin/memory-profile/', memory_profile,
+         name='memory_profile'),
+    path('dashboard/admin/cohort/', generate_cohort_timetables,
+         name='generate_cohort_timetables'),
+    # --- ADDED: JSON schedule API ---
+    path('api/schedule/', api_schedule, name='api_schedule'),
 ]
@@ -1,36 +1,38 @@
 # core/views.py
+import os
 import re
 import json
 from io import BytesIO
 from datetime import time as dt_time, datetime
 
-import pdfplumber
+from django.conf import settings
 from django.core.cache import cache
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect
-from django.template.loader import get_template
 from django.views import View
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_GET
 from django.contrib import messages
-from django.contrib.auth.decorators import login_required
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.views import LoginView
 from django.urls import reverse_lazy
+from django.utils.http import parse_etags
 from django.db import transaction
-from xhtml2pdf import pisa
-from PIL import Image, ImageDraw, ImageFont
 import base64
 
 from .forms import TimetableSourceForm, CustomUserCreationForm, UserProfileForm
-from .models import TimetableSource, TimetableEvent, CourseRegistrationHistory
-
-# Simple class to convert dictionary to object for template access
-
-
-class EventObject:
-    def __init__(self, event_dict):
-        for key, value in event_dict.items():
-            setattr(self, key, value)
-
+from .models import User, TimetableSource, TimetableEvent, CourseRegistrationHistory
+from .parsing import parse_time_range, parse_course_string, normalize_course_code
+from .ingest import ingest_master_timetable
+from .extraction import ExtractionError
+from .pdf_pool import PoolBusy, extract_cached, result_memo
+from .jobs import enqueue_ingest, has_pending_ingest
+from .schedule import COMPACT_FIELDS, DAYS_OF_WEEK, schedule_as_json
+from . import artifacts, memprofile, metrics, rendering, snapshots
+from .metrics import stage
+from .cohort import CohortError, CohortJob, items_from_csv, items_from_pdfs, safe_filename
 
 # Custom Login View that redirects authenticated users
 class CustomLoginView(LoginView):
@@ -85,96 +87,20 @@ class UserProfileView(LoginRequiredMixin, View):
             return redirect('profile')
         return render(request, self.template_name, {'form': form})
 
-# --- HELPER 1: For parsing time like "7:00a - 9:55a" ---
-
-
-def parse_time_range(time_str):
-    try:
-        start_str, end_str = time_str.split(' - ')
-
-        # Handle both "7:00a" and "7:00AM" formats
-        # Convert single letter suffixes to full AM/PM
-        if start_str.endswith('a'):
-            start_str = start_str[:-1] + 'AM'
-        elif start_str.endswith('p'):
-            start_str = start_str[:-1] + 'PM'
-
-        if end_str.endswith('a'):
-            end_str = end_str[:-1] + 'AM'
-        elif end_str.endswith('p'):
-            end_str = end_str[:-1] + 'PM'
-
-        start_time = datetime.strptime(start_str, '%I:%M%p').time()
-        end_time = datetime.strptime(end_str, '%I:%M%p').time()
-        return start_time, end_time
-    except (ValueError, AttributeError):
-        return None, None
-
-# --- HELPER 2 (FIXED): Robust parser for course strings ---
-
-
-def parse_course_string(course_str):
-    """
-    Finds a course code like 'ACT 404' or 'ENV324' within a larger string,
-    and returns the display version, a normalized version, and the details.
-    """
-    # This regex finds "3-4 letters, optional space, 3 digits"
-    # Made more flexible to handle various formats
-    match = re.search(r'([A-Z]{3,4})\s?(\d{3})', course_str.upper())
-    if match:
-        dept_code = match.group(1)  # e.g., "ACT"
-        course_num = match.group(2)  # e.g., "404"
-
-        # Create both display and normalized versions
-        display_code = f"{dept_code} {course_num}"  # e.g., "ACT 404"
-        normalized_code = f"{dept_code} {course_num}"  # e.g., "ACT404"
-
-        # Extract details (everything after the course code)
-        details = course_str[match.end():].strip()  # e.g., "Lec 1"
-
-        return display_code, normalized_code, details
-
-    # Fallback if no standard code is found
-    return course_str, course_str.replace(' ', ''), ''
-
-# --- HELPER 3 (NEW): Normalize course codes consistently ---
-
-
-def normalize_course_code(code_str):
-    """
-    Normalizes course codes to a consistent format for matching.
-    Handles various input formats like 'ACT 404', 'ACT404', 'act 404', etc.
-    """
-    if not code_str:
-        return ""
-
-    # Clean the string
-    clean_code = code_str.strip().upper()
-
-    # Try to match the pattern
-    match = re.search(r'([A-Z]{3,4})\s?(\d{3})', clean_code)
-    if match:
-        dept_code = match.group(1)
-        course_num = match.group(2)
-        return f"{dept_code} {course_num}"  # Always return without spaces
-
-    # If no match, return the cleaned version
-    return clean_code.replace(' ', '')
-
 # --- UPDATED: The JSON parser now uses the improved helpers ---
 
 
-def parse_and_store_master_timetable(source):
-    """Parses a master timetable JSON and stores events in database."""
+def parse_and_store_master_timetable(source, force=False):
+    """Parses a master timetable JSON or PDF and stores events in database."""
     try:
         # Check if already parsed
-        if source.events_parsed and source.events.exists():
+        if not force and source.events_parsed and source.events.exists():
             print(f"Source {source.id} already parsed, skipping...")
             return True
 
         # Check if the file exists before trying to open it
         if not source.source_json or not source.source_json.path:
-            print(f"Error: No JSON file associated with source {source.id}")
+            print(f"Error: No master file associated with source {source.id}")
             source.status = TimetableSource.FAILED
             source.save()
             return False
@@ -183,49 +109,15 @@ def parse_and_store_master_timetable(source):
         import os
         if not os.path.exists(source.source_json.path):
             print(
-                f"Error: JSON file not found at {source.source_json.path} for source {source.id}")
+                f"Error: Master file not found at {source.source_json.path} for source {source.id}")
             source.status = TimetableSource.FAILED
             source.save()
             return False
 
-        with transaction.atomic():
-            # Clear existing events for this source
-            source.events.all().delete()
-
-            with open(source.source_json.path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                events_created = 0
-
-                for item in data:
-                    start_time, end_time = parse_time_range(item.get("Time"))
-                    display_code, normalized_code, details = parse_course_string(
-                        item.get("Course", ""))
-
-                    if not all([start_time, end_time, display_code]):
-                        continue
-
-                    TimetableEvent.objects.create(
-                        source=source,
-                        day=item.get("Day", "").title(),
-                        start_time=start_time,
-                        end_time=end_time,
-                        location=item.get("Venue", ""),
-                        course_code=display_code,
-                        normalized_code=normalized_code,
-                        details=details,
-                        lecturer=item.get("Instructor(s)", ""),
-                    )
-                    events_created += 1
-
-                # Update source status
-                source.status = TimetableSource.COMPLETED
-                source.events_parsed = True
-                source.total_events = events_created
-                source.save()
-
-                print(
-                    f"Successfully parsed and stored {events_created} events for source {source.id}")
-                return True
+        stats = ingest_master_timetable(source)
+        print(
+            f"Successfully parsed and stored events for source {source.id}: {stats}")
+        return True
 
     except Exception as e:
         print(f"Error parsing master timetable for source {source.id}: {e}")
@@ -263,57 +155,47 @@ def parse_master_timetable(source):
 
     return events
 
-# get_master_schedule_data uses the cache for performance
+# get_schedule_index serves the shared compiled snapshot for performance
 
 
-def get_master_schedule_data(source_id):
-    """Retrieves master schedule, using cache or database storage with improved fallback."""
-    cache_key = f'master_schedule_{source_id}'
-    cached_data = cache.get(cache_key)
-    if cached_data:
-        return cached_data
-
+def get_schedule_index(source_id):
+    """Retrieves the compiled schedule Snapshot for a source, or None if unavailable."""
     try:
-        source = TimetableSource.objects.get(id=source_id)
-
-        # Try to get from database first (faster than parsing JSON)
-        if source.events_parsed and source.events.exists():
-            schedule_data = []
-            for event in source.events.all():
-                schedule_data.append({
-                    'day': event.day,
-                    'start_time': event.start_time,
-                    'end_time': event.end_time,
-                    'location': event.location,
-                    'course_code': event.course_code,
-                    'normalized_code': event.normalized_code,
-                    'details': event.details,
-                    'lecturer': event.lecturer,
-                })
-
-            # Cache for 24 hours (extended from 1 hour)
-            if schedule_data:
-                cache.set(cache_key, schedule_data, 86400)
-            return schedule_data
+        snapshot = snapshots.current(source_id)
+        if snapshot is not None:
+            return snapshot
 
-        # If not in database, parse and store
-        if parse_and_store_master_timetable(source):
-            # Recursive call to get from database
-            return get_master_schedule_data(source_id)
+        source = TimetableSource.objects.get(id=source_id)
 
-        # Final fallback - try legacy parsing
-        schedule_data = parse_master_timetable(source)
-        if schedule_data:
-            cache.set(cache_key, schedule_data, 86400)  # Cache for 24 hours
-        return schedule_data
+        def build():
+            # Runs once per host for a cold source; concurrent requests get
+            # the previous version or wait for this one
+            source.refresh_from_db()
+            if source.events_parsed and source.events.exists():
+                return source.schedule_version, snapshots.load_event_records(source)
+            # Uploads are parsed by the ingest worker; don't race it here
+            if has_pending_ingest(source):
+                print(f"Source {source_id} is still queued for ingest")
+                return None
+            # If not in database, parse and store (ingest publishes it)
+            parse_and_store_master_timetable(source)
+            return None
+
+        return snapshots.get_or_build(source.id, build)
 
     except TimetableSource.DoesNotExist:
         print(f"Error: TimetableSource with id {source_id} does not exist")
-        return []
+        return None
     except Exception as e:
         print(
             f"Error retrieving master schedule data for source {source_id}: {e}")
-        return []
+        return None
+
+
+def get_master_schedule_data(source_id):
+    """Retrieves the flat list of master schedule events for a source."""
+    index = get_schedule_index(source_id)
+    return index.events if index else []
 
 # AdminDashboardView has no major changes
 
@@ -322,7 +204,11 @@ class AdminDashboardView(LoginRequiredMixin, View):
     def get(self, request):
         form = TimetableSourceForm()
         timetables = TimetableSource.objects.all().order_by('-created_at')
-        return render(request, 'core/admin_dashboard.html', {'form': form, 'timetables': timetables})
+        return render(request, 'core/admin_dashboard.html', {
+            'form': form,
+            'timetables': timetables,
+            'can_generate_cohorts': can_generate_cohorts(request.user),
+        })
 
     def post(self, request):
         form = TimetableSourceForm(request.POST, request.FILES)
@@ -331,22 +217,24 @@ class AdminDashboardView(LoginRequiredMixin, View):
             timetable_source.uploader = request.user
             timetable_source.save()
 
-            # Parse and store events immediately after upload
+            # Queue the parse for the ingest worker instead of doing it
+            # inside the request
             try:
-                if parse_and_store_master_timetable(timetable_source):
-                    messages.success(
-                        request, f"'{timetable_source.display_name}' has been uploaded and processed successfully. {timetable_source.total_events} events stored.")
-                else:
-                    messages.warning(
-                        request, f"'{timetable_source.display_name}' was uploaded but failed to process. Please check the JSON format.")
+                enqueue_ingest(timetable_source)
+                messages.success(
+                    request, f"'{timetable_source.display_name}' has been uploaded and queued for processing.")
             except Exception as e:
                 messages.error(
-                    request, f"'{timetable_source.display_name}' was uploaded but processing failed: {str(e)}")
+                    request, f"'{timetable_source.display_name}' was uploaded but could not be queued: {str(e)}")
 
             return redirect('admin_dashboard')
 
         timetables = TimetableSource.objects.all().order_by('-created_at')
-        return render(request, 'core/admin_dashboard.html', {'form': form, 'timetables': timetables})
+        return render(request, 'core/admin_dashboard.html', {
+            'form': form,
+            'timetables': timetables,
+            'can_generate_cohorts': can_generate_cohorts(request.user),
+        })
 
 
 @login_required
@@ -358,9 +246,9 @@ def delete_timetable_source(request, source_id):
                 id=source_id, uploader=request.user)
             source_name = source.display_name
 
-            # Clear cache for this source
-            cache_key = f'master_schedule_{source_id}'
-            cache.delete(cache_key)
+            # Remove the compiled snapshots and cached renders for this source
+            snapshots.drop(source_id)
+            artifacts.drop(source_id)
 
             # Delete the source (this will cascade delete events)
             source.delete()
@@ -445,93 +333,74 @@ class StudentDashboardView(LoginRequiredMixin, View):
                 request, 'Please select a timetable and upload your file.')
             return render(request, 'core/student_dashboard.html', {'sources': sources})
 
-        student_course_codes = set()
-        raw_extracted_codes = []  # For debugging
-
         try:
-            with pdfplumber.open(course_reg_pdf) as pdf:
-                for page in pdf.pages:
-                    # Try table extraction first
-                    table = page.extract_table()
-                    if table:
-                        for row in table[1:]:  # Skip header
-                            if row and len(row) > 1 and row[1]:
-                                course_code = row[1].strip()
-                                raw_extracted_codes.append(course_code)
-                                normalized = normalize_course_code(course_code)
-                                if normalized:
-                                    student_course_codes.add(normalized)
-
-                    # Also try text extraction as backup
-                    text = page.extract_text()
-                    if text:
-                        # Find course codes in text using regex
-                        course_matches = re.findall(
-                            r'([A-Z]{3,4})\s?(\d{3})', text.upper())
-                        for match in course_matches:
-                            course_code = f"{match[0]} {match[1]}"
-                            raw_extracted_codes.append(course_code)
-                            normalized = normalize_course_code(course_code)
-                            if normalized:
-                                student_course_codes.add(normalized)
-
+            if course_reg_pdf.size > settings.REGISTRATION_PDF_MAX_BYTES:
+                raise ExtractionError(
+                    f"The file is too large (limit {settings.REGISTRATION_PDF_MAX_BYTES // 1024} KB).")
+            with stage('extract'):
+                extraction, cached = extract_cached(course_reg_pdf.read())
+        except PoolBusy:
+            messages.error(
+                request, 'The server is busy processing other uploads. Please try again in a few seconds.')
+            response = render(request, 'core/student_dashboard.html', {'sources': sources}, status=503)
+            response['Retry-After'] = str(settings.PDF_POOL_RETRY_AFTER)
+            return response
         except Exception as e:
             messages.error(request, f'Could not process your PDF. Error: {e}')
             return render(request, 'core/student_dashboard.html', {'sources': sources})
 
+        student_course_codes = extraction.codes
+        raw_extracted_codes = extraction.raw_codes  # For debugging
+        print(
+            f"Registration PDF: {len(student_course_codes)} codes via {extraction.strategy} ({extraction.pages} pages)"
+            f"{' (cached)' if cached else ''}")
+
         if not student_course_codes:
             messages.warning(
                 request, 'No course codes found in your PDF. Please check if the file contains a valid course registration.')
             return render(request, 'core/student_dashboard.html', {'sources': sources})
 
-        master_schedule = get_master_schedule_data(source_id)
+        with stage('schedule_load'):
+            schedule_index = get_schedule_index(source_id)
 
         # Check if master schedule data is available
-        if not master_schedule:
+        if not schedule_index:
             messages.error(
                 request, 'The selected timetable source is not available or the file is missing. Please contact the administrator or try a different timetable source.')
             return render(request, 'core/student_dashboard.html', {'sources': sources})
 
-        # Filter matching events
-        student_events = []
-        for event in master_schedule:
-            event_code = event.get('normalized_code')
-            if event_code in student_course_codes:
-                student_events.append(event)
-
-        days_of_week = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
-        # Sort events by start time within each day
-        schedule = {
-            day: sorted([e for e in student_events if e['day']
-                        == day], key=lambda x: x['start_time'])
-            for day in days_of_week
-        }
+        # Matching events, grouped by day and sorted by start time
+        with stage('filter'):
+            schedule = schedule_index.schedule_for(student_course_codes)
 
         # Save course registration history for reuse
-        try:
-            source = TimetableSource.objects.get(id=source_id)
-            save_course_registration_history(
-                user=request.user,
-                source=source,
-                course_codes=list(student_course_codes),
-                program=program or None,
-                level=level or None
-            )
-        except Exception as e:
-            print(f"Error saving history: {e}")
+        with stage('history_save'):
+            try:
+                source = TimetableSource.objects.get(id=source_id)
+                save_course_registration_history(
+                    user=request.user,
+                    source=source,
+                    course_codes=list(student_course_codes),
+                    program=program or None,
+                    level=level or None
+                )
+            except Exception as e:
+                print(f"Error saving history: {e}")
 
-        # Get updated history for display
-        history = CourseRegistrationHistory.objects.filter(
-            user=request.user).order_by('-last_used')[:5]
+            # Get updated history for display
+            history = CourseRegistrationHistory.objects.filter(
+                user=request.user).order_by('-last_used')[:5]
 
-        return render(request, 'core/student_dashboard.html', {
-            'sources': sources,
-            'schedule': schedule,
-            'processed_codes': list(student_course_codes),
-            'raw_codes': raw_extracted_codes,  # For debugging
-            'selected_source_id': int(source_id),
-            'history': history
-        })
+        with stage('template_render'):
+            return render(request, 'core/student_dashboard.html', {
+                'sources': sources,
+                'schedule': schedule,
+                'processed_codes': list(student_course_codes),
+                'raw_codes': raw_extracted_codes,  # For debugging
+                'extraction_strategy': extraction.strategy,
+                'selected_source_id': int(source_id),
+                'history': history
+            })
 
 
 @login_required
@@ -547,26 +416,14 @@ def reuse_course_registration(request, history_id):
         history.save()
 
         # Get master schedule data
-        master_schedule = get_master_schedule_data(history.source.id)
+        schedule_index = get_schedule_index(history.source_id)
 
-        if not master_schedule:
+        if not schedule_index:
             messages.error(
                 request, 'The timetable source is no longer available.')
             return redirect('student_dashboard')
 
-        # Filter matching events
-        student_events = []
-        for event in master_schedule:
-            event_code = event.get('normalized_code')
-            if event_code in course_codes:
-                student_events.append(event)
-
-        days_of_week = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
-        schedule = {
-            day: sorted([e for e in student_events if e['day']
-                        == day], key=lambda x: x['start_time'])
-            for day in days_of_week
-        }
+        schedule = schedule_index.schedule_for(course_codes)
 
         sources = TimetableSource.objects.all().order_by('-created_at')
         history_list = CourseRegistrationHistory.objects.filter(
@@ -594,6 +451,65 @@ def reuse_course_registration(request, history_id):
 # --- UPDATED: download_timetable_pdf with consistent normalization ---
 
 
+@staff_member_required
+def extraction_stats(request):
+    """Hit/miss counters of this worker's registration PDF extraction memo."""
+    stats = result_memo().stats()
+    stats['pid'] = os.getpid()
+    return JsonResponse(stats)
+
+
+@staff_member_required
+def stage_metrics(request):
+    """Stage timing histograms of all workers, in Prometheus text format; POST clears them."""
+    if request.method == 'POST':
+        metrics.reset()
+        return JsonResponse({'success': True, 'message': 'Stage metrics cleared.'})
+    return HttpResponse(metrics.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@staff_member_required
+def memory_profile(request):
+    """
+    Top allocation sites still alive after requests, by endpoint, counting
+    only growth sustained over MEMORY_PROFILE_STREAK profiled requests in a
+    row; POST clears them.
+    """
+    if request.method == 'POST':
+        memprofile.reset()
+        return JsonResponse({'success': True, 'message': 'Memory profile cleared.'})
+    report = memprofile.report()
+    report['enabled'] = settings.MEMORY_PROFILE_ENABLED
+    return JsonResponse(report, json_dumps_params={'indent': 2})
+
+
+# --- HELPERS: cached downloads ---
+def etag_matches(request, key):
+    if_none_match = request.headers.get('If-None-Match')
+    if not if_none_match:
+        return False
+    # Weak comparison, as for any If-None-Match: gzip turns ETags weak
+    etags = [etag.removeprefix('W/') for etag in parse_etags(if_none_match)]
+    return '*' in etags or artifacts.etag_for(key) in etags
+
+
+def not_modified(key):
+    response = HttpResponseNotModified()
+    response['ETag'] = artifacts.etag_for(key)
+    return response
+
+
+def artifact_response(data, content_type, filename, key=None):
+    response = HttpResponse(data, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    if key:
+        response['ETag'] = artifacts.etag_for(key)
+        # Private to the student, but always revalidated so a new
+        # timetable version is picked up
+        response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
 @login_required
 def download_timetable_pdf(request):
     source_id = request.GET.get('source_id')
@@ -605,258 +521,213 @@ def download_timetable_pdf(request):
     if not source_id or not course_codes:
         return HttpResponse("Invalid request.", status=400)
 
-    master_schedule = get_master_schedule_data(source_id)
-    student_events = [e for e in master_schedule if e.get(
-        'normalized_code') in course_codes]
+    schedule_index = get_schedule_index(source_id)
 
     try:
         source = TimetableSource.objects.get(id=source_id)
     except TimetableSource.DoesNotExist:
         return HttpResponse("Timetable source not found.", status=404)
 
-    days_of_week = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+    days_of_week = DAYS_OF_WEEK
 
-    # Convert event dictionaries to objects for template access
-    event_objects = [EventObject(e) for e in student_events]
-    schedule = {day: sorted([e for e in event_objects if e.day == day],
-                            key=lambda x: x.start_time) for day in days_of_week}
+    schedule = schedule_index.schedule_for(
+        course_codes) if schedule_index else {day: [] for day in days_of_week}
 
-    # Select template based on user choice
-    template_map = {
-        'modern': 'core/timetable_pdf_modern.html',
-        'minimal': 'core/timetable_pdf_minimal.html',
-        'neon': 'core/timetable_pdf_neon.html',
-        'grid': 'core/timetable_pdf_grid.html'
-    }
+    if template_type not in rendering.TEMPLATES:
+        template_type = rendering.DEFAULT_TEMPLATE
+    renderer = settings.PDF_RENDERER
 
-    template_path = template_map.get(
-        template_type, 'core/timetable_pdf_modern.html')
-    template = get_template(template_path)
-    html = template.render(
-        {'schedule': schedule, 'days_of_week': days_of_week, 'source_name': source.display_name, 'template_type': template_type})
+    # Identical downloads are served from the render cache (or 304)
+    key = None
+    if schedule_index:
+        key = rendering.cache_key(
+            source, schedule_index.version, 'pdf', template_type, course_codes)
+        if etag_matches(request, key):
+            return not_modified(key)
+        cached = artifacts.get(key)
+        if cached is not None:
+            return artifact_response(cached, 'application/pdf', 'my_timetable.pdf', key)
 
-    result = BytesIO()
-    pdf = pisa.pisaDocument(BytesIO(html.encode("UTF-8")), result)
-    if not pdf.err:
-        response = HttpResponse(
-            result.getvalue(), content_type='application/pdf')
-        response['Content-Disposition'] = 'attachment; filename="my_timetable.pdf"'
-        return response
+    try:
+        with stage('render_pdf'):
+            data, produced_by = rendering.render_timetable_pdf(
+                schedule, days_of_week, source.display_name, template_type, renderer)
+    except rendering.RenderError:
+        return HttpResponse("Error Generating PDF", status=500)
 
-    return HttpResponse("Error Generating PDF", status=500)
+    if produced_by != renderer:
+        # Fallback output must not be cached or tagged as the primary render
+        key = None
+    if key:
+        artifacts.put(key, data)
+    return artifact_response(data, 'application/pdf', 'my_timetable.pdf', key)
 
 
 @login_required
 def download_timetable_jpg(request):
-    """Generate and download timetable as JPG image"""
+    """Generate and download timetable as an image (JPG by default, or ?format=webp/png)"""
     source_id = request.GET.get('source_id')
     course_codes_str = request.GET.get('codes', '')
-    template_type = request.GET.get('template', 'modern')
+    fmt = request.GET.get('format', 'jpg').lower()
     course_codes = [normalize_course_code(
         code) for code in course_codes_str.split(',') if code.strip()]
 
-    if not source_id or not course_codes:
+    if not source_id or not course_codes or fmt not in rendering.IMAGE_FORMATS:
         return HttpResponse("Invalid request.", status=400)
 
-    master_schedule = get_master_schedule_data(source_id)
+    schedule_index = get_schedule_index(source_id)
 
     # Check if master schedule data is available
-    if not master_schedule:
+    if not schedule_index:
         return HttpResponse("No timetable data available for the selected source.", status=404)
 
-    student_events = [e for e in master_schedule if e.get(
-        'normalized_code') in course_codes]
+    schedule = schedule_index.schedule_for(course_codes)
 
-    # Debug: Check if we have any matching events
-    if not student_events:
-        return HttpResponse(f"No matching courses found. Available courses: {[e.get('normalized_code', 'N/A') for e in master_schedule[:5]]}", status=404)
+    if not any(schedule.values()):
+        return HttpResponse(f"No matching courses found. Available courses: {schedule_index.codes()[:5]}", status=404)
 
     try:
         source = TimetableSource.objects.get(id=source_id)
     except TimetableSource.DoesNotExist:
         return HttpResponse("Timetable source not found.", status=404)
 
-    # Create image using PIL - Minimal-inspired design
-    img_width, img_height = 1400, 900
-    # Light background like minimal
-    img = Image.new('RGB', (img_width, img_height), color='#fafafa')
-    draw = ImageDraw.Draw(img)
+    _, content_type, extension = rendering.IMAGE_FORMATS[fmt]
+    filename = f'my_timetable_minimal.{extension}'
+    key = rendering.cache_key(source, schedule_index.version, fmt, 'minimal', course_codes)
+    if etag_matches(request, key):
+        return not_modified(key)
+    cached = artifacts.get(key)
+    if cached is not None:
+        return artifact_response(cached, content_type, filename, key)
+
+    # Pillow is only loaded by workers that actually draw an image
+    from .rendering import image
+    with stage('render_image'):
+        data = image.render_timetable_image(schedule, source.display_name, fmt)
+    artifacts.put(key, data)
+
+    return artifact_response(data, content_type, filename, key)
+
+
+# --- ADDED: bulk timetables for a cohort ---
+def can_generate_cohorts(user):
+    """Course advisors: staff accounts and teacher/staff roles."""
+    return user.is_authenticated and (
+        user.is_staff or user.role in (User.TEACHER, User.STAFF))
+
+
+@login_required
+@user_passes_test(can_generate_cohorts)
+def generate_cohort_timetables(request):
+    """
+    Renders timetables for many students of one source (a CSV of student
+    codes and/or a batch of registration PDFs) and streams back a ZIP.
+    """
+    if request.method != 'POST':
+        return redirect('admin_dashboard')
+
+    source_id = request.POST.get('timetable_source')
+    template_type = request.POST.get('template', 'modern')
+    fmt = request.POST.get('format', 'pdf').lower()
+    cohort_csv = request.FILES.get('cohort_csv')
+    registration_pdfs = request.FILES.getlist('registration_pdfs')
+
+    if not source_id or not (cohort_csv or registration_pdfs):
+        messages.error(request, 'Please select a timetable and upload a CSV or registration PDFs.')
+        return redirect('admin_dashboard')
+    if len(registration_pdfs) > settings.COHORT_MAX_STUDENTS:
+        messages.error(request, f'At most {settings.COHORT_MAX_STUDENTS} students per batch.')
+        return redirect('admin_dashboard')
+
+    try:
+        source = TimetableSource.objects.get(id=source_id)
+    except TimetableSource.DoesNotExist:
+        messages.error(request, 'Timetable source not found.')
+        return redirect('admin_dashboard')
+
+    schedule_index = get_schedule_index(source_id)
+    if not schedule_index:
+        messages.error(request, 'The selected timetable source is not available yet.')
+        return redirect('admin_dashboard')
 
     try:
-        # Try to use a better font with larger sizes for better readability
-        title_font = ImageFont.truetype("arial.ttf", 32)
-        subtitle_font = ImageFont.truetype("arial.ttf", 18)
-        header_font = ImageFont.truetype("arial.ttf", 16)
-        text_font = ImageFont.truetype("arial.ttf", 14)  # Increased from 11
-        small_font = ImageFont.truetype("arial.ttf", 12)  # Increased from 9
-    except:
-        # Fallback to default font
-        title_font = ImageFont.load_default()
-        subtitle_font = ImageFont.load_default()
-        header_font = ImageFont.load_default()
-        text_font = ImageFont.load_default()
-        small_font = ImageFont.load_default()
-
-    # Draw header section with minimal-inspired styling
-    header_height = 80
-
-    # Draw header background
-    draw.rectangle([0, 0, img_width, header_height],
-                   fill='white', outline='#ddd')
-
-    # Draw title
-    title = "My Timetable"
-    title_bbox = draw.textbbox((0, 0), title, font=title_font)
-    title_width = title_bbox[2] - title_bbox[0]
-    draw.text(((img_width - title_width) // 2, 15),
-              title, fill='#333', font=title_font)
-
-    # Draw subtitle
-    subtitle = f"{source.display_name} - Generated by ChronoParse AI"
-    subtitle_bbox = draw.textbbox((0, 0), subtitle, font=subtitle_font)
-    subtitle_width = subtitle_bbox[2] - subtitle_bbox[0]
-    draw.text(((img_width - subtitle_width) // 2, 50),
-              subtitle, fill='#666', font=subtitle_font)
-
-    # Draw table with day-based row layout (like grid template)
-    days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
-
-    cell_height = 140  # Further increased height for larger event cards
-    start_x, start_y = 30, header_height + 20
-    day_col_width = 120
-    events_col_width = img_width - day_col_width - 60  # Rest of width for events
-
-    # Draw main table border
-    table_width = day_col_width + events_col_width
-    table_height = len(days) * cell_height + 40
-    draw.rectangle([start_x, start_y, start_x + table_width, start_y + table_height],
-                   outline='#ddd', fill='white')
-
-    # Draw "Day" header
-    draw.rectangle([start_x, start_y, start_x + day_col_width, start_y + 40],
-                   outline='#ddd', fill='#e9ecef')
-    draw.text((start_x + 35, start_y + 12), "Day",
-              fill='#333', font=header_font)
-
-    # Draw "Classes" header
-    events_x = start_x + day_col_width
-    draw.rectangle([events_x, start_y, events_x + events_col_width, start_y + 40],
-                   outline='#ddd', fill='#e9ecef')
-    classes_text = "Classes"
-    classes_bbox = draw.textbbox((0, 0), classes_text, font=header_font)
-    classes_width = classes_bbox[2] - classes_bbox[0]
-    draw.text((events_x + (events_col_width - classes_width) // 2, start_y + 12),
-              classes_text, fill='#333', font=header_font)
-
-    # Draw day rows and events with minimal-inspired styling
-    days_of_week = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
-    event_objects = [EventObject(e) for e in student_events]
-    schedule = {day: sorted([e for e in event_objects if e.day == day],
-                            key=lambda x: x.start_time) for day in days_of_week}
-
-    # Debug: Print schedule info
-    print(f"JPG Generation - Total events: {len(event_objects)}")
-    for day, events in schedule.items():
-        print(f"{day}: {len(events)} events")
-        for event in events:
-            print(
-                f"  - {event.course_code} at {event.start_time.hour}:{event.start_time.minute:02d}")
-
-    for day_idx, day in enumerate(days):
-        y = start_y + 40 + day_idx * cell_height
-
-        # Draw day header
-        draw.rectangle([start_x, y, start_x + day_col_width, y + cell_height],
-                       outline='#ddd', fill='#f8f9fa')
-
-        # Center day text vertically
-        day_bbox = draw.textbbox((0, 0), day.upper(), font=header_font)
-        day_height = day_bbox[3] - day_bbox[1]
-        draw.text((start_x + 15, y + (cell_height - day_height) // 2),
-                  day.upper(), fill='#333', font=header_font)
-
-        # Draw events cell background
-        events_x = start_x + day_col_width
-        draw.rectangle([events_x, y, events_x + events_col_width, y + cell_height],
-                       outline='#ddd', fill='#fafafa')
-
-        # Draw event cards horizontally for this day
-        day_events = schedule.get(day, [])
-        if day_events:
-            card_width = 200   # Increased width for larger text
-            card_height = 110  # Increased height for larger text
-            card_spacing = 12  # Increased spacing between cards
-            cards_per_row = events_col_width // (card_width + card_spacing)
-
-            for event_idx, event in enumerate(day_events):
-                # Calculate position for this event card
-                row = event_idx // cards_per_row
-                col = event_idx % cards_per_row
-
-                card_x = events_x + 10 + col * (card_width + card_spacing)
-                card_y = y + 10 + row * (card_height + 5)
-
-                # Skip if card would go outside the cell
-                if card_y + card_height > y + cell_height - 10:
-                    break
-
-                # Event card background with blue styling
-                draw.rectangle([card_x, card_y, card_x + card_width, card_y + card_height],
-                               outline='#2563eb', fill='#dbeafe', width=2)
-
-                # Course code (prominent and bold)
-                course_text = event.course_code
-                if len(course_text) > 12:  # Adjusted for larger font
-                    course_text = course_text[:12] + "..."
-                draw.text((card_x + 12, card_y + 10),
-                          course_text, fill='#1e293b', font=text_font)
-
-                # Time (larger and clearer)
-                time_text = f"{event.start_time.hour}:{event.start_time.minute:02d} - {event.end_time.hour}:{event.end_time.minute:02d}"
-                draw.text((card_x + 12, card_y + 35),
-                          time_text, fill='#334155', font=small_font)
-
-                # Location (truncated, larger text)
-                location_text = event.location[:18] + \
-                    "..." if len(event.location) > 18 else event.location
-                draw.text((card_x + 12, card_y + 60),
-                          f"📍 {location_text}", fill='#475569', font=small_font)
-
-                # Lecturer (truncated, larger text)
-                lecturer_text = event.lecturer[:16] + \
-                    "..." if len(event.lecturer) > 16 else event.lecturer
-                if lecturer_text:
-                    draw.text((card_x + 12, card_y + 85),
-                              f"👨‍🏫 {lecturer_text}", fill='#475569', font=small_font)
+        items = []
+        if cohort_csv:
+            items += items_from_csv(cohort_csv.read().decode('utf-8-sig', errors='replace'))
+        if registration_pdfs:
+            items += items_from_pdfs(((f.name, f.read()) for f in registration_pdfs),
+                                     lambda data: extract_cached(data)[0])
+        if not items:
+            raise CohortError('No students with course codes were found in the upload.')
+        if len(items) > settings.COHORT_MAX_STUDENTS:
+            raise CohortError(f'At most {settings.COHORT_MAX_STUDENTS} students per batch.')
+        job = CohortJob(source, schedule_index, items, template_type, fmt)
+    except PoolBusy:
+        messages.error(request, 'The server is busy processing other uploads. Please try again shortly.')
+        return redirect('admin_dashboard')
+    except (CohortError, UnicodeDecodeError) as e:
+        messages.error(request, str(e))
+        return redirect('admin_dashboard')
+
+    print(f"Cohort: {len(items)} students for source {source.id} ({fmt}, {job.template})")
+    response = StreamingHttpResponse(job.iter_zip(), content_type='application/zip')
+    response['Content-Disposition'] = (
+        f'attachment; filename="timetables_{safe_filename(source.display_name)}.zip"')
+    return response
+
+
+# --- ADDED: JSON schedule API ---
+@require_GET
+@gzip_page
+def api_schedule(request):
+    """
+    A student's schedule as JSON, for clients that only need the data.
+
+    GET ?source_id=<id>&codes=ACT 302,CSM 101   or   ?history_id=<id>
+    Optional ?format=full returns events as objects instead of rows in
+    "fields" order. Responses carry an ETag tied to the source's schedule
+    version, so polling clients get 304 until the timetable changes.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required.'}, status=401)
+
+    compact = request.GET.get('format', 'compact') != 'full'
+    history_id = request.GET.get('history_id')
+    try:
+        if history_id:
+            history = CourseRegistrationHistory.objects.select_related('source').get(
+                id=history_id, user=request.user)
+            source = history.source
+            course_codes = [normalize_course_code(code) for code in json.loads(history.course_codes)]
         else:
-            # Empty state - no classes for this day
-            no_classes_text = "No classes scheduled"
-            no_classes_bbox = draw.textbbox(
-                (0, 0), no_classes_text, font=text_font)
-            no_classes_width = no_classes_bbox[2] - no_classes_bbox[0]
-            draw.text((events_x + (events_col_width - no_classes_width) // 2,
-                       y + cell_height // 2 - 10),
-                      no_classes_text, fill='#9ca3af', font=text_font)
-
-    # Draw footer with minimal styling
-    footer_y = start_y + table_height + 20
-    footer_text = "Powered by ChronoParse - Your AI Timetable Assistant"
-    footer_bbox = draw.textbbox((0, 0), footer_text, font=small_font)
-    footer_width = footer_bbox[2] - footer_bbox[0]
-
-    # Draw footer border
-    draw.line([start_x, footer_y, start_x + table_width,
-              footer_y], fill='#ddd', width=1)
-
-    # Center footer text
-    draw.text(((img_width - footer_width) // 2, footer_y + 10),
-              footer_text, fill='#999', font=small_font)
-
-    # Save image to BytesIO
-    img_buffer = BytesIO()
-    img.save(img_buffer, format='JPEG', quality=95)
-    img_buffer.seek(0)
-
-    response = HttpResponse(img_buffer.getvalue(), content_type='image/jpeg')
-    response['Content-Disposition'] = 'attachment; filename="my_timetable_minimal.jpg"'
+            source = TimetableSource.objects.get(id=request.GET.get('source_id'))
+            course_codes = [normalize_course_code(code)
+                            for code in request.GET.get('codes', '').split(',') if code.strip()]
+    except (CourseRegistrationHistory.DoesNotExist, TimetableSource.DoesNotExist, ValueError):
+        return JsonResponse({'error': 'Timetable source or registration not found.'}, status=404)
+
+    course_codes = sorted({code for code in course_codes if code})
+    if not course_codes:
+        return JsonResponse({'error': 'No course codes given.'}, status=400)
+
+    schedule_index = get_schedule_index(source.id)
+    if not schedule_index:
+        return JsonResponse({'error': 'No timetable data available for this source yet.'}, status=503)
+
+    key = artifacts.artifact_key(
+        'json', source, schedule_index.version, 'compact' if compact else 'full', course_codes)
+    if etag_matches(request, key):
+        return not_modified(key)
+
+    data = {
+        'source': {'id': source.id, 'name': source.display_name, 'version': schedule_index.version},
+        'codes': course_codes,
+        'missing': [code for code in course_codes if code not in schedule_index.by_code],
+        'schedule': schedule_as_json(schedule_index.schedule_for(course_codes), compact),
+    }
+    if compact:
+        data['fields'] = COMPACT_FIELDS
+    response = JsonResponse(data, json_dumps_params={'separators': (',', ':')})
+    response['ETag'] = artifacts.etag_for(key)
+    response['Cache-Control'] = 'private, no-cache'
     return response
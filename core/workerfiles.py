@@ -0,0 +1,200 @@
+# core/workerfiles.py
+"""
+Per-process JSON state that a staff endpoint merges across workers.
+
+Each process writes to <directory>/<pid>-<start>.json. The start stamp is
+taken when the process first writes, never at import, so workers forked from
+a preloaded gunicorn master don't share its name, and a reused PID gets a new
+file. For as long as it lives the process holds an flock on <name>.lock; the
+kernel drops it when the process exits, which is how fold_dead() tells a
+recycled worker's file from a live one. Dead workers' files are merged into
+aggregate.json and removed, so the directory holds one file per live worker
+plus the aggregate however often workers are recycled.
+
+clear() removes everything and starts a new epoch; every process sees it at
+its next reset_pending() and drops the state it still holds in memory.
+"""
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+AGGREGATE = 'aggregate.json'
+FOLD_LOCK = '.fold.lock'
+EPOCH = '.epoch'
+
+
+class WorkerFiles:
+    """
+    ``setting`` names the directory setting; ``merge(total, data)`` returns
+    ``total`` (None at first) with one worker's payload added.
+    """
+
+    def __init__(self, setting, merge):
+        self.setting = setting
+        self.merge = merge
+        self._lock = threading.Lock()
+        self._name = None
+        self._fd = None
+        self._epoch = None
+        os.register_at_fork(after_in_child=self._forget)
+
+    @property
+    def directory(self):
+        return getattr(settings, self.setting)
+
+    def _forget(self):
+        # The child shares the parent's lock; it takes its own on first write
+        if self._fd is not None:
+            os.close(self._fd)
+        self._name = self._fd = self._epoch = None
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _fold_lock(self, mode):
+        fd = os.open(self._path(FOLD_LOCK), os.O_CREAT | os.O_RDWR, 0o644)
+        fcntl.flock(fd, mode)
+        return fd
+
+    def _load(self, name):
+        try:
+            with open(self._path(name)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _dump(self, name, payload):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(payload, f)
+            os.replace(tmp, self._path(name))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def _claim_name(self):
+        # Under the shared fold lock, so no fold sees the lock file before
+        # it is held
+        fold = self._fold_lock(fcntl.LOCK_SH)
+        try:
+            name = f'{os.getpid()}-{time.time_ns()}'
+            fd = os.open(self._path(name + '.lock'), os.O_CREAT | os.O_RDWR, 0o644)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        finally:
+            os.close(fold)
+        self._name, self._fd = name, fd
+
+    def write(self, payload):
+        """Atomically replaces this process's file with ``payload``."""
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            first = self._name is None
+            if first:
+                self._claim_name()
+            self._dump(self._name + '.json', payload)
+        if first:
+            # Cheap place to tidy up after the worker this one replaced
+            self.fold_dead()
+
+    def reset_pending(self):
+        """True once in each process after clear() has run anywhere."""
+        try:
+            epoch = os.stat(self._path(EPOCH)).st_mtime_ns
+        except FileNotFoundError:
+            epoch = 0
+        if self._epoch is None:
+            self._epoch = epoch
+            return False
+        if epoch != self._epoch:
+            self._epoch = epoch
+            return True
+        return False
+
+    def fold_dead(self):
+        """Merges the files of exited processes into the aggregate."""
+        try:
+            fold = self._fold_lock(fcntl.LOCK_EX)
+        except FileNotFoundError:
+            return
+        try:
+            aggregate = self._load(AGGREGATE) or {}
+            # Names merged by a fold that died before removing them
+            leftover = set(aggregate.pop('folded', []))
+            total, dead = aggregate.get('total'), []
+            names = set(os.listdir(self.directory))
+            stems = {name[:-5] for name in names
+                     if name.endswith(('.json', '.lock')) and not name.startswith('.') and name != AGGREGATE}
+            for stem in sorted(stems):
+                fd = None
+                # A file without a lock has no owner (or predates the locks)
+                if stem + '.lock' in names:
+                    fd = os.open(self._path(stem + '.lock'), os.O_RDWR)
+                    try:
+                        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        os.close(fd)
+                        continue
+                dead.append((stem, fd))
+                data = None if stem in leftover else self._load(stem + '.json')
+                if data is not None:
+                    total = self.merge(total, data)
+            if not dead:
+                return
+            self._dump(AGGREGATE, {'total': total, 'folded': [stem for stem, _ in dead]})
+            for stem, fd in dead:
+                for suffix in ('.json', '.lock'):
+                    try:
+                        os.unlink(self._path(stem + suffix))
+                    except FileNotFoundError:
+                        pass
+                if fd is not None:
+                    os.close(fd)
+        finally:
+            os.close(fold)
+
+    def read_all(self):
+        """[(name, payload)] for live workers, then ('aggregate', total) if any."""
+        try:
+            self.fold_dead()
+            fold = self._fold_lock(fcntl.LOCK_SH)
+        except FileNotFoundError:
+            return []
+        try:
+            results = []
+            for name in sorted(os.listdir(self.directory)):
+                if not name.endswith('.json') or name.startswith('.') or name == AGGREGATE:
+                    continue
+                data = self._load(name)
+                if data is not None:
+                    results.append((name, data))
+            total = (self._load(AGGREGATE) or {}).get('total')
+            if total is not None:
+                results.append(('aggregate', total))
+            return results
+        finally:
+            os.close(fold)
+
+    def clear(self):
+        """Removes every file and makes each process drop its state."""
+        try:
+            fold = self._fold_lock(fcntl.LOCK_EX)
+        except FileNotFoundError:
+            return
+        try:
+            for name in os.listdir(self.directory):
+                if name.endswith('.json'):
+                    try:
+                        os.unlink(self._path(name))
+                    except FileNotFoundError:
+                        pass
+            with open(self._path(EPOCH), 'w') as f:
+                f.write(str(time.time_ns()))
+            self._epoch = os.stat(self._path(EPOCH)).st_mtime_ns
+        finally:
+            os.close(fold)
@@ -1,19 +1,27 @@
 # Gunicorn configuration file for production deployment
+import os
 
 # Server socket
 bind = "0.0.0.0:8000"
 backlog = 2048
 
 # Worker processes
-workers = 4
+# WEB_CONCURRENCY also sizes ADMISSION_MAX_BUSY in chronopars/settings.py
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
 worker_class = "sync"
 worker_connections = 1000
 timeout = 30
 keepalive = 2
 
-# Restart workers after this many requests, to help prevent memory leaks
-max_requests = 1000
-max_requests_jitter = 100
+# Recycle each worker after this many requests (plus up to the jitter, so
+# they don't all restart together). This is a safety net, not a fix: run a
+# canary with MEMORY_PROFILE_ENABLED=True, check
+# /dashboard/admin/memory-profile/ for sites that grow on every request, and
+# raise GUNICORN_MAX_REQUESTS (0 disables recycling) once they're fixed.
+# Bounded caches (schedule snapshots, extraction memo, image fonts/frames/text
+# masks) level off and are not leaks.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 50))
 
 # Logging
 accesslog = "-"
@@ -38,9 +46,18 @@ tmp_upload_dir = None
 # Preload app for better performance
 preload_app = True
 
-# Enable automatic worker restarts
-max_requests = 1000
-max_requests_jitter = 50
+
+def when_ready(server):
+    # Runs in the master after the app is preloaded and before workers are
+    # forked: warm the schedule snapshots of the active sources once so every
+    # worker shares them copy-on-write instead of loading them on first hit.
+    try:
+        import django
+        django.setup()
+        from core.prewarm import prewarm_sources
+        server.log.info(str(prewarm_sources()))
+    except Exception as e:
+        server.log.warning(f"Schedule prewarm skipped: {e}")
 
 # Worker timeout
 timeout = 120
@@ -0,0 +1,38 @@
+#!/bin/bash
+
+# Start script for the Render web service: gunicorn plus the ingest worker.
+# The worker has to run here because it reads the uploads from this
+# service's disk. It is restarted whenever it exits, and stopped (after its
+# current job) when gunicorn stops.
+
+set -o nounset
+
+RESTART_DELAY=${INGEST_WORKER_RESTART_DELAY:-5}
+
+supervise_ingest_worker() {
+    local child=
+    trap '[ -n "$child" ] && kill -TERM "$child" 2>/dev/null; wait; exit 0' TERM INT
+    while true; do
+        python manage.py ingest_worker &
+        child=$!
+        wait "$child"
+        echo "ingest_worker exited with status $?; restarting in ${RESTART_DELAY}s" >&2
+        child=
+        sleep "$RESTART_DELAY"
+    done
+}
+
+supervise_ingest_worker &
+supervisor=$!
+
+gunicorn chronopars.wsgi:application &
+web=$!
+
+trap 'kill -TERM "$web" "$supervisor" 2>/dev/null' TERM INT
+
+# wait returns early when a signal arrives, so wait again for the shutdown
+wait "$web"
+status=$?
+kill -TERM "$supervisor" 2>/dev/null
+wait "$web" "$supervisor" 2>/dev/null
+exit "$status"